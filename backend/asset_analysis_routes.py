@@ -15,6 +15,9 @@ from models import User, PortfolioHolding, WatchlistItem, AnalysisHistory
 from auth import get_current_user
 from services.openai_service import analyze_single_asset
 from services.cache_service import cache_service
+from services.instrument_analysis_cache import instrument_analysis_cache
+from services.single_flight import analysis_flights
+from services.rate_limiter import SlidingWindowRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -50,30 +53,126 @@ class AnalysisHistoryItem(BaseModel):
 
 
 # Rate Limiting für Asset-Analysen
-rate_limit_store_asset: Dict[int, List[datetime]] = {}
 RATE_LIMIT_ASSET_REQUESTS = 20  # Mehr als Portfolio-Analyse, da einzelne Assets
 RATE_LIMIT_ASSET_WINDOW_MINUTES = 60
+rate_limit_store_asset = SlidingWindowRateLimiter(RATE_LIMIT_ASSET_REQUESTS, RATE_LIMIT_ASSET_WINDOW_MINUTES * 60)
 
 
 def check_asset_rate_limit(user_id: int) -> bool:
-    """Prüft Rate Limit für Asset-Analysen"""
-    now = datetime.utcnow()
-    user_requests = rate_limit_store_asset.get(user_id, [])
-    window_start = now.timestamp() - (RATE_LIMIT_ASSET_WINDOW_MINUTES * 60)
-    user_requests = [
-        req for req in user_requests 
-        if req.timestamp() > window_start
-    ]
-    
-    if len(user_requests) >= RATE_LIMIT_ASSET_REQUESTS:
+    """Prüft Rate Limit für Asset-Analysen und zählt den Request"""
+    if not rate_limit_store_asset.hit(user_id):
         logger.warning(f"Asset Rate Limit erreicht für User {user_id}")
         return False
-    
-    user_requests.append(now)
-    rate_limit_store_asset[user_id] = user_requests
     return True
 
 
+async def compute_asset_analysis(
+    db: Session,
+    user_id: int,
+    request: SingleAssetAnalysisRequest
+) -> SingleAssetAnalysisResponse:
+    """Führt die Analyse eines einzelnen Assets aus und speichert sie in der Historie"""
+    # Hole Asset je nach Typ
+    asset = None
+    asset_type_str = ""
+    
+    if request.asset_type == "portfolio":
+        asset = db.query(PortfolioHolding).filter(
+            PortfolioHolding.id == request.asset_id,
+            PortfolioHolding.userId == user_id
+        ).first()
+        asset_type_str = "Portfolio-Holding"
+    elif request.asset_type == "watchlist":
+        asset = db.query(WatchlistItem).filter(
+            WatchlistItem.id == request.asset_id,
+            WatchlistItem.userId == user_id
+        ).first()
+        asset_type_str = "Watchlist-Item"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="asset_type muss 'portfolio' oder 'watchlist' sein"
+        )
+    
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{asset_type_str} nicht gefunden"
+        )
+    
+    # Hole Benutzereinstellungen für Kontext
+    from models import UserSettings
+    user_settings_obj = db.query(UserSettings).filter(
+        UserSettings.userId == user_id
+    ).first()
+    
+    user_settings = None
+    if user_settings_obj:
+        user_settings = {
+            "riskProfile": user_settings_obj.riskProfile,
+            "investmentHorizon": user_settings_obj.investmentHorizon
+        }
+    
+    # Baue Asset-Dict für OpenAI Service
+    asset_dict = {
+        "name": asset.name,
+        "isin": asset.isin,
+        "ticker": asset.ticker,
+        "sector": asset.sector,
+        "region": asset.region,
+        "asset_class": asset.asset_class
+    }
+    
+    # Für Portfolio-Holdings: zusätzliche Infos
+    if isinstance(asset, PortfolioHolding):
+        asset_dict.update({
+            "quantity": float(asset.quantity) if asset.quantity else 0,
+            "purchase_price": asset.purchase_price,
+            "purchase_date": asset.purchase_date.isoformat() if asset.purchase_date else ""
+        })
+    
+    async def analyze() -> Dict[str, Any]:
+        # Rufe OpenAI Service auf
+        logger.info(f"Starte AI-Analyse für {asset_type_str} {request.asset_id}")
+        return await analyze_single_asset(asset_dict, user_settings, force_refresh=request.force_refresh)
+    
+    # Benutzerübergreifender Instrument-Cache (außer bei force_refresh)
+    cache_key = instrument_analysis_cache.key(asset_dict, user_settings)
+    analysis, _, cached = await instrument_analysis_cache.get_or_analyze(cache_key, analyze, request.force_refresh)
+    
+    # Speichere in Historie (bei jedem Aufruf, auch bei Treffern im Instrument-Cache)
+    history_entry = AnalysisHistory(
+        userId=user_id,
+        portfolio_holding_id=request.asset_id if request.asset_type == "portfolio" else None,
+        watchlist_item_id=request.asset_id if request.asset_type == "watchlist" else None,
+        asset_name=asset.name,
+        asset_isin=asset.isin,
+        asset_ticker=asset.ticker,
+        analysis_data=analysis
+    )
+    db.add(history_entry)
+    db.commit()
+    
+    analysis["generated_at"] = datetime.utcnow().isoformat()
+    
+    return SingleAssetAnalysisResponse(**analysis, cached=cached)
+
+
+async def run_asset_analysis(
+    db: Session,
+    user_id: int,
+    request: SingleAssetAnalysisRequest
+) -> SingleAssetAnalysisResponse:
+    """
+    Asset-Analyse für Endpoint und Job-Worker; das Rate Limit prüft der Aufrufer.
+    Gleichzeitige Anfragen desselben Benutzers zum selben Asset werden zusammengefasst.
+    """
+    return await analysis_flights.do(
+        ("asset", user_id, request.asset_type, request.asset_id),
+        lambda: compute_asset_analysis(db, user_id, request)
+    )
+
+
 @router.post("/api/asset/analyze", response_model=SingleAssetAnalysisResponse)
 async def analyze_single_asset_endpoint(
     request: SingleAssetAnalysisRequest,
@@ -92,94 +191,7 @@ async def analyze_single_asset_endpoint(
                 detail=f"Rate Limit erreicht. Maximal {RATE_LIMIT_ASSET_REQUESTS} Asset-Analysen pro Stunde erlaubt."
             )
         
-        # Hole Asset je nach Typ
-        asset = None
-        asset_type_str = ""
-        
-        if request.asset_type == "portfolio":
-            asset = db.query(PortfolioHolding).filter(
-                PortfolioHolding.id == request.asset_id,
-                PortfolioHolding.userId == current_user.id
-            ).first()
-            asset_type_str = "Portfolio-Holding"
-        elif request.asset_type == "watchlist":
-            asset = db.query(WatchlistItem).filter(
-                WatchlistItem.id == request.asset_id,
-                WatchlistItem.userId == current_user.id
-            ).first()
-            asset_type_str = "Watchlist-Item"
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="asset_type muss 'portfolio' oder 'watchlist' sein"
-            )
-        
-        if not asset:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"{asset_type_str} nicht gefunden"
-            )
-        
-        # Prüfe Cache (vereinfacht - für Asset-Analysen verwenden wir kurzen Cache)
-        # TODO: Erweitere Cache-Service für Asset-spezifische Keys
-        cached_analysis = None
-        if not request.force_refresh:
-            # Für jetzt: Kein Cache für einzelne Assets (kann später erweitert werden)
-            pass
-        
-        # Hole Benutzereinstellungen für Kontext
-        from models import UserSettings
-        user_settings_obj = db.query(UserSettings).filter(
-            UserSettings.userId == current_user.id
-        ).first()
-        
-        user_settings = None
-        if user_settings_obj:
-            user_settings = {
-                "riskProfile": user_settings_obj.riskProfile,
-                "investmentHorizon": user_settings_obj.investmentHorizon
-            }
-        
-        # Baue Asset-Dict für OpenAI Service
-        asset_dict = {
-            "name": asset.name,
-            "isin": asset.isin,
-            "ticker": asset.ticker,
-            "sector": asset.sector,
-            "region": asset.region,
-            "asset_class": asset.asset_class
-        }
-        
-        # Für Portfolio-Holdings: zusätzliche Infos
-        if isinstance(asset, PortfolioHolding):
-            asset_dict.update({
-                "quantity": float(asset.quantity) if asset.quantity else 0,
-                "purchase_price": asset.purchase_price,
-                "purchase_date": asset.purchase_date.isoformat() if asset.purchase_date else ""
-            })
-        
-        # Rufe OpenAI Service auf
-        logger.info(f"Starte AI-Analyse für {asset_type_str} {request.asset_id}")
-        analysis = await analyze_single_asset(asset_dict, user_settings)
-        
-        # Speichere in Historie
-        history_entry = AnalysisHistory(
-            userId=current_user.id,
-            portfolio_holding_id=request.asset_id if request.asset_type == "portfolio" else None,
-            watchlist_item_id=request.asset_id if request.asset_type == "watchlist" else None,
-            asset_name=asset.name,
-            asset_isin=asset.isin,
-            asset_ticker=asset.ticker,
-            analysis_data=analysis
-        )
-        db.add(history_entry)
-        db.commit()
-        
-        # Cache wird für einzelne Assets nicht verwendet (jede Analyse wird gespeichert)
-        
-        analysis["generated_at"] = datetime.utcnow().isoformat()
-        
-        return SingleAssetAnalysisResponse(**analysis)
+        return await run_asset_analysis(db, current_user.id, request)
         
     except HTTPException:
         raise
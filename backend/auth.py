@@ -1,27 +1,58 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Tuple
 from datetime import datetime, timedelta
+import hashlib
+import logging
 import os
+import secrets
+import uuid
 
 from database import get_db
-from models import User
+from models import User, RefreshToken
+from services.password_hasher import PasswordHasher
+from services.principal_cache import principal_cache
+from services.rate_limiter import SlidingWindowRateLimiter
 
 # Konfiguration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Refresh-Tokens verlängern eine Sitzung ohne erneute Passwortprüfung (Argon2)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Zeitraum, in dem ein gerade rotiertes Token noch einmal eingelöst werden darf (parallele Tabs)
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
 
 # Passwort-Hashing mit Argon2
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
+# Geänderte Parameter gelten für neue Hashes; bestehende werden beim nächsten Login neu gehasht
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__rounds=int(os.getenv("ARGON2_TIME_COST", "3")),
+    argon2__memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "65536")),
+    argon2__parallelism=int(os.getenv("ARGON2_PARALLELISM", "4"))
+)
+# Hashing/Verifikation außerhalb des Event-Loops mit begrenzter Parallelität
+password_hasher = PasswordHasher(pwd_context, max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-# Token Data Model
-class TokenData:
-    email: Optional[str] = None
+# Login-Throttling: alle Versuche pro IP-Adresse, fehlgeschlagene Versuche pro Konto
+login_ip_limiter = SlidingWindowRateLimiter(
+    limit=int(os.getenv("LOGIN_IP_LIMIT", "20")),
+    window_seconds=float(os.getenv("LOGIN_IP_WINDOW_SECONDS", "60"))
+)
+login_account_limiter = SlidingWindowRateLimiter(
+    limit=int(os.getenv("LOGIN_ACCOUNT_LIMIT", "5")),
+    window_seconds=float(os.getenv("LOGIN_ACCOUNT_WINDOW_SECONDS", "900"))
+)
+# Header, in dem der vorgelagerte Proxy die Client-IP setzt (DigitalOcean: do-connecting-ip).
+# Ohne Header wäre hinter dem Proxy dessen IP die Client-IP und alle Benutzer teilten ein IP-Limit.
+LOGIN_CLIENT_IP_HEADER = os.getenv("LOGIN_CLIENT_IP_HEADER", "").strip().lower()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,6 +64,112 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    """
+    Erstellt ein Access-Token mit Benutzer-ID (sub) und Token-Version (ver).
+    Geschützte Endpoints können den Benutzer damit ohne Lookup über die E-Mail-Adresse bestimmen.
+    """
+    return _create_versioned_access_token(user.id, user.token_version or 0, expires_delta)
+
+def _create_versioned_access_token(user_id: int, token_version: int, expires_delta: Optional[timedelta] = None) -> str:
+    return create_access_token(
+        data={"sub": str(user_id), "ver": token_version},
+        expires_delta=expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+def revoke_user_tokens(user: User) -> None:
+    """
+    Macht alle bisher ausgestellten Tokens des Benutzers ungültig. Der Aufrufer committet und
+    invalidiert danach den Principal-Cache; andere Worker erkennen die neue Version spätestens
+    nach Ablauf der TTL des Principal-Caches.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+def _hash_refresh_token(token: str) -> str:
+    # Refresh-Tokens sind zufällig mit 256 Bit; ein schneller Hash genügt (kein Argon2 nötig)
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _add_refresh_token(db: Session, user_id: int, token_version: int, family_id: str) -> str:
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        userId=user_id,
+        token_hash=_hash_refresh_token(token),
+        family_id=family_id,
+        token_version=token_version,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+def issue_refresh_token(db: Session, user: User) -> str:
+    """
+    Erstellt ein Refresh-Token für eine neue Sitzung (Login) und entfernt abgelaufene Tokens des
+    Benutzers. Gespeichert wird nur der Hash; der Aufrufer committet.
+    """
+    db.query(RefreshToken).filter(
+        RefreshToken.userId == user.id,
+        RefreshToken.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    return _add_refresh_token(db, user.id, user.token_version or 0, uuid.uuid4().hex)
+
+def _revoke_refresh_token_family(db: Session, family_id: str) -> None:
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[str, str]:
+    """
+    Tauscht ein Refresh-Token gegen ein neues Access- und Refresh-Token (Rotation).
+    Benötigt einen Lookup über den eindeutigen Index auf token_hash (mit der Token-Version des
+    Benutzers per Join). Ein bereits rotiertes Token wird innerhalb von
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS noch einmal rotiert (parallele Tabs oder Requests mit
+    demselben Token); danach gilt es als entwendet und die ganze Familie (alle Rotationen
+    dieser Anmeldung) wird widerrufen.
+
+    Returns:
+        (Access-Token, Refresh-Token)
+    """
+    row = db.query(RefreshToken, User.token_version).join(RefreshToken.user).filter(
+        RefreshToken.token_hash == _hash_refresh_token(token)
+    ).first()
+    if row is None:
+        raise credentials_exception
+    refresh_token, current_version = row
+    now = datetime.utcnow()
+    # Widerrufene Sitzungen (Logout, Passwortänderung) und abgelaufene Tokens
+    if (
+        refresh_token.revoked_at is not None
+        or refresh_token.expires_at <= now
+        or refresh_token.token_version != (current_version or 0)
+    ):
+        raise credentials_exception
+
+    # Bedingtes Update: von zwei gleichzeitigen Rotationen desselben Tokens gewinnt nur eine
+    claimed = refresh_token.used_at is None and db.query(RefreshToken).filter(
+        RefreshToken.id == refresh_token.id,
+        RefreshToken.used_at.is_(None)
+    ).update({RefreshToken.used_at: now}, synchronize_session=False)
+    if not claimed:
+        used_at = refresh_token.used_at or db.query(RefreshToken.used_at).filter(
+            RefreshToken.id == refresh_token.id
+        ).scalar()
+        if used_at is None or (now - used_at).total_seconds() > REFRESH_TOKEN_REUSE_GRACE_SECONDS:
+            logger.warning(f"Refresh token reuse detected for user {refresh_token.userId}, revoking session")
+            _revoke_refresh_token_family(db, refresh_token.family_id)
+            raise credentials_exception
+        logger.info(f"Refresh token of user {refresh_token.userId} reused within grace period")
+    new_refresh_token = _add_refresh_token(db, refresh_token.userId, refresh_token.token_version, refresh_token.family_id)
+    db.commit()
+    access_token = _create_versioned_access_token(refresh_token.userId, refresh_token.token_version)
+    return access_token, new_refresh_token
+
+def revoke_refresh_token(db: Session, token: str) -> None:
+    """Beendet die Sitzung eines Refresh-Tokens (Logout); unbekannte Tokens werden ignoriert"""
+    refresh_token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_refresh_token(token)).first()
+    if refresh_token is not None:
+        _revoke_refresh_token_family(db, refresh_token.family_id)
+
 # Hilfsfunktionen
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -52,26 +189,123 @@ def get_password_hash(password: str) -> str:
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def _login_account_key(email: str) -> str:
+    return email.strip().lower()
+
+def login_client_ip(request: Request) -> Optional[str]:
+    """
+    Client-IP für das Login-Throttling. Bei gesetztem LOGIN_CLIENT_IP_HEADER zählt der letzte
+    Eintrag dieses Headers (vom Proxy angehängt, nicht vom Client fälschbar), sonst die Gegenstelle.
+    """
+    if LOGIN_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(LOGIN_CLIENT_IP_HEADER, "").split(",")[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.client.host if request.client else None
+
+def throttle_login(client_ip: Optional[str], email: str) -> None:
+    """
+    Weist Login-Versuche über dem Limit der IP-Adresse oder des Kontos mit 429 ab.
+    Muss vor jedem DB-Lookup und jeder Hash-Berechnung aufgerufen werden.
+    """
+    account_key = _login_account_key(email)
+    if client_ip and not login_ip_limiter.hit(client_ip):
+        limiter, key = login_ip_limiter, client_ip
+    elif not login_account_limiter.allow(account_key):
+        limiter, key = login_account_limiter, account_key
+    else:
+        return
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Zu viele Anmeldeversuche. Bitte versuchen Sie es später erneut.",
+        headers={"Retry-After": str(limiter.retry_after(key))},
     )
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    """
+    Prüft E-Mail und Passwort im Hash-Pool.
+    Hashes mit veralteten Parametern (oder bcrypt) werden dabei transparent ersetzt.
+    Fehlschläge zählen für das Konto-Limit des Login-Throttlings, ein Erfolg setzt es zurück.
+
+    Returns:
+        Benutzer oder None bei unbekannter E-Mail/falschem Passwort
+    """
+    account_key = _login_account_key(email)
+    user = get_user_by_email(db, email=email)
+    if not user:
+        login_account_limiter.add(account_key)
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password)
+    if not valid:
+        login_account_limiter.add(account_key)
+        return None
+    login_account_limiter.reset(account_key)
+    if new_hash:
+        user.password = new_hash
+        db.commit()
+        principal_cache.invalidate(user.id)
+    return user
+
+def get_user_by_id(db: Session, user_id: int):
+    return db.get(User, user_id)
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_access_token(token: str) -> Tuple[int, int]:
+    """
+    Prüft Signatur und Ablauf eines Access-Tokens
+
+    Returns:
+        (Benutzer-ID, Token-Version)
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData()
-        token_data.email = email
-    except JWTError:
+        # Tokens ohne Version (sub=E-Mail, vor Einführung der Token-Version) sind ungültig
+        return int(payload["sub"]), int(payload["ver"])
+    except (JWTError, KeyError, TypeError, ValueError):
         raise credentials_exception
-    user = get_user_by_email(db, email=token_data.email)
-    if user is None:
+
+def resolve_principal(db: Session, token: str) -> Tuple[User, bool]:
+    """
+    Bestimmt den Benutzer eines Tokens, bevorzugt aus dem Principal-Cache
+
+    Returns:
+        (Benutzer, aus dem Cache) - Cache-Treffer sind losgelöste Snapshots
+    """
+    user_id, version = decode_access_token(token)
+    user = principal_cache.get(user_id)
+    cached = user is not None
+    if not cached:
+        user = get_user_by_id(db, user_id)
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(user_id, user)
+    # Widerrufene Tokens (z.B. nach Passwortänderung) haben eine veraltete Version
+    if (user.token_version or 0) != version:
         raise credentials_exception
+    return user, cached
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    user, cached = resolve_principal(db, token)
+    if cached:
+        # Snapshot ohne SELECT an die Session des Requests anhängen
+        return db.merge(user, load=False)
     return user
 
+async def get_current_user_id(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> int:
+    """
+    Liefert nur die ID des aktuellen Benutzers (inkl. Prüfung der Token-Version).
+    Für Endpoints, die den Benutzer lediglich zum Filtern benötigen; im Regelfall ohne Datenbankzugriff.
+    """
+    user, _ = resolve_principal(db, token)
+    return user.id
@@ -7,7 +7,8 @@ CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255),
     email VARCHAR(120) NOT NULL UNIQUE,
-    password VARCHAR(128) NOT NULL
+    password VARCHAR(128) NOT NULL,
+    token_version INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE INDEX IF NOT EXISTS ix_users_email ON users(email);
@@ -60,7 +60,7 @@ def init_db():
         existing_tables = inspector.get_table_names()
         
         # Definiere alle erwarteten Tabellen
-        expected_tables = ['users', 'risk_profiles', 'securities', 'telegram_users', 'user_settings', 'portfolio_holdings', 'watchlist_items', 'analysis_history']
+        expected_tables = ['users', 'risk_profiles', 'securities', 'telegram_users', 'user_settings', 'portfolio_holdings', 'watchlist_items', 'analysis_history', 'price_history', 'risk_model_snapshots', 'risk_model_symbols', 'instruments', 'analysis_jobs', 'llm_response_cache', 'refresh_tokens']
         missing_tables = [table for table in expected_tables if table not in existing_tables]
         
         if missing_tables:
@@ -75,6 +75,10 @@ def init_db():
         # Führe Migrationen für bestehende Tabellen aus
         migrate_add_sector_column()
         migrate_add_region_asset_class_columns()
+        migrate_add_instrument_classified_at_column()
+        migrate_add_instrument_ticker_unique_index()
+        migrate_add_user_token_version_column()
+        migrate_add_risk_model_covariance_columns()
         
     except Exception as e:
         error_msg = str(e)
@@ -227,3 +231,154 @@ def migrate_add_region_asset_class_columns():
             print(f"Warning: Error checking/adding region/asset_class columns: {e}")
             print("Please run migrate_add_region_asset_class.sql manually.")
 
+def migrate_add_instrument_classified_at_column():
+    """Fügt die classified_at-Spalte zur instruments Tabelle hinzu, falls sie nicht existiert"""
+    from sqlalchemy import inspect
+    
+    try:
+        inspector = inspect(engine)
+        
+        if 'instruments' not in inspector.get_table_names():
+            print("instruments table does not exist. Skipping classified_at column migration.")
+            return
+        
+        columns = [col['name'] for col in inspector.get_columns('instruments')]
+        if 'classified_at' in columns:
+            print("classified_at column already exists in instruments table.")
+            return
+        
+        dialect = engine.dialect.name
+        column_type = 'TIMESTAMP' if dialect == 'postgresql' else 'DATETIME'
+        print("Adding classified_at column to instruments table...")
+        with engine.connect() as conn:
+            conn.execute(text(f'ALTER TABLE instruments ADD COLUMN classified_at {column_type} NULL'))
+            conn.commit()
+        print(f"classified_at column added successfully to instruments table ({dialect}).")
+            
+    except Exception as e:
+        error_msg = str(e)
+        if "duplicate column" in error_msg.lower() or "already exists" in error_msg.lower():
+            print("classified_at column already exists in instruments table.")
+        else:
+            print(f"Warning: Error checking/adding classified_at column: {e}")
+            print("Please run migrate_add_instruments.sql manually.")
+
+def migrate_add_instrument_ticker_unique_index():
+    """
+    Legt den eindeutigen Index auf ticker für Instrumente ohne ISIN an, falls er nicht existiert.
+    Bereits doppelt angelegte Instrumente ohne ISIN werden vorher auf das älteste zusammengeführt.
+    MySQL/MariaDB erhalten statt des partiellen Index eine generierte Spalte mit eindeutigem Index.
+    """
+    from sqlalchemy import inspect
+    from models import INSTRUMENT_TICKER_INDEX_MYSQL
+    
+    try:
+        inspector = inspect(engine)
+        
+        if 'instruments' not in inspector.get_table_names():
+            print("instruments table does not exist. Skipping ticker index migration.")
+            return
+        
+        dialect = engine.dialect.name
+        is_mysql = dialect in ['mysql', 'mariadb']
+        indexes = {index['name']: index for index in inspector.get_indexes('instruments')}
+        existing = indexes.get('uq_instruments_ticker_without_isin')
+        # Ältere Versionen haben auf MySQL einen global eindeutigen Index auf ticker angelegt
+        outdated = existing is not None and is_mysql and existing['column_names'] != ['ticker_without_isin']
+        if existing is not None and not outdated:
+            print("uq_instruments_ticker_without_isin index already exists on instruments table.")
+            return
+        
+        print("Adding unique ticker index for instruments without ISIN...")
+        with engine.connect() as conn:
+            if is_mysql:
+                if outdated:
+                    conn.execute(text('DROP INDEX uq_instruments_ticker_without_isin ON instruments'))
+                # MySQL erlaubt im DELETE keine Unterabfrage auf dieselbe Tabelle, nur über eine abgeleitete Tabelle
+                conn.execute(text(
+                    'DELETE FROM instruments WHERE isin IS NULL AND ticker IS NOT NULL AND id NOT IN '
+                    '(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM instruments '
+                    'WHERE isin IS NULL AND ticker IS NOT NULL GROUP BY ticker) AS keep)'
+                ))
+                conn.execute(text(INSTRUMENT_TICKER_INDEX_MYSQL))
+            else:
+                conn.execute(text(
+                    'DELETE FROM instruments WHERE isin IS NULL AND ticker IS NOT NULL AND id NOT IN '
+                    '(SELECT MIN(id) FROM instruments WHERE isin IS NULL AND ticker IS NOT NULL GROUP BY ticker)'
+                ))
+                conn.execute(text(
+                    'CREATE UNIQUE INDEX IF NOT EXISTS uq_instruments_ticker_without_isin '
+                    'ON instruments (ticker) WHERE isin IS NULL'
+                ))
+            conn.commit()
+        print(f"uq_instruments_ticker_without_isin index added successfully ({dialect}).")
+            
+    except Exception as e:
+        print(f"Warning: Error checking/adding instruments ticker index: {e}")
+        print("Please run migrate_add_instruments_ticker_unique.sql manually.")
+
+def migrate_add_user_token_version_column():
+    """Fügt die token_version-Spalte zur users Tabelle hinzu, falls sie nicht existiert"""
+    from sqlalchemy import inspect
+    
+    try:
+        inspector = inspect(engine)
+        
+        if 'users' not in inspector.get_table_names():
+            print("users table does not exist. Skipping token_version column migration.")
+            return
+        
+        columns = [col['name'] for col in inspector.get_columns('users')]
+        if 'token_version' in columns:
+            print("token_version column already exists in users table.")
+            return
+        
+        print("Adding token_version column to users table...")
+        with engine.connect() as conn:
+            conn.execute(text('ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'))
+            conn.commit()
+        print(f"token_version column added successfully to users table ({engine.dialect.name}).")
+            
+    except Exception as e:
+        error_msg = str(e)
+        if "duplicate column" in error_msg.lower() or "already exists" in error_msg.lower():
+            print("token_version column already exists in users table.")
+        else:
+            print(f"Warning: Error checking/adding token_version column: {e}")
+            print("Please run migrate_add_user_token_version.sql manually.")
+
+def migrate_add_risk_model_covariance_columns():
+    """Fügt die Spalten position und covariance zur risk_model_symbols Tabelle hinzu, falls sie fehlen"""
+    from sqlalchemy import inspect
+    
+    try:
+        inspector = inspect(engine)
+        
+        if 'risk_model_symbols' not in inspector.get_table_names():
+            print("risk_model_symbols table does not exist. Skipping covariance column migration.")
+            return
+        
+        columns = [col['name'] for col in inspector.get_columns('risk_model_symbols')]
+        missing = [
+            (name, column_type)
+            for name, column_type in [('position', 'INTEGER'), ('covariance', 'JSON')]
+            if name not in columns
+        ]
+        if not missing:
+            print("position and covariance columns already exist in risk_model_symbols table.")
+            return
+        
+        print("Adding covariance columns to risk_model_symbols table...")
+        with engine.connect() as conn:
+            for name, column_type in missing:
+                conn.execute(text(f'ALTER TABLE risk_model_symbols ADD COLUMN {name} {column_type} NULL'))
+            conn.commit()
+        print(f"covariance columns added successfully to risk_model_symbols table ({engine.dialect.name}).")
+            
+    except Exception as e:
+        error_msg = str(e)
+        if "duplicate column" in error_msg.lower() or "already exists" in error_msg.lower():
+            print("position and covariance columns already exist in risk_model_symbols table.")
+        else:
+            print(f"Warning: Error checking/adding risk_model_symbols covariance columns: {e}")
+            print("Please run migrate_add_risk_model_symbols.sql manually.")
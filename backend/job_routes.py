@@ -0,0 +1,177 @@
+"""
+Job Routes
+Asynchrone KI-Analysen: Job anlegen, Status abfragen, Ergebnis abholen
+"""
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session
+import logging
+
+from database import get_db
+from models import User, AnalysisJob
+from auth import get_current_user
+from services.job_service import JOB_FAILED, JOB_SUCCEEDED, job_worker, submit_job
+from portfolio_analysis_routes import PortfolioAnalysisRequest, enforce_rate_limit, run_portfolio_analysis
+from asset_analysis_routes import (
+    RATE_LIMIT_ASSET_REQUESTS,
+    SingleAssetAnalysisRequest,
+    check_asset_rate_limit,
+    run_asset_analysis,
+)
+from watchlist_analysis_routes import WatchlistAnalysisRequest, run_watchlist_analysis
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+# Pydantic Models
+class JobSubmitRequest(BaseModel):
+    type: str  # "portfolio_analysis", "asset_analysis" oder "watchlist_analysis"
+    params: Dict[str, Any] = {}  # Body des entsprechenden synchronen Endpoints
+
+
+class JobResponse(BaseModel):
+    id: int
+    type: str
+    status: str  # queued, running, succeeded, failed
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
+
+
+def enforce_asset_rate_limit(user_id: int) -> None:
+    if not check_asset_rate_limit(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate Limit erreicht. Maximal {RATE_LIMIT_ASSET_REQUESTS} Asset-Analysen pro Stunde erlaubt."
+        )
+
+
+async def run_portfolio_job(db: Session, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    response = await run_portfolio_analysis(db, user_id, PortfolioAnalysisRequest(**params))
+    return response.model_dump()
+
+
+async def run_asset_job(db: Session, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    response = await run_asset_analysis(db, user_id, SingleAssetAnalysisRequest(**params))
+    return response.model_dump()
+
+
+async def run_watchlist_job(db: Session, user_id: int, params: Dict[str, Any]) -> list:
+    responses = await run_watchlist_analysis(db, user_id, WatchlistAnalysisRequest(**params))
+    return [response.model_dump() for response in responses]
+
+
+# Job-Typ -> (Request-Model der Parameter, Rate Limit beim Anlegen)
+JOB_TYPES: Dict[str, tuple] = {
+    "portfolio_analysis": (PortfolioAnalysisRequest, enforce_rate_limit),
+    "asset_analysis": (SingleAssetAnalysisRequest, enforce_asset_rate_limit),
+    "watchlist_analysis": (WatchlistAnalysisRequest, None),
+}
+
+job_worker.register("portfolio_analysis", run_portfolio_job)
+job_worker.register("asset_analysis", run_asset_job)
+job_worker.register("watchlist_analysis", run_watchlist_job)
+
+
+def build_job_response(job: AnalysisJob) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        type=job.job_type,
+        status=job.status,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        error=job.error,
+        created_at=job.created_at.isoformat(),
+        finished_at=job.finished_at.isoformat() if job.finished_at else None
+    )
+
+
+def get_user_job(db: Session, user_id: int, job_id: int) -> AnalysisJob:
+    job = db.query(AnalysisJob).filter(
+        AnalysisJob.id == job_id,
+        AnalysisJob.userId == user_id
+    ).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job nicht gefunden"
+        )
+    return job
+
+
+# POST /api/jobs
+@router.post("/api/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    request: JobSubmitRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Legt eine Analyse als Job an und antwortet sofort mit der Job-ID.
+    Die Parameter entsprechen dem Body von POST /api/portfolio/analyze, /api/asset/analyze
+    bzw. /api/watchlist/analyze. Das Rate Limit wird beim Anlegen geprüft.
+    """
+    if request.type not in JOB_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"type muss einer von {', '.join(JOB_TYPES)} sein"
+        )
+
+    params_model, rate_limit = JOB_TYPES[request.type]
+    try:
+        params = params_model(**request.params).model_dump()
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    if rate_limit:
+        rate_limit(current_user.id)
+
+    job = submit_job(db, current_user.id, request.type, params)
+    return build_job_response(job)
+
+
+# GET /api/jobs/{job_id}
+@router.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Status eines Jobs (zum Pollen)"""
+    return build_job_response(get_user_job(db, current_user.id, job_id))
+
+
+# GET /api/jobs/{job_id}/result
+@router.get("/api/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Ergebnis eines Jobs (Response des entsprechenden synchronen Endpoints)
+
+    - 200 mit dem Ergebnis, wenn der Job abgeschlossen ist
+    - 202 mit dem Job-Status, solange er wartet oder läuft
+    - 409 mit der Fehlermeldung, wenn er endgültig fehlgeschlagen ist
+    """
+    job = get_user_job(db, current_user.id, job_id)
+
+    if job.status == JOB_SUCCEEDED:
+        return job.result
+    if job.status == JOB_FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=job.error or "Job fehlgeschlagen"
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=build_job_response(job).model_dump()
+    )
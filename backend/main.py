@@ -1,10 +1,10 @@
-from fastapi import FastAPI, HTTPException, Depends, status, APIRouter
+from fastapi import FastAPI, HTTPException, Depends, status, APIRouter, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import logging
@@ -24,14 +24,19 @@ logger = logging.getLogger(__name__)
 from database import get_db, init_db, engine
 from models import User
 from auth import (
-    get_password_hash,
-    verify_password,
+    authenticate_user,
+    password_hasher,
+    throttle_login,
+    login_client_ip,
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
     get_user_by_email,
     get_current_user,
-    create_access_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES,
+    create_user_access_token,
     oauth2_scheme
 )
+from services.cache_service import cache_service, CACHE_SWEEP_INTERVAL_SECONDS
 
 app = FastAPI(title="RoboAdvisor API", version="1.0.0")
 
@@ -65,6 +70,10 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 # Startup Event: Erstelle Tabellen beim Start
 @app.on_event("startup")
@@ -76,7 +85,7 @@ async def startup_event():
         from sqlalchemy import inspect
         inspector = inspect(engine)
         existing_tables = inspector.get_table_names()
-        expected_tables = ['users', 'risk_profiles', 'securities', 'telegram_users', 'user_settings', 'portfolio_holdings', 'watchlist_items', 'analysis_history']
+        expected_tables = ['users', 'risk_profiles', 'securities', 'telegram_users', 'user_settings', 'portfolio_holdings', 'watchlist_items', 'analysis_history', 'price_history', 'risk_model_snapshots', 'risk_model_symbols', 'instruments', 'analysis_jobs', 'llm_response_cache', 'refresh_tokens']
         missing_tables = [table for table in expected_tables if table not in existing_tables]
         
         if missing_tables:
@@ -84,9 +93,42 @@ async def startup_event():
             logger.warning("Please run migrate_user_settings.py or create_tables.sql to create missing tables.")
         else:
             logger.info("All database tables exist, application ready.")
+        
+        if 'instruments' in existing_tables:
+            from database import SessionLocal
+            from services.instrument_service import seed_instruments
+            db = SessionLocal()
+            try:
+                seed_instruments(db)
+            finally:
+                db.close()
     except Exception as e:
         logger.warning(f"Could not initialize database: {e}")
         logger.warning("Database tables may already exist or connection failed.")
+    
+    # Hintergrund-Worker für Instrument-Klassifizierungen (OpenAI) starten
+    from database import SessionLocal
+    from portfolio_analytics import get_classification_from_openai
+    from services.classification_worker import classification_worker
+    classification_worker.start(get_classification_from_openai, SessionLocal)
+    
+    # Worker für asynchrone Analyse-Jobs (Tabelle analysis_jobs) starten
+    from services.job_service import job_worker
+    job_worker.start(SessionLocal)
+    
+    # Abgelaufene Analyse-Cache-Einträge periodisch entfernen
+    cache_service.start_sweeper(CACHE_SWEEP_INTERVAL_SECONDS)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from services.classification_worker import classification_worker
+    from services.job_service import job_worker
+    from services.openai_service import close_openai_client
+    await classification_worker.stop()
+    await job_worker.stop()
+    await cache_service.stop_sweeper()
+    password_hasher.shutdown()
+    await close_openai_client()
 
 # API Router OHNE Prefix
 # DigitalOcean generiert automatisch: /roboadvisor-frontend-backend
@@ -111,6 +153,8 @@ async def health_check(db: Session = Depends(get_db)):
         return {
             "status": "healthy",
             "database": "connected",
+            "cache": cache_service.stats(),
+            "password_hashing": password_hasher.stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -136,6 +180,8 @@ async def health_check_api(db: Session = Depends(get_db)):
         return {
             "status": "healthy",
             "database": "connected",
+            "cache": cache_service.stats(),
+            "password_hashing": password_hasher.stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -177,7 +223,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             )
         
         # Erstelle neuen User
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(
             name=user.name,
             email=user.email,
@@ -208,49 +254,58 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 @api_router.post("/api/auth/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = get_user_by_email(db, email=form_data.username)  # username ist hier die email
+    throttle_login(login_client_ip(request), form_data.username)
+    user = await authenticate_user(db, form_data.username, form_data.password)  # username ist hier die email
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="E-Mail oder Passwort falsch",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if not verify_password(form_data.password, user.password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="E-Mail oder Passwort falsch",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    access_token = create_user_access_token(user)
+    refresh_token = issue_refresh_token(db, user)
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 @api_router.post("/api/auth/login-json", response_model=Token)
 async def login_json(
+    request: Request,
     user_login: UserLogin,
     db: Session = Depends(get_db)
 ):
-    user = get_user_by_email(db, email=user_login.email)
+    throttle_login(login_client_ip(request), user_login.email)
+    user = await authenticate_user(db, user_login.email, user_login.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="E-Mail oder Passwort falsch"
         )
-    if not verify_password(user_login.password, user.password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="E-Mail oder Passwort falsch"
-        )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    access_token = create_user_access_token(user)
+    refresh_token = issue_refresh_token(db, user)
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@api_router.post("/api/auth/refresh", response_model=Token)
+async def refresh(
+    refresh_request: RefreshRequest,
+    db: Session = Depends(get_db)
+):
+    """Neues Access-Token per Refresh-Token (ohne Passwortprüfung); das Refresh-Token wird rotiert"""
+    access_token, refresh_token = rotate_refresh_token(db, refresh_request.refresh_token)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@api_router.post("/api/auth/logout")
+async def logout(
+    refresh_request: RefreshRequest,
+    db: Session = Depends(get_db)
+):
+    """Widerruft die Sitzung des Refresh-Tokens"""
+    revoke_refresh_token(db, refresh_request.refresh_token)
+    return {"message": "Erfolgreich abgemeldet"}
 
 @api_router.get("/api/auth/me", response_model=UserResponse)
 async def read_users_me(current_user: User = Depends(get_current_user)):
@@ -280,14 +335,16 @@ app.include_router(api_router)
 from user_routes import router as user_router
 app.include_router(user_router)
 
-# Portfolio routes importieren und hinzufügen
-from portfolio_routes import router as portfolio_router
-app.include_router(portfolio_router)
-
 # Portfolio analytics routes importieren und hinzufügen
+# Muss vor den Portfolio-Routes eingebunden werden, da /api/portfolio/dashboard
+# sonst von /api/portfolio/{holding_id} abgefangen wird
 from portfolio_analytics import router as analytics_router
 app.include_router(analytics_router)
 
+# Portfolio routes importieren und hinzufügen
+from portfolio_routes import router as portfolio_router
+app.include_router(portfolio_router)
+
 # Portfolio analysis routes importieren und hinzufügen
 from portfolio_analysis_routes import router as portfolio_analysis_router
 app.include_router(portfolio_analysis_router)
@@ -312,6 +369,10 @@ app.include_router(watchlist_router)
 from asset_analysis_routes import router as asset_analysis_router
 app.include_router(asset_analysis_router)
 
+# Job routes importieren und hinzufügen (asynchrone Analysen)
+from job_routes import router as job_router
+app.include_router(job_router)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,24 @@
+-- Migration Script: Add analysis_jobs table
+-- Warteschlange für asynchrone KI-Analysen (POST /api/jobs). Worker holen Jobs aus dieser Tabelle,
+-- sodass offene Jobs und Wiederholungen einen Neustart überstehen.
+
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id SERIAL PRIMARY KEY,
+    "userId" INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    job_type VARCHAR(30) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    params JSON NOT NULL,
+    result JSON,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_userId ON analysis_jobs("userId");
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_status_run_after ON analysis_jobs(status, run_after);
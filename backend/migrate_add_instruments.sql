@@ -0,0 +1,29 @@
+-- Migration Script: Add instruments table
+-- Gemeinsame Stammdaten je Wertpapier (Branche, Region, Assetklasse), geteilt von allen Benutzern.
+-- Die bekannten Klassifizierungen werden beim Start der Anwendung angelegt (seed_instruments).
+
+CREATE TABLE IF NOT EXISTS instruments (
+    id SERIAL PRIMARY KEY,
+    isin VARCHAR(12) UNIQUE,
+    ticker VARCHAR(20),
+    name VARCHAR(255),
+    sector VARCHAR(100),
+    region VARCHAR(100),
+    asset_class VARCHAR(100),
+    classified_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Zeitpunkt der letzten OpenAI-Klassifizierung (für bereits angelegte Tabellen)
+ALTER TABLE instruments ADD COLUMN IF NOT EXISTS classified_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_instruments_ticker ON instruments(ticker);
+
+-- Vorhandene Klassifizierungen aus Portfolio-Positionen übernehmen (eine Zeile je ISIN)
+INSERT INTO instruments (isin, ticker, name, sector, region, asset_class)
+SELECT DISTINCT ON (UPPER(isin)) UPPER(isin), UPPER(ticker), name, sector, region, asset_class
+FROM portfolio_holdings
+WHERE isin IS NOT NULL AND sector IS NOT NULL
+ORDER BY UPPER(isin), updated_at DESC
+ON CONFLICT (isin) DO NOTHING;
@@ -0,0 +1,25 @@
+-- Migration Script: Unique ticker for instruments without ISIN
+-- Parallele Requests konnten dasselbe Instrument ohne ISIN mehrfach anlegen. Duplikate werden auf das
+-- älteste Instrument zusammengeführt; der partielle Index verhindert neue Duplikate.
+
+DELETE FROM instruments
+WHERE isin IS NULL AND ticker IS NOT NULL AND id NOT IN (
+    SELECT MIN(id) FROM instruments WHERE isin IS NULL AND ticker IS NOT NULL GROUP BY ticker
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_instruments_ticker_without_isin ON instruments (ticker) WHERE isin IS NULL;
+
+-- MySQL/MariaDB (keine partiellen Indizes; Unterabfrage im DELETE nur über eine abgeleitete Tabelle).
+-- Ein älterer, global eindeutiger Index auf ticker muss vorher entfernt werden:
+-- DROP INDEX uq_instruments_ticker_without_isin ON instruments;
+--
+-- DELETE FROM instruments
+-- WHERE isin IS NULL AND ticker IS NOT NULL AND id NOT IN (
+--     SELECT keep_id FROM (
+--         SELECT MIN(id) AS keep_id FROM instruments WHERE isin IS NULL AND ticker IS NOT NULL GROUP BY ticker
+--     ) AS keep
+-- );
+--
+-- ALTER TABLE instruments
+--     ADD COLUMN ticker_without_isin VARCHAR(20) GENERATED ALWAYS AS (IF(isin IS NULL, ticker, NULL)) STORED,
+--     ADD UNIQUE INDEX uq_instruments_ticker_without_isin (ticker_without_isin);
@@ -0,0 +1,17 @@
+-- Migration Script: Add llm_response_cache table
+-- Persistenter Cache für OpenAI-Antworten, adressiert über einen Hash von Modell, Prompts und Temperatur.
+-- Identische Prompts werden nach Neustarts, in allen Workern und für alle Benutzer lokal beantwortet.
+
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    prompt_hash VARCHAR(64) PRIMARY KEY,
+    model VARCHAR(50) NOT NULL,
+    content TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_llm_response_cache_expires_at ON llm_response_cache(expires_at);
+CREATE INDEX IF NOT EXISTS ix_llm_response_cache_last_used_at ON llm_response_cache(last_used_at);
@@ -0,0 +1,14 @@
+-- Migration Script: Add price_history table
+-- Speichert tägliche Schlusskurse je Instrument für den Performance-Verlauf
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id SERIAL PRIMARY KEY,
+    symbol VARCHAR(20) NOT NULL,
+    date DATE NOT NULL,
+    close NUMERIC(18, 6) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_price_history_symbol_date UNIQUE (symbol, date)
+);
+
+CREATE INDEX IF NOT EXISTS ix_price_history_symbol ON price_history(symbol);
+CREATE INDEX IF NOT EXISTS ix_price_history_date ON price_history(date);
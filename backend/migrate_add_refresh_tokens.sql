@@ -0,0 +1,19 @@
+-- Migration Script: Add refresh_tokens table
+-- Rotierende Refresh-Tokens: Access-Tokens werden ohne erneute Passwortprüfung (Argon2) verlängert.
+-- Gespeichert wird nur der SHA-256-Hash des Tokens; jede Rotation markiert das alte Token als verwendet.
+
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    "userId" INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    family_id VARCHAR(32) NOT NULL,
+    token_version INTEGER NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    used_at TIMESTAMP,
+    revoked_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ix_refresh_tokens_token_hash ON refresh_tokens(token_hash);
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_userId ON refresh_tokens("userId");
+CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens(family_id);
@@ -0,0 +1,11 @@
+-- Migration Script: Add risk_model_snapshots table
+-- Speichert das nächtlich berechnete Risikomodell (Renditen und Kovarianzen je Instrument)
+
+CREATE TABLE IF NOT EXISTS risk_model_snapshots (
+    id SERIAL PRIMARY KEY,
+    benchmark VARCHAR(20),
+    window_days INTEGER NOT NULL,
+    symbol_count INTEGER NOT NULL,
+    data JSON NOT NULL,
+    computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,20 @@
+-- Migration Script: Add risk_model_symbols table
+-- Speichert das Risikomodell je Instrument (Mittelwert, Zeile der Kovarianzmatrix, Benchmark-Kovarianz,
+-- Tagesrenditen), damit
+-- Requests nur die gehaltenen Instrumente laden. risk_model_snapshots.data enthält nur noch Kopfdaten;
+-- ältere Versionen ohne Zeilen liefern leere Kennzahlen bis zum nächsten Lauf von compute_risk_model.py.
+
+CREATE TABLE IF NOT EXISTS risk_model_symbols (
+    snapshot_id INTEGER NOT NULL REFERENCES risk_model_snapshots(id) ON DELETE CASCADE,
+    symbol VARCHAR(20) NOT NULL,
+    position INTEGER,
+    mean DOUBLE PRECISION NOT NULL,
+    covariance JSON,
+    benchmark_covariance DOUBLE PRECISION,
+    returns JSON NOT NULL,
+    PRIMARY KEY (snapshot_id, symbol)
+);
+
+-- Vorberechnete Kovarianzen (für bereits angelegte Tabellen); Zeilen ohne position werden ignoriert
+ALTER TABLE risk_model_symbols ADD COLUMN IF NOT EXISTS position INTEGER;
+ALTER TABLE risk_model_symbols ADD COLUMN IF NOT EXISTS covariance JSON;
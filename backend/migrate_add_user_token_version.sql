@@ -0,0 +1,5 @@
+-- Migration Script: Add token_version column to users
+-- Access-Tokens enthalten Benutzer-ID und Token-Version; eine Passwortänderung erhöht die Version
+-- und macht damit alle zuvor ausgestellten Tokens ungültig.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
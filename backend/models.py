@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, JSON, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, ForeignKey, Text, JSON, Numeric, Float, UniqueConstraint, Index, DDL, event
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from datetime import datetime
 from database import Base
 
@@ -11,6 +11,8 @@ class User(Base):
     name = Column(String(255), nullable=True)
     email = Column(String(120), unique=True, nullable=False, index=True)
     password = Column(String(128), nullable=False)
+    # Wird bei Passwortänderung erhöht und macht alle zuvor ausgestellten Tokens ungültig
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     risk_profiles = relationship("RiskProfile", back_populates="user", cascade="all, delete-orphan")
@@ -18,6 +20,7 @@ class User(Base):
     settings = relationship("UserSettings", back_populates="user", uselist=False, cascade="all, delete-orphan")
     portfolio_holdings = relationship("PortfolioHolding", back_populates="user", cascade="all, delete-orphan")
     watchlist_items = relationship("WatchlistItem", back_populates="user", cascade="all, delete-orphan")
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
 
 class RiskProfile(Base):
     __tablename__ = "risk_profiles"
@@ -146,3 +149,127 @@ class AnalysisHistory(Base):
     portfolio_holding = relationship("PortfolioHolding", back_populates="analysis_history")
     watchlist_item = relationship("WatchlistItem", back_populates="analysis_history")
 
+
+class PriceHistory(Base):
+    __tablename__ = "price_history"
+    __table_args__ = (
+        UniqueConstraint("symbol", "date", name="uq_price_history_symbol_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    symbol = Column(String(20), nullable=False, index=True)  # ISIN oder Ticker (normalisiert)
+    date = Column(Date, nullable=False, index=True)  # Handelstag
+    close = Column(Numeric(18, 6), nullable=False)  # Schlusskurs
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class RiskModelSnapshot(Base):
+    __tablename__ = "risk_model_snapshots"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    benchmark = Column(String(20), nullable=True)  # Benchmark-Symbol für das Beta
+    window_days = Column(Integer, nullable=False)  # Zeitfenster der Renditen in Kalendertagen
+    symbol_count = Column(Integer, nullable=False)  # Anzahl Instrumente im Modell
+    data = Column(JSON, nullable=False)  # Kopfdaten (Anzahl Renditen, Benchmark-Varianz; RiskModel.to_records)
+    computed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class RiskModelSymbol(Base):
+    __tablename__ = "risk_model_symbols"
+    
+    # Eine Zeile je Instrument und Version; Requests laden nur die gehaltenen Symbole
+    snapshot_id = Column(Integer, ForeignKey("risk_model_snapshots.id", ondelete="CASCADE"), primary_key=True)
+    symbol = Column(String(20), primary_key=True)  # ISIN oder Ticker (normalisiert)
+    position = Column(Integer, nullable=True)  # Spalte des Symbols in den Kovarianz-Zeilen der Version
+    mean = Column(Float, nullable=False)  # Mittlere Tagesrendite
+    covariance = Column(JSON, nullable=True)  # Zeile der Kovarianzmatrix (Kovarianz mit allen Symbolen der Version)
+    benchmark_covariance = Column(Float, nullable=True)  # Kovarianz mit dem Benchmark
+    returns = Column(JSON, nullable=False)  # Tagesrenditen des Zeitfensters
+
+
+class Instrument(Base):
+    __tablename__ = "instruments"
+    __table_args__ = (
+        # Instrumente ohne ISIN sind über den Ticker eindeutig (MySQL: siehe INSTRUMENT_TICKER_INDEX_MYSQL)
+        Index(
+            "uq_instruments_ticker_without_isin", "ticker", unique=True,
+            postgresql_where=text("isin IS NULL"), sqlite_where=text("isin IS NULL")
+        ).ddl_if(dialect=("postgresql", "sqlite")),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    isin = Column(String(12), nullable=True, unique=True, index=True)  # ISIN (normalisiert)
+    ticker = Column(String(20), nullable=True, index=True)  # Ticker (normalisiert)
+    name = Column(String(255), nullable=True)  # Name des Wertpapiers
+    sector = Column(String(100), nullable=True)  # Branche
+    region = Column(String(100), nullable=True)  # Region
+    asset_class = Column(String(100), nullable=True)  # Assetklasse
+    classified_at = Column(DateTime, nullable=True)  # Letzte Klassifizierung durch OpenAI (auch bei "Unbekannt")
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+# MySQL/MariaDB kennen keine partiellen Indizes: Der eindeutige Index liegt auf einer generierten
+# Spalte, die nur für Instrumente ohne ISIN den Ticker enthält (NULL darf mehrfach vorkommen)
+INSTRUMENT_TICKER_INDEX_MYSQL = (
+    "ALTER TABLE instruments "
+    "ADD COLUMN ticker_without_isin VARCHAR(20) GENERATED ALWAYS AS (IF(isin IS NULL, ticker, NULL)) STORED, "
+    "ADD UNIQUE INDEX uq_instruments_ticker_without_isin (ticker_without_isin)"
+)
+event.listen(
+    Instrument.__table__, "after_create",
+    DDL(INSTRUMENT_TICKER_INDEX_MYSQL).execute_if(dialect=("mysql", "mariadb"))
+)
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        Index("ix_analysis_jobs_status_run_after", "status", "run_after"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    userId = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    job_type = Column(String(30), nullable=False)  # portfolio_analysis, asset_analysis, watchlist_analysis
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    params = Column(JSON, nullable=False)  # Request-Parameter der Analyse
+    result = Column(JSON, nullable=True)  # Ergebnis (Response der Analyse)
+    error = Column(Text, nullable=True)  # Letzte Fehlermeldung
+    attempts = Column(Integer, nullable=False, default=0)  # Anzahl gestarteter Versuche
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, server_default=func.now())  # Frühester (nächster) Start
+    locked_by = Column(String(100), nullable=True)  # Worker, der den Job bearbeitet
+    locked_at = Column(DateTime, nullable=True)  # Start der Bearbeitung (für abgebrochene Worker)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+
+class LLMResponseCache(Base):
+    __tablename__ = "llm_response_cache"
+    
+    prompt_hash = Column(String(64), primary_key=True)  # SHA-256 über (Modell, System-Prompt, User-Prompt, Temperatur)
+    model = Column(String(50), nullable=False)
+    content = Column(Text, nullable=False)  # Unveränderte Antwort des Modells
+    size_bytes = Column(Integer, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+    last_used_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)  # Für LRU-Verdrängung
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    userId = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)  # SHA-256 des Tokens, das Token selbst wird nicht gespeichert
+    family_id = Column(String(32), nullable=False, index=True)  # Alle Rotationen einer Anmeldung
+    token_version = Column(Integer, nullable=False)  # users.token_version bei Ausstellung
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)  # Rotiert; erneute Verwendung widerruft die Familie
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    
+    # Relationship
+    user = relationship("User", back_populates="refresh_tokens")
@@ -3,7 +3,6 @@ Portfolio Analysis Routes
 Endpoints für AI-gestützte Portfolio-Analysen
 """
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
@@ -11,10 +10,13 @@ import logging
 from datetime import datetime
 
 from database import get_db
-from models import User, PortfolioHolding, UserSettings, AnalysisHistory, AnalysisHistory
+from models import User, PortfolioHolding, UserSettings, AnalysisHistory
 from auth import get_current_user
-from services.openai_service import analyze_portfolio
+from services.openai_service import analyze_portfolio, get_openai_client, stream_portfolio_analysis
 from services.cache_service import cache_service
+from services.single_flight import analysis_flights
+from services.streaming import ndjson_response
+from services.rate_limiter import SlidingWindowRateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -58,16 +60,15 @@ class PortfolioAnalysisResponse(BaseModel):
     generated_at: str
 
 
-# Rate Limiting: Einfache In-Memory Implementierung
-# In Produktion sollte Redis oder ähnliches verwendet werden
-rate_limit_store: Dict[int, List[datetime]] = {}
+# Rate Limiting: In-Memory pro Worker, feste Speichergröße pro Benutzer
 RATE_LIMIT_REQUESTS = 10  # Maximale Anzahl Requests
 RATE_LIMIT_WINDOW_MINUTES = 60  # Zeitfenster in Minuten
+rate_limit_store = SlidingWindowRateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_MINUTES * 60)
 
 
 def check_rate_limit(user_id: int) -> bool:
     """
-    Prüft ob der Benutzer das Rate Limit überschritten hat
+    Prüft ob der Benutzer das Rate Limit überschritten hat und zählt den Request
     
     Args:
         user_id: Benutzer-ID
@@ -75,30 +76,204 @@ def check_rate_limit(user_id: int) -> bool:
     Returns:
         True wenn erlaubt, False wenn limitiert
     """
-    now = datetime.utcnow()
-    
-    # Hole bisherige Requests des Users
-    user_requests = rate_limit_store.get(user_id, [])
-    
-    # Entferne alte Requests außerhalb des Zeitfensters
-    window_start = now.timestamp() - (RATE_LIMIT_WINDOW_MINUTES * 60)
-    user_requests = [
-        req for req in user_requests 
-        if req.timestamp() > window_start
-    ]
-    
-    # Prüfe Limit
-    if len(user_requests) >= RATE_LIMIT_REQUESTS:
+    if not rate_limit_store.hit(user_id):
         logger.warning(f"Rate Limit erreicht für User {user_id}")
         return False
-    
-    # Füge aktuellen Request hinzu
-    user_requests.append(now)
-    rate_limit_store[user_id] = user_requests
-    
     return True
 
 
+def get_analysis_holdings(db: Session, user_id: int) -> List[PortfolioHolding]:
+    """Lädt die Portfolio-Positionen für eine Analyse"""
+    holdings = db.query(PortfolioHolding).filter(
+        PortfolioHolding.userId == user_id
+    ).all()
+    
+    if not holdings:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Portfolio ist leer. Bitte fügen Sie Positionen hinzu."
+        )
+    return holdings
+
+
+def get_user_settings_dict(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """Risikoprofil und Anlagehorizont des Users für den Prompt"""
+    user_settings_obj = db.query(UserSettings).filter(
+        UserSettings.userId == user_id
+    ).first()
+    if not user_settings_obj:
+        return None
+    return {
+        "riskProfile": user_settings_obj.riskProfile,
+        "investmentHorizon": user_settings_obj.investmentHorizon
+    }
+
+
+def build_holdings_dict(holdings: List[PortfolioHolding]) -> List[Dict[str, Any]]:
+    """Konvertiert Holdings zu Dict-Format für OpenAI Service"""
+    return [
+        {
+            "id": holding.id,
+            "isin": holding.isin,
+            "ticker": holding.ticker,
+            "name": holding.name,
+            "quantity": float(holding.quantity) if holding.quantity else 0,
+            "purchase_price": holding.purchase_price,
+            "purchase_date": holding.purchase_date.isoformat() if holding.purchase_date else "",
+            "sector": holding.sector,
+            "region": holding.region,
+            "asset_class": holding.asset_class
+        }
+        for holding in holdings
+    ]
+
+
+def store_analysis_history(
+    db: Session,
+    user_id: int,
+    holdings: List[PortfolioHolding],
+    analysis: Dict[str, Any]
+) -> None:
+    """Fügt die Analyse für jede Portfolio-Position der Historie hinzu (Commit durch den Aufrufer)"""
+    for holding in holdings:
+        # Finde passende Analyse für diese Position
+        ticker_match = holding.ticker or holding.isin or holding.name
+        fundamental = next(
+            (fa for fa in analysis.get("fundamentalAnalysis", []) 
+             if fa.get("ticker") == ticker_match),
+            None
+        )
+        technical = next(
+            (ta for ta in analysis.get("technicalAnalysis", [])
+             if ta.get("ticker") == ticker_match),
+            None
+        )
+        
+        # Erstelle Analyse-Daten für Historie
+        analysis_data = {
+            "portfolioAnalysis": True,  # Marker für Portfolio-weite Analyse
+            "analysisDate": datetime.utcnow().isoformat()
+        }
+        
+        # Füge fundamentale Analyse hinzu, falls vorhanden
+        if fundamental:
+            analysis_data["fundamentalAnalysis"] = fundamental
+        else:
+            # Fallback: Erstelle minimale Analyse-Struktur
+            analysis_data["fundamentalAnalysis"] = {
+                "ticker": ticker_match,
+                "summary": "Keine detaillierte fundamentale Analyse verfügbar für diese Position.",
+                "valuation": "fair"
+            }
+        
+        # Füge technische Analyse hinzu, falls vorhanden
+        if technical:
+            analysis_data["technicalAnalysis"] = technical
+        else:
+            # Fallback: Erstelle minimale Analyse-Struktur
+            analysis_data["technicalAnalysis"] = {
+                "ticker": ticker_match,
+                "trend": "neutral",
+                "rsi": "N/A",
+                "signal": "hold"
+            }
+        
+        # Füge Portfolio-weite Informationen hinzu
+        if analysis.get("risks"):
+            analysis_data["risks"] = analysis.get("risks")
+        if analysis.get("shortTermAdvice"):
+            analysis_data["shortTermAdvice"] = analysis.get("shortTermAdvice")
+        if analysis.get("longTermAdvice"):
+            analysis_data["longTermAdvice"] = analysis.get("longTermAdvice")
+        
+        history_entry = AnalysisHistory(
+            userId=user_id,
+            portfolio_holding_id=holding.id,
+            watchlist_item_id=None,
+            asset_name=holding.name,
+            asset_isin=holding.isin,
+            asset_ticker=holding.ticker,
+            analysis_data=analysis_data
+        )
+        db.add(history_entry)
+
+
+def build_analysis_response(analysis: Dict[str, Any], cached: bool) -> PortfolioAnalysisResponse:
+    """Validiert die Analyse und ergänzt die Metadaten"""
+    try:
+        return PortfolioAnalysisResponse(
+            **{key: value for key, value in analysis.items() if key not in ("cached", "generated_at")},
+            cached=cached,
+            generated_at=datetime.utcnow().isoformat()
+        )
+    except Exception as e:
+        logger.error(f"Fehler beim Validieren der Analyse: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Fehler bei der Analyse-Validierung"
+        )
+
+
+def enforce_rate_limit(user_id: int) -> None:
+    if not check_rate_limit(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate Limit erreicht. Maximal {RATE_LIMIT_REQUESTS} Analysen pro Stunde erlaubt."
+        )
+
+
+async def compute_portfolio_analysis(
+    db: Session,
+    user_id: int,
+    request: PortfolioAnalysisRequest
+) -> PortfolioAnalysisResponse:
+    """Führt die Portfolio-Analyse aus (Cache, OpenAI, Historie)"""
+    # Optional: Filter nach Portfolio-ID (für zukünftige Multi-Portfolio Unterstützung)
+    holdings = get_analysis_holdings(db, user_id)
+
+    # Prüfe Cache (außer bei force_refresh)
+    cached_analysis = None
+    if not request.force_refresh:
+        cached_analysis = cache_service.get(user_id, request.portfolio_id)
+
+    if cached_analysis:
+        logger.info(f"Cache Hit für User {user_id}")
+        return build_analysis_response(cached_analysis, cached=True)
+
+    user_settings = get_user_settings_dict(db, user_id)
+    holdings_dict = build_holdings_dict(holdings)
+
+    # Rufe OpenAI Service auf
+    logger.info(f"Starte AI-Analyse für User {user_id} mit {len(holdings_dict)} Positionen")
+    analysis = await analyze_portfolio(holdings_dict, user_settings, force_refresh=request.force_refresh)
+
+    # Speichere Analyse-Historie für jede Portfolio-Position
+    store_analysis_history(db, user_id, holdings, analysis)
+    db.commit()
+    logger.info(f"Analyse-Historie für {len(holdings)} Positionen gespeichert")
+
+    # Speichere im Cache
+    cache_service.set(user_id, analysis, request.portfolio_id)
+
+    return build_analysis_response(analysis, cached=False)
+
+
+async def run_portfolio_analysis(
+    db: Session,
+    user_id: int,
+    request: PortfolioAnalysisRequest
+) -> PortfolioAnalysisResponse:
+    """
+    Portfolio-Analyse für Endpoint und Job-Worker; das Rate Limit prüft der Aufrufer.
+    Gleichzeitige Anfragen desselben Benutzers (Doppelklick, mehrere Tabs) warten auf
+    eine gemeinsame Analyse und schreiben die Historie nur einmal.
+    """
+    return await analysis_flights.do(
+        ("portfolio", user_id, request.portfolio_id),
+        lambda: compute_portfolio_analysis(db, user_id, request)
+    )
+
+
 @router.post("/api/portfolio/analyze", response_model=PortfolioAnalysisResponse)
 async def analyze_portfolio_endpoint(
     request: PortfolioAnalysisRequest = PortfolioAnalysisRequest(),
@@ -117,160 +292,10 @@ async def analyze_portfolio_endpoint(
     """
     try:
         # Rate Limiting prüfen
-        if not check_rate_limit(current_user.id):
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate Limit erreicht. Maximal {RATE_LIMIT_REQUESTS} Analysen pro Stunde erlaubt."
-            )
-        
-        # Hole Portfolio-Positionen
-        holdings_query = db.query(PortfolioHolding).filter(
-            PortfolioHolding.userId == current_user.id
-        )
-        
-        # Optional: Filter nach Portfolio-ID (für zukünftige Multi-Portfolio Unterstützung)
-        if request.portfolio_id:
-            # Hier könnte später nach portfolio_id gefiltert werden
-            pass
-        
-        holdings = holdings_query.all()
-        
-        if not holdings:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Portfolio ist leer. Bitte fügen Sie Positionen hinzu."
-            )
-        
-        # Prüfe Cache (außer bei force_refresh)
-        cached_analysis = None
-        if not request.force_refresh:
-            cached_analysis = cache_service.get(current_user.id, request.portfolio_id)
-        
-        if cached_analysis:
-            logger.info(f"Cache Hit für User {current_user.id}")
-            # Konvertiere zu Response Model
-            return PortfolioAnalysisResponse(
-                **cached_analysis,
-                cached=True,
-                generated_at=datetime.utcnow().isoformat()
-            )
-        
-        # Hole Benutzereinstellungen für Kontext
-        user_settings_obj = db.query(UserSettings).filter(
-            UserSettings.userId == current_user.id
-        ).first()
-        
-        user_settings = None
-        if user_settings_obj:
-            user_settings = {
-                "riskProfile": user_settings_obj.riskProfile,
-                "investmentHorizon": user_settings_obj.investmentHorizon
-            }
-        
-        # Konvertiere Holdings zu Dict-Format für OpenAI Service
-        holdings_dict = []
-        for holding in holdings:
-            holdings_dict.append({
-                "id": holding.id,
-                "isin": holding.isin,
-                "ticker": holding.ticker,
-                "name": holding.name,
-                "quantity": float(holding.quantity) if holding.quantity else 0,
-                "purchase_price": holding.purchase_price,
-                "purchase_date": holding.purchase_date.isoformat() if holding.purchase_date else "",
-                "sector": holding.sector,
-                "region": holding.region,
-                "asset_class": holding.asset_class
-            })
-        
-        # Rufe OpenAI Service auf
-        logger.info(f"Starte AI-Analyse für User {current_user.id} mit {len(holdings_dict)} Positionen")
-        analysis = await analyze_portfolio(holdings_dict, user_settings)
-        
-        # Speichere Analyse-Historie für jede Portfolio-Position
-        for holding in holdings:
-            # Finde passende Analyse für diese Position
-            ticker_match = holding.ticker or holding.isin or holding.name
-            fundamental = next(
-                (fa for fa in analysis.get("fundamentalAnalysis", []) 
-                 if fa.get("ticker") == ticker_match),
-                None
-            )
-            technical = next(
-                (ta for ta in analysis.get("technicalAnalysis", [])
-                 if ta.get("ticker") == ticker_match),
-                None
-            )
-            
-            # Erstelle Analyse-Daten für Historie
-            analysis_data = {
-                "portfolioAnalysis": True,  # Marker für Portfolio-weite Analyse
-                "analysisDate": datetime.utcnow().isoformat()
-            }
-            
-            # Füge fundamentale Analyse hinzu, falls vorhanden
-            if fundamental:
-                analysis_data["fundamentalAnalysis"] = fundamental
-            else:
-                # Fallback: Erstelle minimale Analyse-Struktur
-                analysis_data["fundamentalAnalysis"] = {
-                    "ticker": ticker_match,
-                    "summary": "Keine detaillierte fundamentale Analyse verfügbar für diese Position.",
-                    "valuation": "fair"
-                }
-            
-            # Füge technische Analyse hinzu, falls vorhanden
-            if technical:
-                analysis_data["technicalAnalysis"] = technical
-            else:
-                # Fallback: Erstelle minimale Analyse-Struktur
-                analysis_data["technicalAnalysis"] = {
-                    "ticker": ticker_match,
-                    "trend": "neutral",
-                    "rsi": "N/A",
-                    "signal": "hold"
-                }
-            
-            # Füge Portfolio-weite Informationen hinzu
-            if analysis.get("risks"):
-                analysis_data["risks"] = analysis.get("risks")
-            if analysis.get("shortTermAdvice"):
-                analysis_data["shortTermAdvice"] = analysis.get("shortTermAdvice")
-            if analysis.get("longTermAdvice"):
-                analysis_data["longTermAdvice"] = analysis.get("longTermAdvice")
-            
-            history_entry = AnalysisHistory(
-                userId=current_user.id,
-                portfolio_holding_id=holding.id,
-                watchlist_item_id=None,
-                asset_name=holding.name,
-                asset_isin=holding.isin,
-                asset_ticker=holding.ticker,
-                analysis_data=analysis_data
-            )
-            db.add(history_entry)
-        
-        db.commit()
-        logger.info(f"Analyse-Historie für {len(holdings)} Positionen gespeichert")
-        
-        # Speichere im Cache
-        cache_service.set(current_user.id, analysis, request.portfolio_id)
-        
-        # Füge Metadaten hinzu
-        analysis["generated_at"] = datetime.utcnow().isoformat()
-        analysis["cached"] = False
-        
-        # Validiere und konvertiere zu Response Model
-        try:
-            response = PortfolioAnalysisResponse(**analysis)
-            return response
-        except Exception as e:
-            logger.error(f"Fehler beim Validieren der Analyse: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Fehler bei der Analyse-Validierung"
-            )
-            
+        enforce_rate_limit(current_user.id)
+
+        return await run_portfolio_analysis(db, current_user.id, request)
+
     except HTTPException:
         raise
     except ValueError as e:
@@ -287,14 +312,81 @@ async def analyze_portfolio_endpoint(
         )
 
 
+@router.post("/api/portfolio/analyze/stream")
+async def stream_portfolio_analysis_endpoint(
+    request: PortfolioAnalysisRequest = PortfolioAnalysisRequest(),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Wie POST /api/portfolio/analyze, aber als NDJSON-Stream:
+    
+    - {"type": "section", "section": ..., "data": ...} sobald ein Abschnitt der Modellantwort vollständig ist
+    - {"type": "result", "data": PortfolioAnalysisResponse} am Ende (bei Cache-Treffer sofort)
+    - {"type": "error", "detail": ...} bei Fehlern während des Streams
+    
+    Validierung, Rate Limit und leeres Portfolio werden vor dem Stream als HTTP-Fehler gemeldet.
+    """
+    enforce_rate_limit(current_user.id)
+    holdings = get_analysis_holdings(db, current_user.id)
+    
+    cached_analysis = None
+    if not request.force_refresh:
+        cached_analysis = cache_service.get(current_user.id, request.portfolio_id)
+    
+    if cached_analysis:
+        logger.info(f"Cache Hit für User {current_user.id}")
+        response = build_analysis_response(cached_analysis, cached=True)
+        
+        async def cached_events():
+            yield {"type": "result", "data": response.model_dump()}
+        
+        return ndjson_response(cached_events())
+    
+    if get_openai_client() is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="OPENAI_API_KEY oder OPENAI_SECRET ist nicht gesetzt. Bitte konfigurieren Sie die OpenAI API in den Environment Variables."
+        )
+    
+    user_id = current_user.id
+    user_settings = get_user_settings_dict(db, user_id)
+    holdings_dict = build_holdings_dict(holdings)
+    
+    async def events():
+        try:
+            logger.info(f"Starte gestreamte AI-Analyse für User {user_id} mit {len(holdings_dict)} Positionen")
+            async for event in stream_portfolio_analysis(holdings_dict, user_settings, request.force_refresh):
+                if event["type"] == "result":
+                    analysis = event["data"]
+                    response = build_analysis_response(analysis, cached=False)
+                    store_analysis_history(db, user_id, holdings, analysis)
+                    db.commit()
+                    cache_service.set(user_id, analysis, request.portfolio_id)
+                    event = {"type": "result", "data": response.model_dump()}
+                yield event
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Fehler bei gestreamter Portfolio-Analyse: {e}", exc_info=True)
+            detail = str(e) if isinstance(e, ValueError) else "Ein Fehler ist bei der Portfolio-Analyse aufgetreten"
+            if isinstance(e, HTTPException):
+                detail = e.detail
+            yield {"type": "error", "detail": detail}
+        finally:
+            # Die Request-Session wird vor dem Stream geschlossen und hier erneut verwendet
+            db.close()
+    
+    return ndjson_response(events())
+
+
 @router.delete("/api/portfolio/analyze/cache")
 async def clear_analysis_cache(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Löscht den Cache für die Portfolio-Analyse des aktuellen Benutzers
+    Löscht den Cache für die Portfolio-Analysen des aktuellen Benutzers
     """
-    cache_service.invalidate(current_user.id)
+    cache_service.invalidate_user(current_user.id, cache_type="portfolio")
     return {"message": "Cache erfolgreich gelöscht"}
 
 
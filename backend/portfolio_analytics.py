@@ -2,22 +2,24 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import func, cast, case, Numeric
+from sqlalchemy.exc import DataError
+from datetime import datetime, timedelta, date
 from decimal import Decimal
 import logging
-import random
-import os
 import json
 
 from database import get_db
-from models import User, PortfolioHolding
-from auth import get_current_user
-
-# OpenAI-Import
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+from models import PortfolioHolding, PriceHistory, RiskModelSnapshot, RiskModelSymbol
+from auth import get_current_user_id
+from services.price_service import price_service, asset_symbols
+from services.valuation_service import valuation_snapshots
+from services.valuation_engine import PositionValuation, value_positions
+from services.allocation_service import aggregate, breakdown, DEFAULT_DIMENSIONS
+from services.performance_service import PerformanceSeries, build_series, performance_cache
+from services.risk_service import RiskModel, portfolio_risk, risk_model_cache
+from services.classification_worker import classification_worker, classify_holdings, request_key
+from services.openai_service import get_openai_client
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +70,15 @@ class RiskMetrics(BaseModel):
     sharpe_ratio: Optional[float] = None
     max_drawdown: Optional[float] = None
 
+class DashboardData(BaseModel):
+    summary: Optional[PortfolioSummary] = None
+    allocation: Optional[AllocationData] = None
+    risk: Optional[RiskMetrics] = None
+    performance: Optional[PerformanceHistory] = None
+
+# Erlaubte Werte für den fields-Parameter von /api/portfolio/dashboard
+DASHBOARD_FIELDS = ("summary", "allocation", "risk", "performance")
+
 class SectorAssignment(BaseModel):
     position_id: int
     name: str
@@ -82,137 +93,6 @@ class SectorCheckResult(BaseModel):
     unique_sectors: List[str]
     missing_count: int
 
-# Mock-Daten für aktuelle Preise (in Produktion würde man eine API wie Yahoo Finance nutzen)
-MOCK_CURRENT_PRICES = {
-    "US0378331005": 185.50,  # Apple
-    "US5949181045": 420.30,  # Microsoft
-    "US02079K3059": 145.20,  # Alphabet
-    "US0231351067": 175.80,  # Amazon
-    "DE000BASF111": 45.20,   # BASF
-    "US09075V1026": 95.50,   # BioNTech
-    "CNE100000296": 12.50,   # BYD
-    "US1912161007": 60.20,   # Coca-Cola
-    "DE0005552004": 42.80,   # Deutsche Post
-    "US2546871060": 95.30,   # Disney
-    "US28852N1090": 18.50,   # Ellington
-    "DE0006231004": 35.80,   # Infineon
-    "DE000LS9TQA1": 425.00,  # Lang+Schwarz
-    "DE0007100000": 68.50,   # Mercedes-Benz
-    "US30303M1027": 485.20,  # Meta
-    "US6410694060": 110.50,  # Nestle
-    "US67066G1040": 125.80,  # NVIDIA
-    "US6974351057": 195.50,  # Palo Alto
-    "US79466L3024": 280.30,  # Salesforce
-    "DE0007164600": 125.50,  # SAP
-    "US86800U3023": 48.20,   # Super Micro
-    "US92343V1044": 42.50,   # Verizon
-    "US92532F1003": 445.20,  # Vertex
-    "GB00BH4HKS39": 2.35,    # Vodafone
-}
-
-# Mock-Daten für Branchen-Zuordnung
-SECTOR_MAPPING = {
-    "US0378331005": "Technologie",
-    "US5949181045": "Technologie",
-    "US02079K3059": "Technologie",
-    "US0231351067": "E-Commerce",
-    "DE000BASF111": "Chemie",
-    "US09075V1026": "Biotechnologie",
-    "CNE100000296": "Automobil",
-    "US1912161007": "Getränke",
-    "DE0005552004": "Logistik",
-    "US2546871060": "Medien",
-    "US28852N1090": "Finanzen",
-    "DE0006231004": "Halbleiter",
-    "DE000LS9TQA1": "Finanzen",
-    "DE0007100000": "Automobil",
-    "US30303M1027": "Technologie",
-    "US6410694060": "Konsumgüter",
-    "US67066G1040": "Technologie",
-    "US6974351057": "Cybersicherheit",
-    "US79466L3024": "Software",
-    "DE0007164600": "Software",
-    "US86800U3023": "Technologie",
-    "US92343V1044": "Telekommunikation",
-    "US92532F1003": "Biotechnologie",
-    "GB00BH4HKS39": "Telekommunikation",
-}
-
-# Mock-Daten für Regionen-Zuordnung
-REGION_MAPPING = {
-    "US0378331005": "Nordamerika",
-    "US5949181045": "Nordamerika",
-    "US02079K3059": "Nordamerika",
-    "US0231351067": "Nordamerika",
-    "DE000BASF111": "Europa",
-    "US09075V1026": "Nordamerika",
-    "CNE100000296": "Asien",
-    "US1912161007": "Nordamerika",
-    "DE0005552004": "Europa",
-    "US2546871060": "Nordamerika",
-    "US28852N1090": "Nordamerika",
-    "DE0006231004": "Europa",
-    "DE000LS9TQA1": "Europa",
-    "DE0007100000": "Europa",
-    "US30303M1027": "Nordamerika",
-    "US6410694060": "Europa",
-    "US67066G1040": "Nordamerika",
-    "US6974351057": "Nordamerika",
-    "US79466L3024": "Nordamerika",
-    "DE0007164600": "Europa",
-    "US86800U3023": "Nordamerika",
-    "US92343V1044": "Nordamerika",
-    "US92532F1003": "Nordamerika",
-    "GB00BH4HKS39": "Europa",
-}
-
-# Mock-Daten für Asset-Klassen
-ASSET_CLASS_MAPPING = {
-    "US0378331005": "Aktien",
-    "US5949181045": "Aktien",
-    "US02079K3059": "Aktien",
-    "US0231351067": "Aktien",
-    "DE000BASF111": "Aktien",
-    "US09075V1026": "Aktien",
-    "CNE100000296": "Aktien",
-    "US1912161007": "Aktien",
-    "DE0005552004": "Aktien",
-    "US2546871060": "Aktien",
-    "US28852N1090": "Aktien",
-    "DE0006231004": "Aktien",
-    "DE000LS9TQA1": "Aktien",
-    "DE0007100000": "Aktien",
-    "US30303M1027": "Aktien",
-    "US6410694060": "Aktien",
-    "US67066G1040": "Aktien",
-    "US6974351057": "Aktien",
-    "US79466L3024": "Aktien",
-    "DE0007164600": "Aktien",
-    "US86800U3023": "Aktien",
-    "US92343V1044": "Aktien",
-    "US92532F1003": "Aktien",
-    "GB00BH4HKS39": "Aktien",
-}
-
-def get_openai_client() -> Optional[OpenAI]:
-    """Erstelle OpenAI-Client mit API-Key aus Umgebungsvariable"""
-    if OpenAI is None:
-        logger.warning("OpenAI-Paket nicht installiert")
-        return None
-    
-    # Prüfe beide möglichen Variablennamen (Tippfehler-tolerant)
-    api_key = os.getenv("OPENAI_SECRET") or os.getenv("OPENAI_SCRET")
-    
-    if not api_key:
-        logger.warning("OPENAI_SECRET oder OPENAI_SCRET nicht in Umgebungsvariablen gefunden")
-        return None
-    
-    try:
-        return OpenAI(api_key=api_key)
-    except Exception as e:
-        logger.error(f"Fehler beim Erstellen des OpenAI-Clients: {e}")
-        return None
-
 async def get_classification_from_openai(positions: List[Dict[str, Any]]) -> Dict[int, Dict[str, str]]:
     """
     Fragt die OpenAI-API nach Branche, Region und Assetklasse für alle Portfolio-Positionen auf einmal.
@@ -263,8 +143,8 @@ async def get_classification_from_openai(positions: List[Dict[str, Any]]) -> Dic
         
         prompt += "\nAntworte NUR mit dem JSON-Objekt, keine weiteren Erklärungen."
         
-        # Rufe OpenAI API auf
-        response = client.chat.completions.create(
+        # Rufe OpenAI API auf (asynchroner Client mit gemeinsamem Connection-Pool)
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",  # Kostengünstiges Modell
             messages=[
                 {
@@ -309,157 +189,111 @@ async def get_classification_from_openai(positions: List[Dict[str, Any]]) -> Dic
         logger.error(f"Fehler bei OpenAI API-Aufruf: {e}")
         return {}
 
-async def get_sectors_from_openai(positions: List[Dict[str, Any]]) -> Dict[int, str]:
-    """
-    Fragt die OpenAI-API nach Branchen für alle Portfolio-Positionen auf einmal.
-    DEPRECATED: Verwende stattdessen get_classification_from_openai für alle drei Attribute.
-    
-    Args:
-        positions: Liste von Dictionaries mit position_id, name, isin, ticker
-        
-    Returns:
-        Dictionary mit position_id -> Branche
+# Spalten, die für die Bewertung geladen werden (keine vollständigen ORM-Objekte nötig)
+VALUATION_COLUMNS = (
+    PortfolioHolding.id,
+    PortfolioHolding.name,
+    PortfolioHolding.isin,
+    PortfolioHolding.ticker,
+    PortfolioHolding.quantity,
+    PortfolioHolding.purchase_price,
+    PortfolioHolding.purchase_date,
+    PortfolioHolding.sector,
+    PortfolioHolding.region,
+    PortfolioHolding.asset_class,
+)
+
+class ValuationSnapshot:
     """
-    classification = await get_classification_from_openai(positions)
-    return {pos_id: data.get("sector", "Unbekannt") for pos_id, data in classification.items()}
+    Einmal berechnete Bewertung aller Positionen eines Users.
+    Die Werte liegen spaltenweise in der Valuation Engine vor; PositionValue-Modelle
+    werden erst beim ersten Zugriff auf positions erzeugt.
     """
-    Fragt die OpenAI-API nach Branchen für alle Portfolio-Positionen auf einmal.
-    
-    Args:
-        positions: Liste von Dictionaries mit position_id, name, isin, ticker
-        
-    Returns:
-        Dictionary mit position_id -> Branche
-    """
-    if not positions:
-        return {}
     
-    client = get_openai_client()
-    if not client:
-        logger.warning("OpenAI-Client nicht verfügbar, verwende Fallback")
-        return {}
-    
-    try:
-        # Erstelle Prompt für alle Positionen auf einmal
-        positions_info = []
-        for pos in positions:
-            info_parts = [f"Name: {pos['name']}"]
-            if pos.get('isin'):
-                info_parts.append(f"ISIN: {pos['isin']}")
-            if pos.get('ticker'):
-                info_parts.append(f"Ticker: {pos['ticker']}")
-            positions_info.append({
-                "id": pos['position_id'],
-                "info": " | ".join(info_parts)
-            })
-        
-        prompt = (
-            "Bestimme für folgende Wertpapiere die Branche (Sector). "
-            "Antworte NUR mit einem JSON-Objekt im Format: "
-            '{"position_id": "Branche", ...}. '
-            "Verwende deutsche Branchenbezeichnungen wie: Technologie, Finanzen, "
-            "Gesundheitswesen, Konsumgüter, Energie, Industrie, etc. "
-            "Falls die Branche nicht bestimmt werden kann, verwende 'Unbekannt'.\n\n"
-            "Wertpapiere:\n"
+    def __init__(self, rows: List[Any], watermark: Optional[tuple] = None):
+        """
+        Args:
+            rows: Holdings als ORM-Objekte oder Query-Rows mit den VALUATION_COLUMNS
+            watermark: Wasserzeichen der Holdings, aus denen der Snapshot berechnet wurde
+        """
+        self.watermark = watermark
+        prices = price_service.get_prices_for_assets((r.isin, r.ticker) for r in rows)
+        self.valuation: PositionValuation = value_positions(
+            [r.quantity for r in rows],
+            [r.purchase_price for r in rows],
+            prices
         )
-        
-        for pos_info in positions_info:
-            prompt += f"- ID {pos_info['id']}: {pos_info['info']}\n"
-        
-        prompt += "\nAntworte NUR mit dem JSON-Objekt, keine weiteren Erklärungen."
-        
-        # Rufe OpenAI API auf
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Kostengünstiges Modell
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Du bist ein Finanzexperte, der Wertpapiere Branchen zuordnet. Antworte nur mit JSON."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.3,  # Niedrige Temperatur für konsistente Ergebnisse
-            response_format={"type": "json_object"}
-        )
-        
-        # Parse Antwort
-        content = response.choices[0].message.content.strip()
-        
-        # Versuche JSON zu parsen
-        try:
-            sectors_dict = json.loads(content)
-            # Konvertiere String-Keys zu Integer
-            result = {}
-            for key, value in sectors_dict.items():
-                try:
-                    position_id = int(key)
-                    result[position_id] = str(value) if value else "Unbekannt"
-                except (ValueError, TypeError):
-                    continue
-            return result
-        except json.JSONDecodeError as e:
-            logger.error(f"Fehler beim Parsen der OpenAI-Antwort: {e}")
-            logger.error(f"Antwort war: {content}")
-            return {}
-            
-    except Exception as e:
-        logger.error(f"Fehler bei OpenAI API-Aufruf: {e}")
-        return {}
+        self.holdings: List[Dict[str, Any]] = [
+            {
+                "id": r.id,
+                "name": r.name,
+                "isin": r.isin,
+                "ticker": r.ticker,
+                "purchase_price": r.purchase_price,
+                "sector": r.sector,
+                "region": r.region,
+                "asset_class": r.asset_class,
+                "purchase_date": r.purchase_date
+            }
+            for r in rows
+        ]
+        self._positions: Optional[List[PositionValue]] = None
+    
+    def __len__(self) -> int:
+        return len(self.holdings)
+    
+    @property
+    def positions(self) -> List[PositionValue]:
+        if self._positions is None:
+            self._positions = [
+                PositionValue(
+                    id=h["id"],
+                    name=h["name"],
+                    isin=h["isin"],
+                    ticker=h["ticker"],
+                    purchase_price=h["purchase_price"],
+                    **values
+                )
+                for h, values in zip(self.holdings, self.valuation.records())
+            ]
+        return self._positions
+    
+    @property
+    def total_purchase_value(self) -> float:
+        return self.valuation.total_purchase_value
 
-def get_current_price(isin: Optional[str], ticker: Optional[str]) -> Optional[float]:
-    """Hole aktuellen Preis (Mock-Implementierung)"""
-    # In Produktion: API-Aufruf zu Yahoo Finance, Alpha Vantage, etc.
-    if isin and isin in MOCK_CURRENT_PRICES:
-        return MOCK_CURRENT_PRICES[isin]
-    # Fallback: zufällige Variation basierend auf Kaufpreis
-    return None
-
-def calculate_position_value(holding: PortfolioHolding) -> PositionValue:
-    """Berechne Werte für eine Position"""
-    purchase_price = float(holding.purchase_price.replace(',', '.'))
-    quantity = float(holding.quantity)
-    purchase_value = purchase_price * quantity
-    
-    current_price = get_current_price(holding.isin, holding.ticker)
-    current_value = None
-    gain_loss = None
-    gain_loss_percent = None
-    
-    if current_price:
-        current_value = current_price * quantity
-        gain_loss = current_value - purchase_value
-        if purchase_value > 0:
-            gain_loss_percent = (gain_loss / purchase_value) * 100
-    
-    return PositionValue(
-        id=holding.id,
-        name=holding.name,
-        isin=holding.isin,
-        ticker=holding.ticker,
-        quantity=quantity,
-        purchase_price=holding.purchase_price,
-        current_price=current_price,
-        purchase_value=round(purchase_value, 2),
-        current_value=round(current_value, 2) if current_value else None,
-        gain_loss=round(gain_loss, 2) if gain_loss is not None else None,
-        gain_loss_percent=round(gain_loss_percent, 2) if gain_loss_percent is not None else None
-    )
+def get_holdings_watermark(db: Session, user_id: int) -> tuple:
+    """
+    Bestimmt das Wasserzeichen der Holdings eines Users mit einer Aggregat-Abfrage.
+    Jede Anlage, Änderung oder Löschung einer Position verändert das Wasserzeichen.
+    """
+    count, last_updated, last_id = db.query(
+        func.count(PortfolioHolding.id),
+        func.max(PortfolioHolding.updated_at),
+        func.max(PortfolioHolding.id)
+    ).filter(
+        PortfolioHolding.userId == user_id
+    ).one()
+    return (count, last_updated, last_id)
 
-# GET /api/portfolio/dashboard/summary
-@router.get("/api/portfolio/dashboard/summary", response_model=PortfolioSummary)
-async def get_portfolio_summary(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Hole Portfolio-Zusammenfassung mit aktuellen Werten"""
-    holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
-    ).all()
-    
-    if not holdings:
+def get_valuation_snapshot(db: Session, user_id: int) -> ValuationSnapshot:
+    """
+    Hole den Valuation-Snapshot eines Users.
+    Holdings und Preise werden nur geladen, wenn sich das Wasserzeichen geändert hat
+    oder der Snapshot abgelaufen ist.
+    """
+    def compute() -> ValuationSnapshot:
+        rows = db.query(*VALUATION_COLUMNS).filter(
+            PortfolioHolding.userId == user_id
+        ).all()
+        return ValuationSnapshot(rows, watermark)
+    
+    watermark = get_holdings_watermark(db, user_id)
+    return valuation_snapshots.get_or_compute(user_id, watermark, compute)
+
+def build_portfolio_summary(snapshot: ValuationSnapshot) -> PortfolioSummary:
+    """Berechne Portfolio-Zusammenfassung aus einem Valuation-Snapshot"""
+    if len(snapshot) == 0:
         return PortfolioSummary(
             total_purchase_value=0,
             total_current_value=0,
@@ -469,10 +303,10 @@ async def get_portfolio_summary(
             positions=[]
         )
     
-    positions = [calculate_position_value(h) for h in holdings]
+    positions = snapshot.positions
     
-    total_purchase_value = sum(p.purchase_value for p in positions)
-    total_current_value = sum(p.current_value for p in positions if p.current_value)
+    total_purchase_value = snapshot.valuation.total_purchase_value
+    total_current_value = snapshot.valuation.total_current_value
     total_gain_loss = total_current_value - total_purchase_value if total_current_value else 0
     total_gain_loss_percent = (total_gain_loss / total_purchase_value * 100) if total_purchase_value > 0 else 0
     
@@ -485,159 +319,362 @@ async def get_portfolio_summary(
         positions=positions
     )
 
-# GET /api/portfolio/dashboard/performance
-@router.get("/api/portfolio/dashboard/performance", response_model=PerformanceHistory)
-async def get_performance_history(
-    days: int = 30,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Hole Performance-Verlauf"""
-    holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
-    ).all()
+# Maximale Länge des Performance-Verlaufs in Tagen
+MAX_PERFORMANCE_DAYS = 3650
+
+# Wie weit vor Fensterbeginn nach dem letzten Schlusskurs gesucht wird (Wochenenden, Feiertage)
+PRICE_HISTORY_LOOKBACK_DAYS = 14
+
+def validate_performance_days(days: int) -> None:
+    if days < 1 or days > MAX_PERFORMANCE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"days muss zwischen 1 und {MAX_PERFORMANCE_DAYS} liegen"
+        )
+
+def get_price_history_watermark(db: Session, symbols: Any) -> int:
+    """Höchste price_history-ID für die Symbole (ändert sich mit jedem neuen Schlusskurs)"""
+    if not symbols:
+        return 0
+    return db.query(func.max(PriceHistory.id)).filter(
+        PriceHistory.symbol.in_(symbols)
+    ).scalar() or 0
+
+def get_performance_series(db: Session, snapshot: ValuationSnapshot, user_id: int, days: int) -> PerformanceSeries:
+    """
+    Hole den Performance-Verlauf eines Users aus dem Cache oder baue ihn aus price_history auf.
+    Solange sich die Holdings nicht ändern, werden nur neu hinzugekommene Schlusskurse geladen
+    und das Fenster bis heute fortgeschrieben.
+    """
+    end = date.today()
     
-    if not holdings:
+    series = performance_cache.get(user_id, days, snapshot.watermark)
+    if series is not None:
+        price_watermark = get_price_history_watermark(db, series.symbols)
+        if series.end == end and series.price_watermark == price_watermark:
+            return series
+        
+        new_rows = db.query(PriceHistory.symbol, PriceHistory.date, PriceHistory.close).filter(
+            PriceHistory.symbol.in_(series.symbols),
+            PriceHistory.id > series.price_watermark
+        ).all()
+        series.extend(end, [(r.symbol, r.date, float(r.close)) for r in new_rows], price_watermark)
+        return series
+    
+    start = end - timedelta(days=days)
+    candidates = [asset_symbols(h["isin"], h["ticker"]) for h in snapshot.holdings]
+    all_symbols = {symbol for symbols in candidates for symbol in symbols}
+    
+    price_watermark = get_price_history_watermark(db, all_symbols)
+    rows = db.query(PriceHistory.symbol, PriceHistory.date, PriceHistory.close).filter(
+        PriceHistory.symbol.in_(all_symbols),
+        PriceHistory.date >= start - timedelta(days=PRICE_HISTORY_LOOKBACK_DAYS),
+        PriceHistory.date <= end
+    ).all() if price_watermark else []
+    
+    # Pro Position das erste Symbol (ISIN vor Ticker) verwenden, für das Kurse vorliegen
+    symbols_with_prices = {r.symbol for r in rows}
+    # Ungültige Kaufpreise (NaN) gehen wie in der Valuation Engine mit 0 ein
+    purchase_prices = [p if p == p else 0.0 for p in snapshot.valuation.purchase_price.tolist()]
+    lots = []
+    for holding, symbols, quantity, purchase_price in zip(
+        snapshot.holdings, candidates, snapshot.valuation.quantity.tolist(), purchase_prices
+    ):
+        symbol = next((s for s in symbols if s in symbols_with_prices), symbols[0] if symbols else f"#{holding['id']}")
+        purchase_date = holding["purchase_date"]
+        if isinstance(purchase_date, datetime):
+            purchase_date = purchase_date.date()
+        lots.append((symbol, quantity, purchase_price, purchase_date))
+    
+    series = build_series(
+        lots, start, end,
+        [(r.symbol, r.date, float(r.close)) for r in rows],
+        price_watermark
+    )
+    performance_cache.set(user_id, days, snapshot.watermark, series)
+    return series
+
+def build_performance_history(series: Optional[PerformanceSeries]) -> PerformanceHistory:
+    """
+    Berechne Performance-Verlauf aus einer Performance-Serie.
+    Tage ohne gespeicherten Schlusskurs werden mit dem letzten bekannten Kurs bewertet,
+    Positionen ganz ohne Kurshistorie mit ihrem Einstandswert.
+    """
+    if series is None:
         return PerformanceHistory(data=[])
     
-    # Berechne Basis-Wert (Kaufwert)
-    base_value = sum(float(h.purchase_price.replace(',', '.')) * float(h.quantity) for h in holdings)
-    
-    # Generiere Mock-Performance-Daten (in Produktion: echte historische Daten)
-    data = []
-    start_date = datetime.now() - timedelta(days=days)
-    
-    for i in range(days + 1):
-        date = start_date + timedelta(days=i)
-        # Simuliere Performance mit zufälliger Variation
-        import random
-        variation = 1 + (random.random() - 0.5) * 0.1  # ±5% Variation
-        value = base_value * variation
-        data.append(PerformanceDataPoint(
-            date=date.strftime("%Y-%m-%d"),
+    return PerformanceHistory(data=[
+        PerformanceDataPoint(
+            date=day.strftime("%Y-%m-%d"),
             value=round(value, 2)
-        ))
-    
-    return PerformanceHistory(data=data)
+        )
+        for day, value in zip(series.dates, series.values.tolist())
+    ])
 
-# GET /api/portfolio/dashboard/allocation
-@router.get("/api/portfolio/dashboard/allocation", response_model=AllocationData)
-async def get_portfolio_allocation(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Hole Portfolio-Aufteilung nach Branchen, Regionen und Assetklassen"""
-    holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
-    ).all()
+def get_performance_history_data(db: Session, snapshot: ValuationSnapshot, user_id: int, days: int) -> PerformanceHistory:
+    """Berechne den Performance-Verlauf eines Users aus price_history"""
+    if len(snapshot) == 0:
+        return PerformanceHistory(data=[])
+    return build_performance_history(get_performance_series(db, snapshot, user_id, days))
+
+def allocation_from_values(records: List[Dict[str, Any]], values: List[float]) -> AllocationData:
+    """Berechne Aufteilung nach Branchen, Regionen und Assetklassen in einem Durchlauf"""
+    # Nur echte Klassifizierungen aus der DB, "Sonstige" für fehlende
+    totals = aggregate(records, values, DEFAULT_DIMENSIONS, missing_label="Sonstige")
+    total_value = sum(values)
+    
+    def items(dimension: str) -> List[AllocationItem]:
+        return [
+            AllocationItem(
+                category=category,
+                value=round(value, 2),
+                percentage=round(percentage, 2)
+            )
+            for category, value, percentage in breakdown(totals[dimension], total_value)
+        ]
     
-    if not holdings:
+    return AllocationData(
+        by_sector=items("sector"),
+        by_region=items("region"),
+        by_asset_class=items("asset_class")
+    )
+
+def build_allocation(snapshot: ValuationSnapshot) -> AllocationData:
+    """Berechne Portfolio-Aufteilung aus einem Valuation-Snapshot"""
+    if len(snapshot) == 0:
         return AllocationData(
             by_sector=[],
             by_region=[],
             by_asset_class=[]
         )
     
-    positions = [calculate_position_value(h) for h in holdings]
-    total_value = sum(p.current_value for p in positions if p.current_value) or sum(p.purchase_value for p in positions)
-    
-    # Berechne Aufteilung nach Branchen (nur echte Daten aus DB)
-    sector_values: Dict[str, float] = {}
-    for h, p in zip(holdings, positions):
-        # Verwende nur Branche aus Datenbank, "Sonstige" für fehlende
-        sector = h.sector if h.sector else "Sonstige"
-        value = p.current_value if p.current_value else p.purchase_value
-        sector_values[sector] = sector_values.get(sector, 0) + value
-    
-    by_sector = [
-        AllocationItem(
-            category=sector,
-            value=round(value, 2),
-            percentage=round((value / total_value * 100), 2) if total_value > 0 else 0
+    return allocation_from_values(snapshot.holdings, snapshot.valuation.market_value.tolist())
+
+# Kaufpreise, die in SQL als Zahl gelesen werden (nach Ersetzen des Dezimalkommas)
+NUMERIC_PRICE_PATTERN = r"^ *-?[0-9]+([.][0-9]+)? *$"
+
+def get_allocation_from_db(db: Session, user_id: int) -> AllocationData:
+    """
+    Berechne Portfolio-Aufteilung per GROUP BY in der Datenbank.
+    Lots desselben Instruments mit gleicher Klassifizierung werden bereits in SQL
+    zusammengefasst, sodass nur eine Zeile pro Instrument übertragen und bewertet wird.
+    Nicht numerische Kaufpreise werden per regulärem Ausdruck erkannt (MySQL und SQLite würden
+    sie stillschweigend als 0 lesen, PostgreSQL bricht den CAST ab); dann wird über den
+    Valuation-Snapshot gerechnet, der solche Positionen nur als NaN bewertet.
+    """
+    price_text = func.replace(PortfolioHolding.purchase_price, ',', '.')
+    is_numeric = price_text.regexp_match(NUMERIC_PRICE_PATTERN)
+    purchase_value = func.sum(
+        PortfolioHolding.quantity * case((is_numeric, cast(price_text, Numeric(20, 6))), else_=None)
+    )
+    invalid_prices = func.sum(case((is_numeric, 0), else_=1))
+    group_columns = (
+        PortfolioHolding.isin,
+        PortfolioHolding.ticker,
+        PortfolioHolding.sector,
+        PortfolioHolding.region,
+        PortfolioHolding.asset_class,
+    )
+    try:
+        rows = db.query(
+            *group_columns,
+            func.sum(PortfolioHolding.quantity).label("quantity"),
+            purchase_value.label("purchase_value"),
+            invalid_prices.label("invalid_prices")
+        ).filter(
+            PortfolioHolding.userId == user_id
+        ).group_by(*group_columns).all()
+    except DataError:
+        # z.B. Überlauf des CAST in PostgreSQL
+        db.rollback()
+        rows = None
+    
+    if rows is None or any(r.invalid_prices for r in rows):
+        logger.warning(f"Non-numeric purchase_price for user {user_id}, computing allocation from snapshot")
+        return build_allocation(get_valuation_snapshot(db, user_id))
+    
+    if not rows:
+        return AllocationData(
+            by_sector=[],
+            by_region=[],
+            by_asset_class=[]
         )
-        for sector, value in sorted(sector_values.items(), key=lambda x: x[1], reverse=True)
-    ]
     
-    # Berechne Aufteilung nach Regionen (nur echte Daten aus DB)
-    region_values: Dict[str, float] = {}
-    for h, p in zip(holdings, positions):
-        # Verwende nur Region aus Datenbank, "Sonstige" für fehlende
-        region = h.region if h.region else "Sonstige"
-        value = p.current_value if p.current_value else p.purchase_value
-        region_values[region] = region_values.get(region, 0) + value
-    
-    by_region = [
-        AllocationItem(
-            category=region,
-            value=round(value, 2),
-            percentage=round((value / total_value * 100), 2) if total_value > 0 else 0
-        )
-        for region, value in sorted(region_values.items(), key=lambda x: x[1], reverse=True)
+    prices = price_service.get_prices_for_assets((r.isin, r.ticker) for r in rows)
+    values = [
+        float(r.quantity) * price if price else float(r.purchase_value or 0)
+        for r, price in zip(rows, prices)
     ]
-    
-    # Berechne Aufteilung nach Assetklassen (nur echte Daten aus DB)
-    asset_class_values: Dict[str, float] = {}
-    for h, p in zip(holdings, positions):
-        # Verwende nur Assetklasse aus Datenbank, "Sonstige" für fehlende
-        asset_class = h.asset_class if h.asset_class else "Sonstige"
-        value = p.current_value if p.current_value else p.purchase_value
-        asset_class_values[asset_class] = asset_class_values.get(asset_class, 0) + value
-    
-    by_asset_class = [
-        AllocationItem(
-            category=asset_class,
-            value=round(value, 2),
-            percentage=round((value / total_value * 100), 2) if total_value > 0 else 0
-        )
-        for asset_class, value in sorted(asset_class_values.items(), key=lambda x: x[1], reverse=True)
+    records = [
+        {"sector": r.sector, "region": r.region, "asset_class": r.asset_class}
+        for r in rows
     ]
+    return allocation_from_values(records, values)
+
+def risk_symbols(snapshot: ValuationSnapshot) -> List[str]:
+    """Alle Symbole (ISIN und Ticker), unter denen Positionen im Risikomodell stehen können"""
+    return [
+        symbol
+        for holding in snapshot.holdings
+        for symbol in asset_symbols(holding["isin"], holding["ticker"])
+    ]
+
+def get_risk_model(db: Session, symbols: List[str]) -> Optional[RiskModel]:
+    """
+    Hole das zuletzt nächtlich berechnete Risikomodell für die angegebenen Symbole.
+    Geladen werden nur die Zeilen dieser Symbole, und nur solange sie für die aktuelle
+    Version noch nicht im Prozess vorliegen.
+    """
+    latest_id = db.query(func.max(RiskModelSnapshot.id)).scalar()
+    if latest_id is None:
+        return None
     
-    return AllocationData(
-        by_sector=by_sector,
-        by_region=by_region,
-        by_asset_class=by_asset_class
+    def load_header():
+        row = db.query(RiskModelSnapshot.benchmark, RiskModelSnapshot.data).filter(
+            RiskModelSnapshot.id == latest_id
+        ).one()
+        return row.benchmark, row.data
+    
+    def load_records(missing: List[str]):
+        rows = db.query(
+            RiskModelSymbol.symbol,
+            RiskModelSymbol.position,
+            RiskModelSymbol.mean,
+            RiskModelSymbol.covariance,
+            RiskModelSymbol.benchmark_covariance,
+            RiskModelSymbol.returns
+        ).filter(
+            RiskModelSymbol.snapshot_id == latest_id,
+            RiskModelSymbol.symbol.in_(missing),
+            # Zeilen älterer Versionen ohne vorberechnete Kovarianzen
+            RiskModelSymbol.position.isnot(None)
+        ).all()
+        return [row._asdict() for row in rows]
+    
+    return risk_model_cache.get_model(latest_id, symbols, load_header, load_records)
+
+def build_risk_metrics(snapshot: ValuationSnapshot, model: Optional[RiskModel]) -> RiskMetrics:
+    """
+    Berechne Risikoindikatoren aus einem Valuation-Snapshot und dem Risikomodell.
+    Gewichte sind die aktuellen Positionswerte; Positionen ohne Kurshistorie im Modell
+    bleiben unberücksichtigt.
+    """
+    if len(snapshot) == 0 or model is None:
+        return RiskMetrics()
+    
+    values: Dict[str, float] = {}
+    for holding, value in zip(snapshot.holdings, snapshot.valuation.market_value.tolist()):
+        symbols = asset_symbols(holding["isin"], holding["ticker"])
+        symbol = next((s for s in symbols if s in model.index), symbols[0] if symbols else f"#{holding['id']}")
+        values[symbol] = values.get(symbol, 0.0) + value
+    
+    metrics = portfolio_risk(model, values)
+    
+    def rounded(key: str) -> Optional[float]:
+        return round(metrics[key], 2) if metrics[key] is not None else None
+    
+    return RiskMetrics(
+        beta=rounded("beta"),
+        volatility=rounded("volatility"),
+        sharpe_ratio=rounded("sharpe_ratio"),
+        max_drawdown=rounded("max_drawdown")
     )
 
+# GET /api/portfolio/dashboard/summary
+@router.get("/api/portfolio/dashboard/summary", response_model=PortfolioSummary)
+async def get_portfolio_summary(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Hole Portfolio-Zusammenfassung mit aktuellen Werten"""
+    return build_portfolio_summary(get_valuation_snapshot(db, user_id))
+
+# GET /api/portfolio/dashboard/performance
+@router.get("/api/portfolio/dashboard/performance", response_model=PerformanceHistory)
+async def get_performance_history(
+    days: int = 30,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Hole Performance-Verlauf auf Basis gespeicherter Schlusskurse"""
+    validate_performance_days(days)
+    snapshot = get_valuation_snapshot(db, user_id)
+    return get_performance_history_data(db, snapshot, user_id, days)
+
+# GET /api/portfolio/dashboard/allocation
+@router.get("/api/portfolio/dashboard/allocation", response_model=AllocationData)
+async def get_portfolio_allocation(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """Hole Portfolio-Aufteilung nach Branchen, Regionen und Assetklassen"""
+    # Vorhandenen Snapshot wiederverwenden, sonst nur die Aggregation in der DB ausführen
+    snapshot = valuation_snapshots.get(user_id, get_holdings_watermark(db, user_id))
+    if snapshot is not None:
+        return build_allocation(snapshot)
+    return get_allocation_from_db(db, user_id)
+
 # GET /api/portfolio/dashboard/risk
 @router.get("/api/portfolio/dashboard/risk", response_model=RiskMetrics)
 async def get_risk_metrics(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
-    """Hole Risikoindikatoren"""
-    holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
-    ).all()
-    
-    if not holdings:
-        return RiskMetrics()
-    
-    # Mock-Berechnungen (in Produktion: echte Berechnungen basierend auf historischen Daten)
-    # Beta: Gewichteter Durchschnitt der einzelnen Betas
-    # Volatilität: Standardabweichung der Renditen
-    # Sharpe Ratio: (Rendite - risikofreier Zins) / Volatilität
-    # Max Drawdown: Maximale Verlustphase
+    """Hole Risikoindikatoren auf Basis des nächtlich berechneten Risikomodells"""
+    snapshot = get_valuation_snapshot(db, user_id)
+    return build_risk_metrics(snapshot, get_risk_model(db, risk_symbols(snapshot)))
+
+# GET /api/portfolio/dashboard
+@router.get("/api/portfolio/dashboard", response_model=DashboardData)
+async def get_dashboard(
+    fields: Optional[str] = None,
+    days: int = 30,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Hole alle Dashboard-Daten in einem Request.
+    Authentifizierung, Holdings-Abfrage und Bewertung laufen nur einmal.
     
-    # Für Demo: Simulierte Werte
-    return RiskMetrics(
-        beta=round(1.15 + random.random() * 0.2, 2),  # 1.15 - 1.35
-        volatility=round(15 + random.random() * 10, 2),  # 15% - 25%
-        sharpe_ratio=round(1.2 + random.random() * 0.8, 2),  # 1.2 - 2.0
-        max_drawdown=round(-5 - random.random() * 10, 2)  # -5% bis -15%
+    Args:
+        fields: Optionale, kommagetrennte Auswahl aus summary, allocation, risk, performance
+        days: Anzahl Tage für den Performance-Verlauf
+    """
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(DASHBOARD_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unbekannte Felder: {', '.join(sorted(unknown))}. Erlaubt: {', '.join(DASHBOARD_FIELDS)}"
+            )
+    else:
+        requested = set(DASHBOARD_FIELDS)
+    if "performance" in requested:
+        validate_performance_days(days)
+    
+    snapshot = get_valuation_snapshot(db, user_id)
+    
+    return DashboardData(
+        summary=build_portfolio_summary(snapshot) if "summary" in requested else None,
+        allocation=build_allocation(snapshot) if "allocation" in requested else None,
+        risk=build_risk_metrics(snapshot, get_risk_model(db, risk_symbols(snapshot))) if "risk" in requested else None,
+        performance=get_performance_history_data(db, snapshot, user_id, days) if "performance" in requested else None
     )
 
 # GET /api/portfolio/dashboard/check-sectors
 @router.get("/api/portfolio/dashboard/check-sectors", response_model=SectorCheckResult)
 async def check_portfolio_sectors(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Prüft, ob alle Portfoliowerte einer Branche zugeordnet sind.
-    Nutzt die OpenAI-API, um fehlende Branchenzuordnungen zu bestimmen.
+    Branchen kommen aus den gemeinsamen Instrument-Stammdaten; fehlende werden wie bei
+    GET /api/portfolio einmal pro Instrument im Hintergrund klassifiziert.
     """
     holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
+        PortfolioHolding.userId == user_id
     ).all()
     
     if not holdings:
@@ -648,18 +685,7 @@ async def check_portfolio_sectors(
             missing_count=0
         )
     
-    # Bereite Positionsdaten für OpenAI vor
-    positions_data = []
-    for holding in holdings:
-        positions_data.append({
-            'position_id': holding.id,
-            'name': holding.name,
-            'isin': holding.isin,
-            'ticker': holding.ticker
-        })
-    
-    # Rufe OpenAI-API auf, um Branchen zu bestimmen
-    sectors_from_openai = await get_sectors_from_openai(positions_data)
+    classify_holdings(db, holdings)
     
     # Erstelle Assignments
     assignments = []
@@ -667,21 +693,16 @@ async def check_portfolio_sectors(
     missing_count = 0
     
     for holding in holdings:
-        # Versuche zuerst Datenbank-Feld, dann OpenAI-Ergebnis, dann Mock-Daten, dann "Unbekannt"
-        sector = None
+        # Klassifizierung der Instrumente ist bereits in die Positionen übernommen
+        sector = holding.sector
         error = None
         
-        if holding.sector:
-            sector = holding.sector
-        elif holding.id in sectors_from_openai:
-            sector = sectors_from_openai[holding.id]
-        elif holding.isin and holding.isin in SECTOR_MAPPING:
-            sector = SECTOR_MAPPING[holding.isin]
-        else:
+        if not sector or sector == "Unbekannt":
             sector = "Unbekannt"
             missing_count += 1
-        
-        if sector and sector != "Unbekannt":
+            if classification_worker.is_pending(request_key(holding.isin, holding.ticker)):
+                error = "Klassifizierung läuft im Hintergrund"
+        else:
             unique_sectors_set.add(sector)
         
         assignments.append(SectorAssignment(
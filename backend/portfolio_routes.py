@@ -1,23 +1,39 @@
 from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from sqlalchemy.orm import Session
 from datetime import datetime
+import asyncio
 import csv
 import io
+import json
 import logging
+import os
 
 from database import get_db
 from models import User, PortfolioHolding
-from auth import get_current_user
-# Importiere OpenAI-Funktionen aus portfolio_analytics
-from portfolio_analytics import get_classification_from_openai, SECTOR_MAPPING, REGION_MAPPING, ASSET_CLASS_MAPPING
+from auth import get_current_user, get_current_user_id
+from services.classification_worker import InstrumentRequest, classification_worker, classify_holdings, request_key
+from services.instrument_service import (
+    CLASSIFICATION_FIELDS,
+    apply_classification,
+    get_or_create_instrument,
+    load_instruments,
+    needs_classification,
+)
+from services.valuation_service import valuation_snapshots
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Maximale Dauer eines Event-Streams für Klassifizierungen (Sekunden)
+CLASSIFICATION_EVENTS_TIMEOUT_SECONDS = int(os.getenv("CLASSIFICATION_EVENTS_TIMEOUT_SECONDS", "120"))
+
+# Abstand der Keep-Alive-Kommentare im Event-Stream (Sekunden)
+CLASSIFICATION_EVENTS_KEEPALIVE_SECONDS = 15
+
 # Pydantic Models
 class PortfolioHoldingCreate(BaseModel):
     isin: Optional[str] = None
@@ -63,6 +79,9 @@ class CSVUploadResponse(BaseModel):
     errors: List[str]
     created: List[dict]
 
+class ClassificationStatusResponse(BaseModel):
+    pending: List[str]  # ISIN/Ticker der Instrumente, deren Klassifizierung noch läuft
+
 # Helper function to validate ISIN
 def validate_isin(isin: str) -> bool:
     """Validiert ISIN-Format (12 Zeichen, alphanumerisch)"""
@@ -114,92 +133,24 @@ def parse_date(date_str: str) -> datetime:
 # GET /api/portfolio
 @router.get("/api/portfolio", response_model=List[PortfolioHoldingResponse])
 async def get_portfolio(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """
     Hole alle Portfolio-Positionen des aktuellen Nutzers.
     Prüft automatisch, ob alle Positionen einer Branche zugeordnet sind,
-    und sendet fehlende Positionen an OpenAI zur Klassifizierung.
+    und reiht fehlende Instrumente (einmal pro ISIN/Ticker) zur Klassifizierung im Hintergrund ein.
     """
     holdings = db.query(PortfolioHolding).filter(
-        PortfolioHolding.userId == current_user.id
+        PortfolioHolding.userId == user_id
     ).order_by(PortfolioHolding.purchase_date.desc()).all()
     
     if not holdings:
         return []
     
-    # Prüfe, welche Positionen keine vollständige Klassifizierung haben
-    # Eine Position ist vollständig klassifiziert, wenn sie sector, region und asset_class hat
-    positions_needing_classification = []
-    
-    for holding in holdings:
-        needs_classification = False
-        
-        # Prüfe, ob alle drei Felder fehlen oder unvollständig sind
-        if not holding.sector:
-            # Prüfe, ob in SECTOR_MAPPING vorhanden
-            if holding.isin and holding.isin in SECTOR_MAPPING:
-                holding.sector = SECTOR_MAPPING[holding.isin]
-            else:
-                needs_classification = True
-        
-        if not holding.region:
-            # Prüfe, ob in REGION_MAPPING vorhanden
-            if holding.isin and holding.isin in REGION_MAPPING:
-                holding.region = REGION_MAPPING[holding.isin]
-            else:
-                needs_classification = True
-        
-        if not holding.asset_class:
-            # Prüfe, ob in ASSET_CLASS_MAPPING vorhanden
-            if holding.isin and holding.isin in ASSET_CLASS_MAPPING:
-                holding.asset_class = ASSET_CLASS_MAPPING[holding.isin]
-            else:
-                needs_classification = True
-        
-        if needs_classification:
-            positions_needing_classification.append({
-                'position_id': holding.id,
-                'name': holding.name,
-                'isin': holding.isin,
-                'ticker': holding.ticker
-            })
-    
-    # Wenn Positionen ohne vollständige Klassifizierung gefunden wurden, sende sie an OpenAI
-    if positions_needing_classification:
-        logger.info(f"Gefunden {len(positions_needing_classification)} Positionen ohne vollständige Klassifizierung für User {current_user.id}. Sende an OpenAI.")
-        try:
-            # Rufe OpenAI auf, um Branche, Region und Assetklasse für die fehlenden Positionen zu bestimmen
-            classification_from_openai = await get_classification_from_openai(positions_needing_classification)
-            
-            if classification_from_openai:
-                logger.info(f"OpenAI hat Klassifizierungen für {len(classification_from_openai)} Positionen zurückgegeben")
-                # Speichere Klassifizierungen in der Datenbank
-                for position_id, classification in classification_from_openai.items():
-                    holding = next((h for h in holdings if h.id == position_id), None)
-                    if holding:
-                        if classification.get("sector") and classification["sector"] != "Unbekannt":
-                            holding.sector = classification["sector"]
-                        if classification.get("region") and classification["region"] != "Unbekannt":
-                            holding.region = classification["region"]
-                        if classification.get("asset_class") and classification["asset_class"] != "Unbekannt":
-                            holding.asset_class = classification["asset_class"]
-                        logger.info(f"Klassifizierung für Position {holding.id} ({holding.name}) gespeichert: "
-                                  f"Sector={classification.get('sector')}, Region={classification.get('region')}, "
-                                  f"AssetClass={classification.get('asset_class')}")
-                
-                # Commit alle Änderungen auf einmal
-                if classification_from_openai:
-                    db.commit()
-                    logger.info(f"{len(classification_from_openai)} Klassifizierungen erfolgreich in Datenbank gespeichert")
-            else:
-                logger.warning("OpenAI hat keine Klassifizierungen zurückgegeben")
-        except Exception as e:
-            # Fehler bei OpenAI-Aufruf sollte nicht den gesamten Portfolio-Abruf blockieren
-            logger.error(f"Fehler beim Aufruf von OpenAI für Klassifizierung: {e}")
-    else:
-        logger.info(f"Alle {len(holdings)} Positionen des Users {current_user.id} haben eine vollständige Klassifizierung")
+    # Fehlende oder veraltete Klassifizierungen nicht abwarten, sondern im Hintergrund anfragen.
+    # Der Client erfährt über /api/portfolio/classification/status bzw. /events, wann sie vorliegen.
+    classify_holdings(db, holdings)
     
     return [
         PortfolioHoldingResponse(
@@ -219,6 +170,71 @@ async def get_portfolio(
         for h in holdings
     ]
 
+def get_pending_classifications(db: Session, user_id: int) -> List[str]:
+    """Liefert die Schlüssel der Instrumente eines Users, die noch in der Klassifizierungs-Queue sind"""
+    pending = set()
+    for isin, ticker in db.query(PortfolioHolding.isin, PortfolioHolding.ticker).filter(
+        PortfolioHolding.userId == user_id
+    ):
+        for key in (request_key(isin, None), request_key(None, ticker)):
+            if classification_worker.is_pending(key):
+                pending.add(key)
+    return sorted(pending)
+
+# GET /api/portfolio/classification/status
+@router.get("/api/portfolio/classification/status", response_model=ClassificationStatusResponse)
+async def get_classification_status(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Instrumente des Portfolios, deren Klassifizierung noch im Hintergrund läuft (zum Pollen)"""
+    return ClassificationStatusResponse(pending=get_pending_classifications(db, current_user.id))
+
+# GET /api/portfolio/classification/events
+@router.get("/api/portfolio/classification/events")
+async def stream_classification_events(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-Sent Events mit den Klassifizierungen der noch offenen Instrumente des Portfolios.
+    Sendet je Instrument ein "classified"-Event und zum Schluss ein "done"-Event
+    mit den bis zum Timeout nicht klassifizierten Instrumenten.
+    """
+    # Zuerst abonnieren, damit zwischen Abfrage und Stream kein Event verloren geht
+    subscriber = classification_worker.subscribe()
+    try:
+        remaining = set(get_pending_classifications(db, current_user.id))
+    except Exception:
+        classification_worker.unsubscribe(subscriber)
+        raise
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CLASSIFICATION_EVENTS_TIMEOUT_SECONDS
+        try:
+            while remaining:
+                timeout = min(CLASSIFICATION_EVENTS_KEEPALIVE_SECONDS, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["key"] in remaining:
+                    remaining.discard(event["key"])
+                    yield f"event: classified\ndata: {json.dumps(event)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'pending': sorted(remaining)})}\n\n"
+        finally:
+            classification_worker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # GET /api/portfolio/{id}
 @router.get("/api/portfolio/{holding_id}", response_model=PortfolioHoldingResponse)
 async def get_portfolio_holding(
@@ -319,20 +335,7 @@ async def create_portfolio_holding(
                 detail=str(e)
             )
         
-        # Bestimme Klassifizierung: zuerst aus übergebenem Wert, dann aus Mappings
-        sector = holding.sector
-        if not sector and isin and isin in SECTOR_MAPPING:
-            sector = SECTOR_MAPPING[isin]
-        
-        region = holding.region
-        if not region and isin and isin in REGION_MAPPING:
-            region = REGION_MAPPING[isin]
-        
-        asset_class = holding.asset_class
-        if not asset_class and isin and isin in ASSET_CLASS_MAPPING:
-            asset_class = ASSET_CLASS_MAPPING[isin]
-        
-        # Erstelle neue Position
+        # Erstelle neue Position: Klassifizierung zuerst aus übergebenem Wert, dann aus den Instrument-Stammdaten
         new_holding = PortfolioHolding(
             userId=current_user.id,
             isin=isin.upper() if isin else None,
@@ -341,14 +344,24 @@ async def create_portfolio_holding(
             purchase_date=purchase_date,
             quantity=quantity_decimal,
             purchase_price=holding.purchase_price.strip(),
-            sector=sector,
-            region=region,
-            asset_class=asset_class
+            sector=holding.sector,
+            region=holding.region,
+            asset_class=holding.asset_class
         )
         
+        instrument = get_or_create_instrument(
+            db, load_instruments(db, [(isin, ticker)]), isin, ticker, name,
+            {field: getattr(holding, field) for field in CLASSIFICATION_FIELDS}
+        )
+        apply_classification(new_holding, instrument)
+        
         db.add(new_holding)
         db.commit()
         db.refresh(new_holding)
+        valuation_snapshots.invalidate(current_user.id)
+        
+        if needs_classification(instrument):
+            classification_worker.enqueue([(instrument.isin, instrument.ticker, instrument.name)])
         
         logger.info(f"Portfolio holding created for user {current_user.id}: {new_holding.id}")
         
@@ -444,6 +457,7 @@ async def update_portfolio_holding(
         holding.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(holding)
+        valuation_snapshots.invalidate(current_user.id)
         
         logger.info(f"Portfolio holding updated: {holding_id}")
         
@@ -493,6 +507,7 @@ async def delete_portfolio_holding(
         
         db.delete(holding)
         db.commit()
+        valuation_snapshots.invalidate(current_user.id)
         
         logger.info(f"Portfolio holding deleted: {holding_id}")
         return {"message": "Portfolio-Position erfolgreich gelöscht"}
@@ -516,6 +531,7 @@ async def upload_csv_portfolio(
     """Lade Portfolio-Positionen aus CSV-Datei hoch"""
     errors = []
     created = []
+    unclassified: List[InstrumentRequest] = []
     success_count = 0
     
     try:
@@ -553,8 +569,14 @@ async def upload_csv_portfolio(
                 detail=f"Fehlende Spalten in CSV: {', '.join(missing_columns)}. Erforderlich: {', '.join(required_columns)}. Gefundene Spalten: {', '.join(csv_reader.fieldnames)}"
             )
         
+        rows = list(csv_reader)
+        
+        # Instrument-Stammdaten für alle Zeilen mit einer Abfrage laden
+        csv_assets = [(row.get('isin') or '', row.get('ticker') or '') for row in rows]
+        instruments = load_instruments(db, csv_assets)
+        
         # Verarbeite jede Zeile
-        for row_num, row in enumerate(csv_reader, start=2):  # Start bei 2 (Header ist Zeile 1)
+        for row_num, row in enumerate(rows, start=2):  # Start bei 2 (Header ist Zeile 1)
             try:
                 # Extrahiere Werte
                 name = row.get('name', '').strip()
@@ -613,20 +635,7 @@ async def upload_csv_portfolio(
                 # Normalisiere purchase_price (Komma zu Punkt für Konsistenz, aber speichere Original)
                 purchase_price_normalized = purchase_price.replace(',', '.')
                 
-                # Bestimme Klassifizierung aus Mappings falls vorhanden
-                sector = None
-                if isin and isin in SECTOR_MAPPING:
-                    sector = SECTOR_MAPPING[isin]
-                
-                region = None
-                if isin and isin in REGION_MAPPING:
-                    region = REGION_MAPPING[isin]
-                
-                asset_class = None
-                if isin and isin in ASSET_CLASS_MAPPING:
-                    asset_class = ASSET_CLASS_MAPPING[isin]
-                
-                # Erstelle Position
+                # Erstelle Position mit Klassifizierung aus den Instrument-Stammdaten
                 new_holding = PortfolioHolding(
                     userId=current_user.id,
                     isin=isin.upper() if isin else None,
@@ -634,16 +643,19 @@ async def upload_csv_portfolio(
                     name=name,
                     purchase_date=purchase_date,
                     quantity=quantity_decimal,
-                    purchase_price=purchase_price_normalized,  # Speichere mit Punkt für Konsistenz
-                    sector=sector,
-                    region=region,
-                    asset_class=asset_class
+                    purchase_price=purchase_price_normalized  # Speichere mit Punkt für Konsistenz
                 )
                 
+                instrument = get_or_create_instrument(db, instruments, isin, ticker, name)
+                apply_classification(new_holding, instrument)
+                
                 db.add(new_holding)
                 db.commit()
                 db.refresh(new_holding)
                 
+                if needs_classification(instrument):
+                    unclassified.append((instrument.isin, instrument.ticker, instrument.name))
+                
                 success_count += 1
                 created.append({
                     "id": new_holding.id,
@@ -654,9 +666,16 @@ async def upload_csv_portfolio(
                 
             except Exception as e:
                 db.rollback()
+                # Im Rollback verworfene Instrumente nicht weiterverwenden
+                instruments = load_instruments(db, csv_assets)
                 errors.append(f"Zeile {row_num}: Fehler beim Verarbeiten - {str(e)}")
                 continue
         
+        if success_count:
+            valuation_snapshots.invalidate(current_user.id)
+        if unclassified:
+            classification_worker.enqueue(unclassified)
+        
         logger.info(f"CSV upload completed for user {current_user.id}: {success_count} created, {len(errors)} errors")
         
         return CSVUploadResponse(
@@ -0,0 +1,55 @@
+"""
+Allocation Service
+Aggregiert Positionswerte in einem einzigen Durchlauf nach beliebig vielen Dimensionen
+(z.B. Branche, Region, Assetklasse). Wird vom Dashboard und vom AI-Prompt-Builder verwendet.
+"""
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+# Standard-Dimensionen der Portfolio-Aufteilung
+DEFAULT_DIMENSIONS = ("sector", "region", "asset_class")
+
+
+def aggregate(
+    records: Iterable[Mapping[str, Any]],
+    values: Iterable[float],
+    dimensions: Sequence[str] = DEFAULT_DIMENSIONS,
+    missing_label: str = "Sonstige"
+) -> Dict[str, Dict[str, float]]:
+    """
+    Summiert Werte pro Kategorie für alle Dimensionen in einem Durchlauf
+
+    Args:
+        records: Positionen mit Klassifizierungsfeldern (z.B. {"sector": "Technologie", ...})
+        values: Wert je Position, gleiche Reihenfolge wie records
+        dimensions: Zu aggregierende Felder
+        missing_label: Kategorie für fehlende Werte
+
+    Returns:
+        Dictionary mit Dimension -> {Kategorie -> Summe}
+    """
+    totals: Dict[str, Dict[str, float]] = {dimension: {} for dimension in dimensions}
+    buckets = [(dimension, totals[dimension]) for dimension in dimensions]
+
+    for record, value in zip(records, values):
+        for dimension, bucket in buckets:
+            category = record.get(dimension) or missing_label
+            bucket[category] = bucket.get(category, 0.0) + value
+
+    return totals
+
+
+def breakdown(category_values: Mapping[str, float], total_value: float) -> List[Tuple[str, float, float]]:
+    """
+    Sortiert die Kategorien einer Dimension absteigend nach Wert und berechnet Anteile
+
+    Args:
+        category_values: Kategorie -> Summe (Ergebnis von aggregate für eine Dimension)
+        total_value: Gesamtwert für die Prozentberechnung
+
+    Returns:
+        Liste von (Kategorie, Wert, Prozent)
+    """
+    return [
+        (category, value, (value / total_value * 100) if total_value > 0 else 0)
+        for category, value in sorted(category_values.items(), key=lambda x: x[1], reverse=True)
+    ]
@@ -1,124 +1,618 @@
 """
 Cache Service für Portfolio-Analysen
-Implementiert einen In-Memory Cache mit 12 Stunden TTL
+Speichert Analysen mit 12 Stunden TTL in einem austauschbaren Backend
+(begrenzter In-Memory LRU-Cache, lokale SQLite-Datei oder Redis)
 """
+import asyncio
 import os
 import json
-import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Any
+from typing import Any, Dict, Optional, Set, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Strukturierter Cache-Key: (Cache-Typ, Benutzer-ID, Portfolio- bzw. Item-ID oder 0)
+CacheKey = Tuple[str, int, int]
+
+
+def estimate_size(value: Any) -> int:
+    """Ungefähre Größe eines Werts in Bytes (Länge der JSON-Darstellung)"""
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+class CacheBackend(ABC):
+    """
+    Abstrakte Basisklasse für Cache-Backends.
+    Backends speichern JSON-serialisierbare Werte unter strukturierten Keys (CacheKey) und verwerfen
+    sie nach Ablauf der TTL. Über einen Index pro Benutzer bzw. Typ lassen sich alle Einträge eines
+    Benutzers oder Typs löschen, ohne den gesamten Cache zu durchsuchen.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: CacheKey) -> Optional[Any]:
+        """Liefert den Wert oder None, wenn nicht vorhanden/abgelaufen"""
+
+    @abstractmethod
+    def set(self, key: CacheKey, value: Any, ttl_seconds: float) -> None:
+        """Speichert einen Wert für ttl_seconds Sekunden"""
+
+    @abstractmethod
+    def delete(self, key: CacheKey) -> bool:
+        """Löscht einen Wert; True, wenn er vorhanden war"""
+
+    @abstractmethod
+    def delete_user(self, user_id: int, cache_type: Optional[str] = None) -> int:
+        """Löscht alle Werte eines Benutzers (optional nur eines Typs) und liefert deren Anzahl"""
+
+    @abstractmethod
+    def delete_type(self, cache_type: str) -> int:
+        """Löscht alle Werte eines Typs und liefert deren Anzahl"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Löscht alle Werte des Backends"""
+
+    def sweep(self) -> int:
+        """Entfernt abgelaufene Werte und liefert deren Anzahl"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Kennzahlen des Backends (Einträge, belegte Bytes, Verdrängungen)"""
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-Process LRU-Cache mit TTL, maximaler Anzahl Einträge und optionaler Speichergrenze.
+    Die Größe eines Eintrags wird beim Schreiben geschätzt; übersteigt die Summe max_bytes,
+    werden die am längsten nicht genutzten Einträge verdrängt.
+    Nicht zwischen mehreren uvicorn-Workern geteilt und nach einem Neustart leer.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_entries: Maximale Anzahl Einträge (älteste unbenutzte werden verdrängt)
+            max_bytes: Maximale geschätzte Gesamtgröße in Bytes (None: unbegrenzt)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.evictions = 0
+        self.expirations = 0
+        # Key -> (Wert, Ablaufzeitpunkt, geschätzte Größe)
+        self._entries: "OrderedDict[CacheKey, Tuple[Any, float, int]]" = OrderedDict()
+        # Sekundärindizes: Benutzer-ID bzw. Typ -> Keys
+        self._by_user: Dict[int, Set[CacheKey]] = {}
+        self._by_type: Dict[str, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key: CacheKey) -> Optional[Tuple[Any, float, int]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry[2]
+            cache_type, user_id, _ = key
+            for index, index_key in ((self._by_user, user_id), (self._by_type, cache_type)):
+                keys = index[index_key]
+                keys.discard(key)
+                if not keys:
+                    del index[index_key]
+        return entry
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if time.time() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: Any, ttl_seconds: float) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                logger.warning(f"Cache-Eintrag mit {size} Bytes überschreitet die Speichergrenze und wird nicht gespeichert")
+                return
+            self._entries[key] = (value, time.time() + ttl_seconds, size)
+            self.bytes_used += size
+            self._by_user.setdefault(key[1], set()).add(key)
+            self._by_type.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.bytes_used > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: CacheKey) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def delete_user(self, user_id: int, cache_type: Optional[str] = None) -> int:
+        with self._lock:
+            keys = [key for key in self._by_user.get(user_id, ()) if cache_type is None or key[0] == cache_type]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def delete_type(self, cache_type: str) -> int:
+        with self._lock:
+            keys = list(self._by_type.get(cache_type, ()))
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._by_type.clear()
+            self.bytes_used = 0
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._entries.items() if now >= expires_at]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Persistenter lokaler Cache auf Basis einer SQLite-Datei.
+    Übersteht Neustarts und wird von allen Workern auf demselben Host geteilt.
+    Der Primärschlüssel (user_id, cache_type, item_id) dient zugleich als Index pro Benutzer.
+    Übersteigt die Größe der gespeicherten Werte max_bytes, werden die zuerst ablaufenden
+    (also ältesten) Einträge gelöscht.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: Pfad zur SQLite-Datei (":memory:" für einen flüchtigen Speicher)
+            max_bytes: Maximale Gesamtgröße der gespeicherten Werte in Bytes (None: unbegrenzt)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "user_id INTEGER NOT NULL, "
+                "cache_type TEXT NOT NULL, "
+                "item_id INTEGER NOT NULL, "
+                "value TEXT NOT NULL, "
+                "size_bytes INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, "
+                "PRIMARY KEY (user_id, cache_type, item_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_cache_type ON cache_entries (cache_type)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (expires_at)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _params(key: CacheKey) -> Tuple[int, str, int]:
+        cache_type, user_id, item_id = key
+        return user_id, cache_type, item_id
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE user_id = ? AND cache_type = ? AND item_id = ?",
+                self._params(key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if time.time() >= expires_at:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE user_id = ? AND cache_type = ? AND item_id = ?",
+                    self._params(key)
+                )
+                self._conn.commit()
+                self.expirations += 1
+                return None
+        return json.loads(value)
+
+    def set(self, key: CacheKey, value: Any, ttl_seconds: float) -> None:
+        payload = json.dumps(value)
+        size = len(payload.encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            logger.warning(f"Cache-Eintrag mit {size} Bytes überschreitet die Speichergrenze und wird nicht gespeichert")
+            self.delete(key)
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cache_entries (user_id, cache_type, item_id, value, size_bytes, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id, cache_type, item_id) DO UPDATE SET value = excluded.value, "
+                "size_bytes = excluded.size_bytes, expires_at = excluded.expires_at",
+                self._params(key) + (payload, size, time.time() + ttl_seconds)
+            )
+            if self.max_bytes is not None:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rowids = []
+        for rowid, size in self._conn.execute("SELECT rowid, size_bytes FROM cache_entries ORDER BY expires_at"):
+            if total <= self.max_bytes:
+                break
+            rowids.append((rowid,))
+            total -= size
+        self._conn.executemany("DELETE FROM cache_entries WHERE rowid = ?", rowids)
+        self.evictions += len(rowids)
+
+    def _delete_where(self, condition: str, params: tuple) -> int:
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM cache_entries WHERE {condition}", params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def delete(self, key: CacheKey) -> bool:
+        return self._delete_where("user_id = ? AND cache_type = ? AND item_id = ?", self._params(key)) > 0
+
+    def delete_user(self, user_id: int, cache_type: Optional[str] = None) -> int:
+        if cache_type is None:
+            return self._delete_where("user_id = ?", (user_id,))
+        return self._delete_where("user_id = ? AND cache_type = ?", (user_id, cache_type))
+
+    def delete_type(self, cache_type: str) -> int:
+        return self._delete_where("cache_type = ?", (cache_type,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+            self._conn.commit()
+
+    def sweep(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            self.expirations += cursor.rowcount
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM cache_entries"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache in Redis (oder einem Redis-kompatiblen Server), geteilt zwischen allen Workern und Hosts.
+    Erwartet einen Client mit der redis-py-API (get, set mit ex, delete, scan_iter, sadd, srem,
+    smembers, expire); Ablauf und Speichergrenze (maxmemory-policy) übernimmt Redis selbst.
+    Die Indizes pro Benutzer und Typ sind Redis-Sets mit den Keys der Einträge; sie laufen mit dem
+    zuletzt geschriebenen Eintrag ab und können bereits abgelaufene Keys enthalten.
+    """
+
+    name = "redis"
+
+    def __init__(self, client: Any, prefix: str = "analysis_cache:"):
+        """
+        Args:
+            client: Redis-Client (z.B. redis.Redis.from_url(...))
+            prefix: Namensraum der Keys, damit clear() nur eigene Einträge löscht
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: CacheKey) -> str:
+        cache_type, user_id, item_id = key
+        return f"{self.prefix}{cache_type}:{user_id}:{item_id}"
+
+    def _user_index(self, user_id: int) -> str:
+        return f"{self.prefix}idx:user:{user_id}"
+
+    def _type_index(self, cache_type: str) -> str:
+        return f"{self.prefix}idx:type:{cache_type}"
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        payload = self.client.get(self._key(key))
+        return json.loads(payload) if payload is not None else None
+
+    def set(self, key: CacheKey, value: Any, ttl_seconds: float) -> None:
+        # Redis akzeptiert nur ganze Sekunden > 0
+        ttl = max(1, int(ttl_seconds))
+        name = self._key(key)
+        self.client.set(name, json.dumps(value), ex=ttl)
+        for index in (self._user_index(key[1]), self._type_index(key[0])):
+            self.client.sadd(index, name)
+            self.client.expire(index, ttl)
+
+    def delete(self, key: CacheKey) -> bool:
+        name = self._key(key)
+        self.client.srem(self._user_index(key[1]), name)
+        self.client.srem(self._type_index(key[0]), name)
+        return self.client.delete(name) > 0
+
+    def _delete_indexed(self, index: str, cache_type: Optional[str] = None) -> int:
+        names = [name.decode() if isinstance(name, bytes) else name for name in self.client.smembers(index)]
+        if cache_type is not None:
+            names = [name for name in names if name.startswith(f"{self.prefix}{cache_type}:")]
+        if not names:
+            return 0
+        self.client.srem(index, *names)
+        return self.client.delete(*names)
+
+    def delete_user(self, user_id: int, cache_type: Optional[str] = None) -> int:
+        return self._delete_indexed(self._user_index(user_id), cache_type)
+
+    def delete_type(self, cache_type: str) -> int:
+        return self._delete_indexed(self._type_index(cache_type))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
 class CacheService:
     """
-    Einfacher In-Memory Cache für Portfolio-Analysen.
-    In Produktion sollte Redis oder ein ähnlicher Cache verwendet werden.
+    Cache für Portfolio- und Watchlist-Analysen vor einem austauschbaren Backend.
+    Ein optionaler Sweeper entfernt abgelaufene Einträge periodisch, auch wenn sie nie wieder
+    gelesen werden (z.B. von inaktiven Benutzern).
     """
-    
-    def __init__(self, ttl_hours: int = 12):
+
+    def __init__(self, ttl_hours: int = 12, backend: Optional[CacheBackend] = None):
         """
         Initialisiert den Cache Service
-        
+
         Args:
             ttl_hours: Time-to-Live in Stunden (Standard: 12)
+            backend: Speicher-Backend (Standard: In-Memory LRU-Cache)
         """
-        self.cache: dict = {}
+        self.backend = backend or MemoryCacheBackend()
         self.ttl_hours = ttl_hours
-    
-    def _generate_key(self, user_id: int, portfolio_id: Optional[int] = None, cache_type: str = "portfolio") -> str:
-        """
-        Generiert einen eindeutigen Cache-Key für einen Benutzer
-        
-        Args:
-            user_id: Benutzer-ID
-            portfolio_id: Optionale Portfolio-ID
-            cache_type: Art des Caches ("portfolio" oder "watchlist")
-            
-        Returns:
-            Cache-Key als String
-        """
-        key_data = f"{cache_type}_analysis_{user_id}"
-        if portfolio_id:
-            key_data += f"_{portfolio_id}"
-        
-        return hashlib.md5(key_data.encode()).hexdigest()
-    
+        self.hits = 0
+        self.misses = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(user_id: int, portfolio_id: Optional[int] = None, cache_type: str = "portfolio") -> CacheKey:
+        """Strukturierter Cache-Key; Einträge ohne Portfolio-ID erhalten die ID 0"""
+        return (cache_type, user_id, portfolio_id or 0)
+
     def get(self, user_id: int, portfolio_id: Optional[int] = None, cache_type: str = "portfolio") -> Optional[dict]:
         """
         Holt eine gecachte Analyse aus dem Cache
-        
+
         Args:
             user_id: Benutzer-ID
             portfolio_id: Optionale Portfolio-ID
             cache_type: Art des Caches ("portfolio" oder "watchlist")
-            
+
         Returns:
             Gecachte Analyse oder None wenn nicht vorhanden/abgelaufen
         """
-        key = self._generate_key(user_id, portfolio_id, cache_type)
-        
-        if key not in self.cache:
+        key = self._key(user_id, portfolio_id, cache_type)
+
+        try:
+            data = self.backend.get(key)
+        except Exception as e:
+            # Ein nicht erreichbares Backend darf Analysen nicht verhindern
+            logger.warning(f"Cache-Backend {self.backend.name} nicht lesbar: {e}")
+            self.misses += 1
             return None
-        
-        cached_item = self.cache[key]
-        expires_at = cached_item.get('expires_at')
-        
-        # Prüfe ob Cache abgelaufen ist
-        if expires_at and datetime.utcnow() > expires_at:
-            del self.cache[key]
-            logger.info(f"Cache abgelaufen für User {user_id} ({cache_type})")
+
+        if data is None:
+            self.misses += 1
             return None
-        
+
+        self.hits += 1
         logger.info(f"Cache Hit für User {user_id} ({cache_type})")
-        return cached_item.get('data')
-    
+        return data
+
     def set(self, user_id: int, data: dict, portfolio_id: Optional[int] = None, cache_type: str = "portfolio") -> None:
         """
         Speichert eine Analyse im Cache
-        
+
         Args:
             user_id: Benutzer-ID
             data: Zu cachende Daten
             portfolio_id: Optionale Portfolio-ID
             cache_type: Art des Caches ("portfolio" oder "watchlist")
         """
-        key = self._generate_key(user_id, portfolio_id, cache_type)
+        key = self._key(user_id, portfolio_id, cache_type)
         expires_at = datetime.utcnow() + timedelta(hours=self.ttl_hours)
-        
-        self.cache[key] = {
-            'data': data,
-            'expires_at': expires_at,
-            'created_at': datetime.utcnow()
-        }
-        
+
+        try:
+            self.backend.set(key, data, self.ttl_hours * 3600)
+        except Exception as e:
+            logger.warning(f"Cache-Backend {self.backend.name} nicht beschreibbar: {e}")
+            return
+
         logger.info(f"Cache gespeichert für User {user_id} ({cache_type}), läuft ab um {expires_at}")
-    
+
     def invalidate(self, user_id: int, portfolio_id: Optional[int] = None, cache_type: str = "portfolio") -> None:
         """
         Invalidiert den Cache für einen Benutzer
-        
+
         Args:
             user_id: Benutzer-ID
             portfolio_id: Optionale Portfolio-ID
             cache_type: Art des Caches ("portfolio" oder "watchlist")
         """
-        key = self._generate_key(user_id, portfolio_id, cache_type)
-        if key in self.cache:
-            del self.cache[key]
+        key = self._key(user_id, portfolio_id, cache_type)
+        try:
+            removed = self.backend.delete(key)
+        except Exception as e:
+            # Die Änderung ist bereits gespeichert; ein nicht erreichbares Backend darf sie nicht scheitern lassen
+            logger.warning(f"Cache-Backend {self.backend.name} nicht invalidierbar: {e}")
+            return
+        if removed:
             logger.info(f"Cache invalidiert für User {user_id}")
-    
+
+    def invalidate_user(self, user_id: int, cache_type: Optional[str] = None) -> int:
+        """
+        Invalidiert alle Einträge eines Benutzers über den Index pro Benutzer
+
+        Args:
+            user_id: Benutzer-ID
+            cache_type: Optional nur Einträge dieses Typs ("portfolio" oder "watchlist")
+
+        Returns:
+            Anzahl gelöschter Einträge
+        """
+        try:
+            removed = self.backend.delete_user(user_id, cache_type)
+        except Exception as e:
+            logger.warning(f"Cache-Backend {self.backend.name} nicht invalidierbar: {e}")
+            return 0
+        if removed:
+            logger.info(f"Cache invalidiert für User {user_id}: {removed} Einträge")
+        return removed
+
+    def invalidate_type(self, cache_type: str) -> int:
+        """
+        Invalidiert alle Einträge eines Typs (z.B. nach Änderung des Analyse-Prompts)
+
+        Returns:
+            Anzahl gelöschter Einträge
+        """
+        try:
+            removed = self.backend.delete_type(cache_type)
+        except Exception as e:
+            logger.warning(f"Cache-Backend {self.backend.name} nicht invalidierbar: {e}")
+            return 0
+        if removed:
+            logger.info(f"Cache invalidiert für Typ {cache_type}: {removed} Einträge")
+        return removed
+
     def clear(self) -> None:
         """Löscht den gesamten Cache"""
-        self.cache.clear()
+        self.backend.clear()
         logger.info("Cache geleert")
 
+    def sweep(self) -> int:
+        """Entfernt alle abgelaufenen Einträge und liefert deren Anzahl"""
+        removed = self.backend.sweep()
+        if removed:
+            logger.info(f"Cache-Sweeper: {removed} abgelaufene Einträge entfernt")
+        return removed
 
-# Globale Cache-Instanz
-cache_service = CacheService(ttl_hours=12)
+    def stats(self) -> Dict[str, Any]:
+        """Kennzahlen für das Monitoring (Treffer, Fehlzugriffe, Verdrängungen, belegte Bytes)"""
+        stats = {"backend": self.backend.name, "hits": self.hits, "misses": self.misses}
+        try:
+            stats.update(self.backend.stats())
+        except Exception as e:
+            logger.warning(f"Kennzahlen des Cache-Backends {self.backend.name} nicht verfügbar: {e}")
+        return stats
+
+    def start_sweeper(self, interval_seconds: float) -> None:
+        """Startet den periodischen Sweeper im laufenden Event-Loop"""
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        self._sweeper = asyncio.get_running_loop().create_task(self._run_sweeper(interval_seconds))
+        logger.info(f"Cache-Sweeper gestartet (alle {interval_seconds}s)")
 
+    async def stop_sweeper(self) -> None:
+        """Stoppt den Sweeper"""
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
 
+    async def _run_sweeper(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                # SQLite-Backends blockieren; nicht im Event-Loop ausführen
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.warning(f"Cache-Sweeper fehlgeschlagen: {e}")
 
 
+def create_cache_backend() -> CacheBackend:
+    """
+    Erstellt das Cache-Backend anhand der Umgebungsvariablen
 
+    CACHE_BACKEND: "memory" (Standard), "sqlite" oder "redis"
+    CACHE_MAX_ENTRIES: Maximale Anzahl Einträge des "memory"-Backends
+    CACHE_MAX_MB: Speichergrenze der "memory"- und "sqlite"-Backends in MB (0: unbegrenzt)
+    CACHE_DB_PATH: Pfad zur SQLite-Datei für das "sqlite"-Backend
+    REDIS_URL: Verbindungs-URL für das "redis"-Backend
+    """
+    backend_name = os.getenv("CACHE_BACKEND", "memory").lower()
+    max_mb = float(os.getenv("CACHE_MAX_MB", "64"))
+    max_bytes = int(max_mb * 1024 * 1024) if max_mb > 0 else None
+
+    if backend_name == "sqlite":
+        path = os.getenv("CACHE_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "analysis_cache.db"))
+        logger.info(f"Verwende SQLite-Cache: {path}")
+        return SQLiteCacheBackend(path, max_bytes=max_bytes)
+
+    if backend_name == "redis":
+        try:
+            import redis
+        except ImportError:
+            logger.warning("CACHE_BACKEND=redis, aber das Paket 'redis' ist nicht installiert; verwende In-Memory-Cache")
+        else:
+            url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            logger.info(f"Verwende Redis-Cache: {url}")
+            return RedisCacheBackend(redis.Redis.from_url(url))
+    elif backend_name != "memory":
+        logger.warning(f"Unbekanntes CACHE_BACKEND '{backend_name}', verwende In-Memory-Cache")
+
+    return MemoryCacheBackend(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1000")), max_bytes=max_bytes)
+
+
+# Intervall des Sweepers für abgelaufene Einträge (Sekunden)
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "300"))
+
+# Globale Cache-Instanz
+cache_service = CacheService(ttl_hours=12, backend=create_cache_backend())
@@ -0,0 +1,287 @@
+"""
+Classification Worker
+Klassifiziert Instrumente (Branche, Region, Assetklasse) im Hintergrund über eine In-Process-Queue,
+damit GET /api/portfolio nicht auf OpenAI wartet. Abgeschlossene Klassifizierungen werden an
+Abonnenten (z.B. Server-Sent Events) verteilt.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from sqlalchemy import and_, or_
+
+from models import Instrument, PortfolioHolding, WatchlistItem
+from services.instrument_service import (
+    CLASSIFICATION_FIELDS,
+    InstrumentIndex,
+    apply_classification,
+    classification_backoff,
+    get_or_create_instrument,
+    is_classified,
+    load_instruments,
+    needs_classification,
+    store_classification,
+)
+from services.price_service import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+# (ISIN, Ticker, Name) eines zu klassifizierenden Instruments
+InstrumentRequest = Tuple[Optional[str], Optional[str], Optional[str]]
+
+# Funktion, die Positionen ({position_id, name, isin, ticker}) klassifiziert
+ClassifyFunction = Callable[[List[Dict[str, Any]]], Awaitable[Dict[int, Dict[str, str]]]]
+
+
+def request_key(isin: Optional[str], ticker: Optional[str]) -> Optional[str]:
+    """Schlüssel eines Instruments in der Queue (ISIN, sonst Ticker)"""
+    return normalize_symbol(isin) or normalize_symbol(ticker)
+
+
+class ClassificationWorker:
+    """
+    Hintergrund-Worker mit In-Process-Queue.
+    Jedes Instrument ist höchstens einmal gleichzeitig in der Queue; mehrere Instrumente
+    werden gesammelt und mit einem OpenAI-Aufruf klassifiziert.
+    """
+
+    def __init__(self, batch_size: int = 20, batch_wait_seconds: float = 0.5):
+        """
+        Args:
+            batch_size: Maximale Anzahl Instrumente pro OpenAI-Aufruf
+            batch_wait_seconds: Wartezeit, um weitere Instrumente für einen Batch zu sammeln
+        """
+        self.batch_size = batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self._classify: Optional[ClassifyFunction] = None
+        self._session_factory: Optional[Callable[[], Any]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, InstrumentRequest] = {}
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def start(self, classify: ClassifyFunction, session_factory: Callable[[], Any]) -> None:
+        """Startet den Worker im laufenden Event-Loop"""
+        if self.running:
+            return
+        self._classify = classify
+        self._session_factory = session_factory
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Classification-Worker gestartet")
+
+    async def stop(self) -> None:
+        """Stoppt den Worker (noch offene Instrumente werden beim nächsten Abruf erneut eingereiht)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+        self._pending.clear()
+        logger.info("Classification-Worker gestoppt")
+
+    def enqueue(self, requests: Iterable[InstrumentRequest]) -> int:
+        """
+        Reiht Instrumente zur Klassifizierung ein (bereits eingereihte werden übersprungen)
+
+        Returns:
+            Anzahl neu eingereihter Instrumente
+        """
+        queue = self._get_queue()
+        added = 0
+        for isin, ticker, name in requests:
+            key = request_key(isin, ticker)
+            if not key or key in self._pending:
+                continue
+            self._pending[key] = (normalize_symbol(isin), normalize_symbol(ticker), name)
+            queue.put_nowait(key)
+            added += 1
+        if added:
+            logger.info(f"{added} Instrumente zur Klassifizierung eingereiht ({len(self._pending)} offen)")
+        return added
+
+    def is_pending(self, key: Optional[str]) -> bool:
+        return key in self._pending
+
+    def subscribe(self) -> asyncio.Queue:
+        """Abonniert abgeschlossene Klassifizierungen (Events mit key, isin, ticker, classification)"""
+        subscriber: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue) -> None:
+        self._subscribers.discard(subscriber)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        for subscriber in list(self._subscribers):
+            subscriber.put_nowait(event)
+
+    async def _next_batch(self) -> List[str]:
+        queue = self._get_queue()
+        batch = [await queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            keys = await self._next_batch()
+            try:
+                await self.process(keys)
+            except Exception as e:
+                logger.error(f"Fehler im Classification-Worker: {e}", exc_info=True)
+                classification_backoff.failed(keys)
+                for key in keys:
+                    self._pending.pop(key, None)
+
+    async def process(self, keys: List[str]) -> None:
+        """Klassifiziert einen Batch von Instrumenten und speichert das Ergebnis"""
+        requests = [self._pending[key] for key in keys if key in self._pending]
+        if not requests:
+            return
+
+        classification = await self._classify([
+            {"position_id": i, "name": name, "isin": isin, "ticker": ticker}
+            for i, (isin, ticker, name) in enumerate(requests)
+        ])
+        results = {i: classification.get(i) for i in range(len(requests))}
+
+        # Datenbankzugriffe sind synchron und laufen deshalb in einem Thread
+        stored = await asyncio.to_thread(self._store, requests, results)
+
+        for i, (isin, ticker, _) in enumerate(requests):
+            key = request_key(isin, ticker)
+            self._pending.pop(key, None)
+            self._publish({
+                "key": key,
+                "isin": isin,
+                "ticker": ticker,
+                "classification": stored.get(i),
+            })
+
+    def _store(
+        self,
+        requests: List[InstrumentRequest],
+        results: Dict[int, Optional[Dict[str, str]]]
+    ) -> Dict[int, Dict[str, Optional[str]]]:
+        """
+        Speichert die Klassifizierungen an den Instrumenten und ergänzt fehlende Felder
+        aller Portfolio-Positionen und Watchlist-Einträge mit demselben Instrument
+
+        Returns:
+            Gespeicherte Klassifizierung je Index der Anfrage
+        """
+        db = self._session_factory()
+        try:
+            instruments = load_instruments(db, ((isin, ticker) for isin, ticker, _ in requests))
+            stored: Dict[int, Dict[str, Optional[str]]] = {}
+
+            for i, (isin, ticker, name) in enumerate(requests):
+                classification = results.get(i)
+                if classification is None:
+                    classification_backoff.failed([request_key(isin, ticker)])
+                    continue
+
+                instrument = get_or_create_instrument(db, instruments, isin, ticker, name)
+                store_classification(instrument, classification)
+                stored[i] = {field: getattr(instrument, field) for field in CLASSIFICATION_FIELDS}
+
+                for model in (PortfolioHolding, WatchlistItem):
+                    fill_missing_classification(db, model, instrument)
+
+            db.commit()
+            return stored
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def fill_missing_classification(db, model: Any, instrument: Instrument) -> None:
+    """Setzt fehlende Klassifizierungsfelder aller Positionen eines Instruments (ein UPDATE je Feld)"""
+    conditions = []
+    if instrument.isin:
+        conditions.append(model.isin == instrument.isin)
+    if instrument.ticker:
+        conditions.append(and_(model.isin.is_(None), model.ticker == instrument.ticker))
+    if not conditions:
+        return
+
+    for field in CLASSIFICATION_FIELDS:
+        value = getattr(instrument, field)
+        if not value:
+            continue
+        column = getattr(model, field)
+        db.query(model).filter(
+            or_(*conditions),
+            or_(column.is_(None), column == "")
+        ).update({column: value}, synchronize_session=False)
+
+
+def classify_holdings(db, holdings: List[Any]) -> InstrumentIndex:
+    """
+    Übernimmt die Klassifizierung aus den gemeinsamen Instrument-Stammdaten in die Positionen
+    (eine Abfrage für alle), legt fehlende Instrumente an und reiht fehlende oder veraltete
+    Klassifizierungen einmal pro Instrument beim Worker ein, ohne auf OpenAI zu warten.
+    Änderungen werden committet.
+
+    Returns:
+        Die geladenen Instrumente der Positionen
+    """
+    instruments = load_instruments(db, ((h.isin, h.ticker) for h in holdings))
+    changed = False
+    # Instrumente, die im Hintergrund bei OpenAI angefragt werden (einmal pro Instrument)
+    pending: Dict[int, InstrumentRequest] = {}
+
+    for holding in holdings:
+        instrument = instruments.get(holding.isin, holding.ticker)
+        changed |= apply_classification(holding, instrument)
+
+        if not is_classified(instrument):
+            # Instrument anlegen bzw. mit der vorhandenen Klassifizierung der Position ergänzen
+            existing = instrument
+            instrument = get_or_create_instrument(
+                db, instruments, holding.isin, holding.ticker, holding.name,
+                {field: getattr(holding, field) for field in CLASSIFICATION_FIELDS}
+            )
+            # Unvollständige Instrumente (z.B. "Unbekannt" bis zur nächsten Anfrage) bleiben oft unverändert
+            changed |= existing is None or db.is_modified(instrument)
+
+        if needs_classification(instrument):
+            pending.setdefault(id(instrument), (instrument.isin, instrument.ticker, instrument.name or holding.name))
+
+    if changed:
+        # Commit alle Änderungen auf einmal
+        db.commit()
+
+    if pending:
+        classification_worker.enqueue(pending.values())
+    return instruments
+
+
+# Globale Worker-Instanz
+classification_worker = ClassificationWorker(
+    batch_size=int(os.getenv("CLASSIFICATION_BATCH_SIZE", "20"))
+)
@@ -0,0 +1,134 @@
+"""
+Instrument Analysis Cache
+Benutzerübergreifender Cache für Einzelwert-Analysen. Der Schlüssel besteht aus Instrument
+(ISIN, sonst Ticker), Risikoprofil, Anlagehorizont und Zeitfenster (Standard: ein Tag), sodass
+alle Benutzer mit gleichem Profil dieselbe Analyse eines Wertpapiers erhalten.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import logging
+
+from services.price_service import normalize_symbol
+from services.single_flight import analysis_flights
+
+logger = logging.getLogger(__name__)
+
+# Positionsdaten, die in den Prompt einer Portfolio-Position eingehen
+POSITION_FIELDS = ("quantity", "purchase_price", "purchase_date")
+
+
+class InstrumentAnalysisCache:
+    """
+    Speichert Analysen pro (Instrument, Risikoprofil, Anlagehorizont, Positionsdaten, Zeitfenster).
+    Mit Beginn eines neuen Zeitfensters ändert sich der Schlüssel; alte Einträge werden nicht mehr
+    getroffen und per LRU verdrängt.
+    """
+
+    def __init__(self, bucket_hours: float = 24, max_entries: int = 5000):
+        """
+        Args:
+            bucket_hours: Länge eines Zeitfensters in Stunden (Analysen gelten bis zu dessen Ende)
+            max_entries: Maximale Anzahl gespeicherter Analysen (LRU-Verdrängung)
+        """
+        self.bucket_seconds = bucket_hours * 3600
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Dict[str, Any], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bucket(self, now: Optional[float] = None) -> int:
+        """Nummer des aktuellen Zeitfensters (UTC)"""
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+
+    def key(
+        self,
+        asset: Dict[str, Any],
+        user_settings: Optional[Dict[str, Any]] = None,
+        now: Optional[float] = None
+    ) -> Optional[Hashable]:
+        """
+        Schlüssel einer Analyse oder None, wenn das Asset weder ISIN noch Ticker hat.
+        Positionen (mit Kaufdaten im Prompt) werden nur mit identischen Kaufdaten geteilt.
+        """
+        symbol = normalize_symbol(asset.get("isin")) or normalize_symbol(asset.get("ticker"))
+        if not symbol:
+            return None
+        settings = user_settings or {}
+        position = tuple(asset.get(field) for field in POSITION_FIELDS) if "purchase_price" in asset else None
+        return (
+            symbol,
+            settings.get("riskProfile"),
+            settings.get("investmentHorizon"),
+            position,
+            self.bucket(now)
+        )
+
+    def get(self, key: Optional[Hashable]) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Liefert (Analyse, Analysezeitpunkt) oder None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        analysis, analysis_date = entry
+        # Aufrufer ergänzen die Analyse (z.B. generated_at); der Cache bleibt unverändert
+        return copy.deepcopy(analysis), analysis_date
+
+    def set(self, key: Optional[Hashable], analysis: Dict[str, Any], analysis_date: str) -> None:
+        """Speichert eine Analyse für alle Benutzer mit gleichem Schlüssel"""
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(analysis), analysis_date)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_analyze(
+        self,
+        key: Optional[Hashable],
+        analyze: Callable[[], Awaitable[Dict[str, Any]]],
+        force_refresh: bool = False
+    ) -> Tuple[Dict[str, Any], str, bool]:
+        """
+        Liefert die gespeicherte Analyse oder führt analyze() aus und speichert das Ergebnis.
+        Gleichzeitige Anfragen zum selben Schlüssel (auch verschiedener Benutzer) warten auf
+        denselben OpenAI-Aufruf.
+
+        Returns:
+            (Analyse, Analysezeitpunkt, aus dem Cache)
+        """
+        if not force_refresh:
+            entry = self.get(key)
+            if entry:
+                logger.info(f"Instrument-Cache Hit für {key[0]}")
+                return entry + (True,)
+
+        async def compute() -> Tuple[Dict[str, Any], str]:
+            analysis = await analyze()
+            analysis_date = datetime.utcnow().isoformat()
+            self.set(key, analysis, analysis_date)
+            return analysis, analysis_date
+
+        flight_key = ("instrument",) + key if key is not None else None
+        analysis, analysis_date = await analysis_flights.do(flight_key, compute)
+        # Das Ergebnis wird mit anderen Anfragen geteilt
+        return copy.deepcopy(analysis), analysis_date, False
+
+    def clear(self) -> None:
+        """Verwirft alle Analysen"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Globale Cache-Instanz
+instrument_analysis_cache = InstrumentAnalysisCache(
+    bucket_hours=float(os.getenv("INSTRUMENT_ANALYSIS_BUCKET_HOURS", "24")),
+    max_entries=int(os.getenv("INSTRUMENT_ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+)
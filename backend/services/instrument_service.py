@@ -0,0 +1,303 @@
+"""
+Instrument Service
+Zentrale Stammdaten je Wertpapier (ISIN/Ticker) mit Branche, Region und Assetklasse.
+Die Klassifizierung wird einmal pro Instrument gespeichert und von allen Benutzern geteilt,
+statt sie für jede Portfolio-Position und jeden Watchlist-Eintrag neu zu bestimmen.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Instrument
+from services.price_service import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+# Klassifizierungsfelder eines Instruments
+CLASSIFICATION_FIELDS = ("sector", "region", "asset_class")
+
+# Platzhalter für nicht bestimmbare Klassifizierungen
+UNKNOWN_CLASSIFICATION = "Unbekannt"
+
+# Nach wie vielen Tagen "Unbekannt"-Antworten erneut bei OpenAI angefragt werden
+CLASSIFICATION_RETRY_DAYS = int(os.getenv("CLASSIFICATION_RETRY_DAYS", "7"))
+
+# Nach wie vielen Tagen vollständige OpenAI-Klassifizierungen aufgefrischt werden
+CLASSIFICATION_REFRESH_DAYS = int(os.getenv("CLASSIFICATION_REFRESH_DAYS", "180"))
+
+# Wartezeit nach einem fehlgeschlagenen OpenAI-Aufruf (Sekunden)
+CLASSIFICATION_FAILURE_BACKOFF_SECONDS = int(os.getenv("CLASSIFICATION_FAILURE_BACKOFF_SECONDS", "300"))
+
+# Bekannte Klassifizierungen (Startdaten der Instrument-Tabelle)
+SEED_INSTRUMENTS = {
+    "US0378331005": ("Technologie", "Nordamerika", "Aktien"),
+    "US5949181045": ("Technologie", "Nordamerika", "Aktien"),
+    "US02079K3059": ("Technologie", "Nordamerika", "Aktien"),
+    "US0231351067": ("E-Commerce", "Nordamerika", "Aktien"),
+    "DE000BASF111": ("Chemie", "Europa", "Aktien"),
+    "US09075V1026": ("Biotechnologie", "Nordamerika", "Aktien"),
+    "CNE100000296": ("Automobil", "Asien", "Aktien"),
+    "US1912161007": ("Getränke", "Nordamerika", "Aktien"),
+    "DE0005552004": ("Logistik", "Europa", "Aktien"),
+    "US2546871060": ("Medien", "Nordamerika", "Aktien"),
+    "US28852N1090": ("Finanzen", "Nordamerika", "Aktien"),
+    "DE0006231004": ("Halbleiter", "Europa", "Aktien"),
+    "DE000LS9TQA1": ("Finanzen", "Europa", "Aktien"),
+    "DE0007100000": ("Automobil", "Europa", "Aktien"),
+    "US30303M1027": ("Technologie", "Nordamerika", "Aktien"),
+    "US6410694060": ("Konsumgüter", "Europa", "Aktien"),
+    "US67066G1040": ("Technologie", "Nordamerika", "Aktien"),
+    "US6974351057": ("Cybersicherheit", "Nordamerika", "Aktien"),
+    "US79466L3024": ("Software", "Nordamerika", "Aktien"),
+    "DE0007164600": ("Software", "Europa", "Aktien"),
+    "US86800U3023": ("Technologie", "Nordamerika", "Aktien"),
+    "US92343V1044": ("Telekommunikation", "Nordamerika", "Aktien"),
+    "US92532F1003": ("Biotechnologie", "Nordamerika", "Aktien"),
+    "GB00BH4HKS39": ("Telekommunikation", "Europa", "Aktien"),
+}
+
+
+def is_classified(instrument: Optional[Any]) -> bool:
+    """Prüft, ob Branche, Region und Assetklasse gesetzt sind"""
+    return instrument is not None and all(getattr(instrument, field) for field in CLASSIFICATION_FIELDS)
+
+
+def instrument_key(instrument: Instrument) -> Optional[str]:
+    """Normalisierter Schlüssel eines Instruments (ISIN, sonst Ticker)"""
+    return instrument.isin or instrument.ticker
+
+
+def needs_classification(instrument: Optional[Instrument], now: Optional[datetime] = None) -> bool:
+    """
+    Prüft, ob ein Instrument bei OpenAI klassifiziert werden soll
+
+    - Unvollständige Instrumente werden erneut angefragt, wenn sie noch nie angefragt wurden
+      oder die letzte Antwort ("Unbekannt") älter als CLASSIFICATION_RETRY_DAYS ist
+    - Vollständige Instrumente aus OpenAI werden nach CLASSIFICATION_REFRESH_DAYS aufgefrischt
+    - Nach einem fehlgeschlagenen Aufruf wird das Instrument eine Weile übersprungen
+    """
+    if instrument is not None and not classification_backoff.allows(instrument_key(instrument)):
+        return False
+    if instrument is None or instrument.classified_at is None:
+        return not is_classified(instrument)
+
+    now = now or datetime.utcnow()
+    age = now - instrument.classified_at
+    if is_classified(instrument):
+        return age > timedelta(days=CLASSIFICATION_REFRESH_DAYS)
+    return age > timedelta(days=CLASSIFICATION_RETRY_DAYS)
+
+
+def store_classification(
+    instrument: Instrument,
+    classification: Dict[str, Optional[str]],
+    now: Optional[datetime] = None
+) -> None:
+    """
+    Speichert eine OpenAI-Antwort am Instrument.
+    "Unbekannt" überschreibt keine vorhandenen Werte, wird aber über classified_at gemerkt,
+    damit dasselbe Instrument nicht bei jedem Aufruf erneut angefragt wird.
+    """
+    for field in CLASSIFICATION_FIELDS:
+        value = classification.get(field)
+        if value and value != UNKNOWN_CLASSIFICATION:
+            setattr(instrument, field, value)
+    instrument.classified_at = now or datetime.utcnow()
+
+
+class ClassificationBackoff:
+    """Merkt sich im Prozess, welche Instrumente nach einem Fehler vorerst nicht angefragt werden"""
+
+    def __init__(self, seconds: int = 300):
+        self.seconds = seconds
+        self._blocked_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def allows(self, key: Optional[str]) -> bool:
+        if not key:
+            return True
+        with self._lock:
+            until = self._blocked_until.get(key)
+            if until is None:
+                return True
+            if until <= time.monotonic():
+                del self._blocked_until[key]
+                return True
+            return False
+
+    def failed(self, keys: Iterable[Optional[str]]) -> None:
+        until = time.monotonic() + self.seconds
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._blocked_until[key] = until
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocked_until.clear()
+
+
+# Globale Backoff-Instanz
+classification_backoff = ClassificationBackoff(CLASSIFICATION_FAILURE_BACKOFF_SECONDS)
+
+
+def apply_classification(target: Any, instrument: Optional[Instrument]) -> bool:
+    """
+    Übernimmt fehlende Klassifizierungsfelder einer Position aus dem Instrument
+
+    Args:
+        target: PortfolioHolding oder WatchlistItem
+        instrument: Instrument-Stammdaten (oder None)
+
+    Returns:
+        True, wenn mindestens ein Feld gesetzt wurde
+    """
+    if instrument is None:
+        return False
+    changed = False
+    for field in CLASSIFICATION_FIELDS:
+        value = getattr(instrument, field)
+        if value and not getattr(target, field):
+            setattr(target, field, value)
+            changed = True
+    return changed
+
+
+class InstrumentIndex:
+    """In-Memory-Index der Instrumente eines Requests (Lookup zuerst über ISIN, dann Ticker)"""
+
+    def __init__(self, instruments: Iterable[Instrument] = ()):
+        self.by_isin: Dict[str, Instrument] = {}
+        self.by_ticker: Dict[str, Instrument] = {}
+        for instrument in instruments:
+            self.add(instrument)
+
+    def add(self, instrument: Instrument) -> None:
+        if instrument.isin:
+            self.by_isin[instrument.isin] = instrument
+        if instrument.ticker:
+            self.by_ticker.setdefault(instrument.ticker, instrument)
+
+    def get(self, isin: Optional[str], ticker: Optional[str]) -> Optional[Instrument]:
+        isin, ticker = normalize_symbol(isin), normalize_symbol(ticker)
+        if isin and isin in self.by_isin:
+            return self.by_isin[isin]
+        if ticker and ticker in self.by_ticker:
+            instrument = self.by_ticker[ticker]
+            # Ein Ticker passt nur, wenn die ISIN nicht widerspricht
+            if not isin or not instrument.isin or instrument.isin == isin:
+                return instrument
+        return None
+
+
+def load_instruments(db: Session, assets: Iterable[Tuple[Optional[str], Optional[str]]]) -> InstrumentIndex:
+    """
+    Lädt die Instrumente zu mehreren (ISIN, Ticker)-Paaren mit einer Abfrage
+
+    Args:
+        db: Datenbank-Session
+        assets: (ISIN, Ticker) je Position
+    """
+    isins, tickers = set(), set()
+    for isin, ticker in assets:
+        isin, ticker = normalize_symbol(isin), normalize_symbol(ticker)
+        if isin:
+            isins.add(isin)
+        if ticker:
+            tickers.add(ticker)
+
+    conditions = []
+    if isins:
+        conditions.append(Instrument.isin.in_(isins))
+    if tickers:
+        conditions.append(Instrument.ticker.in_(tickers))
+    if not conditions:
+        return InstrumentIndex()
+
+    return InstrumentIndex(db.query(Instrument).filter(or_(*conditions)).all())
+
+
+def get_or_create_instrument(
+    db: Session,
+    index: InstrumentIndex,
+    isin: Optional[str],
+    ticker: Optional[str],
+    name: Optional[str] = None,
+    classification: Optional[Dict[str, Optional[str]]] = None
+) -> Instrument:
+    """
+    Liefert das Instrument zu ISIN/Ticker und legt es bei Bedarf an.
+    Fehlende Stammdaten werden ergänzt, vorhandene Klassifizierungen nicht überschrieben.
+    Änderungen werden nur geflusht; der Commit erfolgt durch den Aufrufer.
+
+    Args:
+        db: Datenbank-Session
+        index: Bereits geladene Instrumente des Requests
+        isin: ISIN (optional)
+        ticker: Ticker (optional)
+        name: Name des Wertpapiers
+        classification: Bekannte Werte für sector, region, asset_class
+    """
+    isin, ticker = normalize_symbol(isin), normalize_symbol(ticker)
+    classification = {
+        field: value
+        for field, value in (classification or {}).items()
+        if field in CLASSIFICATION_FIELDS and value and value != UNKNOWN_CLASSIFICATION
+    }
+
+    instrument = index.get(isin, ticker)
+    if instrument is None:
+        instrument = Instrument(isin=isin, ticker=ticker, name=name, **classification)
+        try:
+            # Savepoint: parallele Anlage desselben Instruments darf den Request nicht abbrechen
+            with db.begin_nested():
+                db.add(instrument)
+        except IntegrityError:
+            # Von einem parallelen Request angelegt: über ISIN bzw. Ticker ohne ISIN neu laden
+            if isin:
+                existing = db.query(Instrument).filter(Instrument.isin == isin)
+            else:
+                existing = db.query(Instrument).filter(Instrument.ticker == ticker, Instrument.isin.is_(None))
+            instrument = existing.first()
+            if instrument is None:
+                raise
+        index.add(instrument)
+        return instrument
+
+    if ticker and not instrument.ticker:
+        instrument.ticker = ticker
+    if name and not instrument.name:
+        instrument.name = name
+    for field, value in classification.items():
+        if not getattr(instrument, field):
+            setattr(instrument, field, value)
+    return instrument
+
+
+def seed_instruments(db: Session) -> int:
+    """
+    Legt die bekannten Klassifizierungen (SEED_INSTRUMENTS) als Instrumente an, falls sie fehlen
+
+    Returns:
+        Anzahl neu angelegter Instrumente
+    """
+    existing = {
+        isin for (isin,) in db.query(Instrument.isin).filter(Instrument.isin.in_(SEED_INSTRUMENTS.keys()))
+    }
+    missing: List[Instrument] = [
+        Instrument(isin=isin, sector=sector, region=region, asset_class=asset_class)
+        for isin, (sector, region, asset_class) in SEED_INSTRUMENTS.items()
+        if isin not in existing
+    ]
+    if missing:
+        db.add_all(missing)
+        db.commit()
+        logger.info(f"{len(missing)} Instrumente angelegt")
+    return len(missing)
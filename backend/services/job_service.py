@@ -0,0 +1,272 @@
+"""
+Job Service
+Asynchrone KI-Analysen über eine Warteschlange in der Datenbank (Tabelle analysis_jobs).
+Requests legen einen Job an und erhalten sofort dessen ID; Worker holen Jobs aus der Tabelle,
+führen sie aus und speichern das Ergebnis. Offene Jobs, Wiederholungen und Jobs abgebrochener
+Worker überstehen dadurch einen Neustart.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Maximale Anzahl Versuche pro Job
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Wartezeit vor dem ersten erneuten Versuch (verdoppelt sich je Versuch, Sekunden)
+JOB_RETRY_DELAY_SECONDS = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "30"))
+
+# Nach dieser Zeit gilt ein laufender Job als abgebrochen und wird erneut vergeben (Sekunden)
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "600"))
+
+# Abfrageintervall der Worker, wenn keine Jobs anstehen (Sekunden)
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+
+# Anzahl gleichzeitig bearbeiteter Jobs pro Prozess
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+
+# Ausführung eines Jobs: (db, user_id, params) -> Ergebnis (JSON-serialisierbar)
+JobHandler = Callable[[Session, int, Dict[str, Any]], Awaitable[Any]]
+
+
+def submit_job(db: Session, user_id: int, job_type: str, params: Dict[str, Any]) -> AnalysisJob:
+    """
+    Legt einen Job an (mit Commit) und weckt die Worker des Prozesses
+
+    Args:
+        db: Datenbank-Session
+        user_id: Benutzer-ID
+        job_type: Art des Jobs (registrierter Handler)
+        params: Request-Parameter
+    """
+    now = datetime.utcnow()
+    job = AnalysisJob(
+        userId=user_id,
+        job_type=job_type,
+        status=JOB_QUEUED,
+        params=params,
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        run_after=now,
+        created_at=now,
+        updated_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_worker.notify()
+    logger.info(f"Job {job.id} ({job_type}) für User {user_id} angelegt")
+    return job
+
+
+def claim_next_job(db: Session, worker_id: str, now: Optional[datetime] = None) -> Optional[AnalysisJob]:
+    """
+    Übernimmt den nächsten fälligen Job.
+    Der Zustandswechsel erfolgt mit einem bedingten UPDATE, sodass mehrere Worker
+    (auch in verschiedenen Prozessen) denselben Job nicht doppelt übernehmen.
+    Laufende Jobs, deren Worker länger als JOB_LOCK_TIMEOUT_SECONDS nichts gemeldet hat,
+    werden erneut vergeben.
+    """
+    now = now or datetime.utcnow()
+    stale = now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+
+    # Abgebrochene Jobs ohne verbleibende Versuche endgültig beenden
+    db.query(AnalysisJob).filter(
+        AnalysisJob.status == JOB_RUNNING,
+        AnalysisJob.locked_at < stale,
+        AnalysisJob.attempts >= AnalysisJob.max_attempts
+    ).update({
+        AnalysisJob.status: JOB_FAILED,
+        AnalysisJob.error: "Bearbeitung abgebrochen",
+        AnalysisJob.finished_at: now,
+        AnalysisJob.updated_at: now
+    }, synchronize_session=False)
+    db.commit()
+
+    candidates = db.query(AnalysisJob.id, AnalysisJob.status, AnalysisJob.locked_at).filter(or_(
+        and_(AnalysisJob.status == JOB_QUEUED, AnalysisJob.run_after <= now),
+        and_(AnalysisJob.status == JOB_RUNNING, AnalysisJob.locked_at < stale)
+    )).order_by(AnalysisJob.run_after, AnalysisJob.id).limit(10).all()
+
+    for job_id, job_status, locked_at in candidates:
+        claimed = db.query(AnalysisJob).filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status == job_status,
+            AnalysisJob.locked_at == locked_at if locked_at is not None else AnalysisJob.locked_at.is_(None)
+        ).update({
+            AnalysisJob.status: JOB_RUNNING,
+            AnalysisJob.locked_by: worker_id,
+            AnalysisJob.locked_at: now,
+            AnalysisJob.attempts: AnalysisJob.attempts + 1,
+            AnalysisJob.updated_at: now
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(AnalysisJob, job_id)
+    return None
+
+
+def complete_job(db: Session, job: AnalysisJob, result: Any) -> None:
+    """Speichert das Ergebnis eines Jobs"""
+    now = datetime.utcnow()
+    job.status = JOB_SUCCEEDED
+    job.result = result
+    job.error = None
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = now
+    job.updated_at = now
+    db.commit()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Fehler der Anfrage (4xx, ungültige Eingaben) werden nicht wiederholt"""
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500 or error.status_code == 429
+    return not isinstance(error, ValueError)
+
+
+def error_message(error: BaseException) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return str(error) or type(error).__name__
+
+
+def fail_job(db: Session, job: AnalysisJob, error: BaseException, now: Optional[datetime] = None) -> None:
+    """
+    Vermerkt einen fehlgeschlagenen Versuch.
+    Wiederholbare Fehler werden mit exponentiell wachsender Wartezeit erneut eingereiht,
+    bis max_attempts erreicht ist.
+    """
+    now = now or datetime.utcnow()
+    job.error = error_message(error)
+    job.locked_by = None
+    job.locked_at = None
+    job.updated_at = now
+    if is_retryable(error) and job.attempts < job.max_attempts:
+        job.status = JOB_QUEUED
+        job.run_after = now + timedelta(seconds=JOB_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1))
+        logger.warning(f"Job {job.id} fehlgeschlagen (Versuch {job.attempts}), erneut ab {job.run_after}: {job.error}")
+    else:
+        job.status = JOB_FAILED
+        job.finished_at = now
+        logger.error(f"Job {job.id} endgültig fehlgeschlagen nach {job.attempts} Versuchen: {job.error}")
+    db.commit()
+
+
+class JobWorker:
+    """
+    Führt Jobs aus der Datenbank im Event-Loop aus.
+    Jeder der `concurrency` Slots holt sich den nächsten fälligen Job; ohne Jobs wird
+    alle `poll_interval` Sekunden (oder sofort nach submit_job) erneut nachgesehen.
+    """
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 2.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def job_types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        """Registriert die Ausführung eines Job-Typs"""
+        self._handlers[job_type] = handler
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Startet die Worker-Slots im laufenden Event-Loop"""
+        if self._tasks:
+            return
+        self._session_factory = session_factory
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run(slot)) for slot in range(self.concurrency)]
+        logger.info(f"Job-Worker {self.worker_id} gestartet ({self.concurrency} Slots, Typen: {', '.join(self.job_types)})")
+
+    async def stop(self) -> None:
+        """Stoppt die Worker; laufende Jobs werden nach JOB_LOCK_TIMEOUT_SECONDS erneut vergeben"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    def notify(self) -> None:
+        """Weckt wartende Worker-Slots (neuer Job angelegt)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self) -> Optional[int]:
+        db = self._session_factory()
+        try:
+            job = claim_next_job(db, self.worker_id)
+            return job.id if job else None
+        finally:
+            db.close()
+
+    async def _run(self, slot: int) -> None:
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                logger.error(f"Fehler beim Abholen eines Jobs: {e}", exc_info=True)
+                job_id = None
+
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.run_job(job_id)
+
+    async def run_job(self, job_id: int) -> None:
+        """Führt einen bereits übernommenen Job aus und speichert Ergebnis oder Fehler"""
+        db = self._session_factory()
+        try:
+            job = db.get(AnalysisJob, job_id)
+            handler = self._handlers.get(job.job_type)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unbekannter Job-Typ: {job.job_type}")
+                logger.info(f"Starte Job {job.id} ({job.job_type}, Versuch {job.attempts})")
+                result = await handler(db, job.userId, dict(job.params or {}))
+            except Exception as e:
+                db.rollback()
+                fail_job(db, db.get(AnalysisJob, job_id), e)
+            else:
+                complete_job(db, job, result)
+                logger.info(f"Job {job.id} abgeschlossen")
+        except Exception as e:
+            logger.error(f"Fehler bei der Verwaltung von Job {job_id}: {e}", exc_info=True)
+        finally:
+            db.close()
+
+
+# Globale Worker-Instanz
+job_worker = JobWorker(
+    concurrency=JOB_WORKER_CONCURRENCY,
+    poll_interval=JOB_POLL_INTERVAL_SECONDS
+)
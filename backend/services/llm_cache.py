@@ -0,0 +1,142 @@
+"""
+LLM Response Cache
+Persistenter, inhaltsadressierter Cache für OpenAI-Antworten (Tabelle llm_response_cache).
+Der Schlüssel ist ein Hash über Modell, System-Prompt, User-Prompt und Temperatur; identische
+Prompts werden damit nach Neustarts, in allen Workern und über Benutzer hinweg lokal beantwortet.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Cache aktiv (0 deaktiviert den Cache, z.B. zum Vergleichen von Modellantworten)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+# Gültigkeit einer Antwort (Stunden), entspricht der TTL des Analyse-Caches
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "12"))
+
+# Maximale Gesamtgröße aller gespeicherten Antworten (MB); darüber werden die am längsten
+# nicht genutzten Einträge verdrängt
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+
+
+def prompt_hash(model: str, system_prompt: str, user_prompt: str, temperature: float) -> str:
+    """SHA-256 über alle Eingaben, die die Antwort des Modells bestimmen"""
+    payload = json.dumps([model, system_prompt, user_prompt, float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCacheService:
+    """
+    Speichert Modellantworten in der Datenbank.
+    Abgelaufene Einträge werden beim Lesen bzw. Schreiben entfernt; übersteigt die Gesamtgröße
+    max_bytes, werden die am längsten nicht genutzten Einträge gelöscht (LRU).
+    Die Methoden sind synchron und werden aus dem Event-Loop über asyncio.to_thread aufgerufen.
+    """
+
+    def __init__(
+        self,
+        ttl_hours: float = 12,
+        max_bytes: int = 50 * 1024 * 1024,
+        session_factory: Optional[Callable[[], Session]] = None
+    ):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_bytes = max_bytes
+        self._session_factory = session_factory
+
+    def _session(self) -> Session:
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def get(self, key: str, now: Optional[datetime] = None) -> Optional[str]:
+        """Liefert die gespeicherte Antwort oder None"""
+        now = now or datetime.utcnow()
+        db = self._session()
+        try:
+            entry = db.get(LLMResponseCache, key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                db.delete(entry)
+                db.commit()
+                return None
+            entry.hits += 1
+            entry.last_used_at = now
+            content = entry.content
+            db.commit()
+            return content
+        finally:
+            db.close()
+
+    def set(self, key: str, model: str, content: str, now: Optional[datetime] = None) -> None:
+        """Speichert eine Antwort und verdrängt bei Bedarf alte Einträge"""
+        now = now or datetime.utcnow()
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        db = self._session()
+        try:
+            entry = db.get(LLMResponseCache, key) or LLMResponseCache(prompt_hash=key, hits=0)
+            entry.model = model
+            entry.content = content
+            entry.size_bytes = size
+            entry.created_at = now
+            entry.expires_at = now + self.ttl
+            entry.last_used_at = now
+            db.add(entry)
+            db.commit()
+            self._evict(db, now)
+        finally:
+            db.close()
+
+    def _evict(self, db: Session, now: datetime) -> None:
+        expired = db.query(LLMResponseCache).filter(
+            LLMResponseCache.expires_at <= now
+        ).delete(synchronize_session=False)
+
+        total = db.query(func.coalesce(func.sum(LLMResponseCache.size_bytes), 0)).scalar()
+        evicted = 0
+        if total > self.max_bytes:
+            # Älteste Einträge bis unter die Grenze löschen
+            rows = db.query(LLMResponseCache.prompt_hash, LLMResponseCache.size_bytes).order_by(
+                LLMResponseCache.last_used_at
+            ).all()
+            keys = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                keys.append(key)
+                total -= size
+            evicted = db.query(LLMResponseCache).filter(
+                LLMResponseCache.prompt_hash.in_(keys)
+            ).delete(synchronize_session=False)
+        db.commit()
+        if expired or evicted:
+            logger.info(f"LLM-Cache: {expired} abgelaufene und {evicted} verdrängte Einträge gelöscht")
+
+    def clear(self) -> None:
+        """Löscht alle gespeicherten Antworten"""
+        db = self._session()
+        try:
+            db.query(LLMResponseCache).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+# Globale Cache-Instanz
+llm_cache = LLMResponseCacheService(
+    ttl_hours=LLM_CACHE_TTL_HOURS,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024)
+)
@@ -2,41 +2,70 @@
 OpenAI Service für Portfolio-Analysen
 Stellt Funktionen zum Aufrufen von OpenAI GPT-4 für Portfolio-Analysen bereit
 """
+import asyncio
 import os
 import json
 import logging
-from typing import Dict, List, Optional, Any
-from openai import OpenAI
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI
 from datetime import datetime
 
+from services.price_service import price_service
+from services.allocation_service import aggregate, breakdown, DEFAULT_DIMENSIONS
+from services.llm_cache import LLM_CACHE_ENABLED, llm_cache, prompt_hash
+
 logger = logging.getLogger(__name__)
 
+# Maximale Anzahl gleichzeitiger HTTP-Verbindungen zur OpenAI-API (gemeinsam für alle Requests)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+
+# Anzahl offen gehaltener Keep-Alive-Verbindungen
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+
+# Timeout eines OpenAI-Aufrufs (Sekunden); Warten auf eine freie Verbindung zählt als pool-Timeout
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+
+# Modell und Temperatur der Analysen (Teil des Schlüssels im LLM-Cache)
+# gpt-4o-mini für Kostenoptimierung, kann auf gpt-4o geändert werden
+ANALYSIS_MODEL = "gpt-4o-mini"
+ANALYSIS_TEMPERATURE = 0.7
+
 # OpenAI Client - Lazy Initialization (wird erst beim ersten Aufruf erstellt)
-_client = None
-_openai_api_key = None
+_client: Optional[AsyncOpenAI] = None
 
 
-def get_openai_client():
+def get_openai_api_key() -> Optional[str]:
+    """API-Key aus OPENAI_API_KEY bzw. OPENAI_SECRET (Tippfehler-tolerant auch OPENAI_SCRET)"""
+    return os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_SECRET") or os.getenv("OPENAI_SCRET")
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
     """
-    Erstellt oder gibt den OpenAI Client zurück (Lazy Loading)
+    Erstellt oder gibt den gemeinsamen asynchronen OpenAI Client zurück (Lazy Loading).
+    Alle Aufrufe teilen sich einen begrenzten HTTP-Connection-Pool, sodass langsame
+    LLM-Antworten den Event-Loop nicht blockieren und nicht beliebig viele Verbindungen öffnen.
     """
-    global _client, _openai_api_key
+    global _client
     
     if _client is not None:
         return _client
     
-    # Unterstützt sowohl OPENAI_API_KEY als auch OPENAI_SECRET (für Flexibilität)
-    _openai_api_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_SECRET")
-    
-    if not _openai_api_key:
+    api_key = get_openai_api_key()
+    if not api_key:
         logger.warning("OPENAI_API_KEY oder OPENAI_SECRET nicht gesetzt. OpenAI-Funktionen werden nicht verfügbar sein.")
         return None
     
     try:
-        # Initialisiere Client nur mit api_key, keine anderen Parameter
-        # um Kompatibilitätsprobleme zu vermeiden
-        _client = OpenAI(api_key=_openai_api_key)
-        logger.info("OpenAI API Key gefunden, Client initialisiert")
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10.0)
+        )
+        _client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        logger.info(f"OpenAI API Key gefunden, Client initialisiert (max. {OPENAI_MAX_CONNECTIONS} Verbindungen)")
         return _client
     except TypeError as e:
         # Spezielle Behandlung für TypeError - könnte auf Versionsinkompatibilität hindeuten
@@ -57,6 +86,72 @@ def get_openai_client():
         logger.error(traceback.format_exc())
         return None
 
+
+async def close_openai_client() -> None:
+    """Schließt den gemeinsamen Client und seine Verbindungen (beim Herunterfahren)"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def get_cached_response(key: str) -> Optional[str]:
+    """Gespeicherte Modellantwort zum Prompt-Hash (Fehler des Caches werden nur geloggt)"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        return await asyncio.to_thread(llm_cache.get, key)
+    except Exception as e:
+        logger.warning(f"LLM-Cache nicht lesbar: {e}")
+        return None
+
+
+async def store_cached_response(key: str, model: str, content: str) -> None:
+    """Speichert eine Modellantwort, sofern sie gültiges JSON ist"""
+    if not LLM_CACHE_ENABLED:
+        return
+    try:
+        json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return
+    try:
+        await asyncio.to_thread(llm_cache.set, key, model, content)
+    except Exception as e:
+        logger.warning(f"LLM-Cache nicht beschreibbar: {e}")
+
+
+async def create_json_completion(
+    client: AsyncOpenAI,
+    system_prompt: str,
+    user_prompt: str,
+    model: str = ANALYSIS_MODEL,
+    temperature: float = ANALYSIS_TEMPERATURE,
+    force_refresh: bool = False
+) -> str:
+    """
+    Fordert eine JSON-Antwort an. Identische Anfragen (Modell, Prompts, Temperatur)
+    werden aus dem persistenten LLM-Cache beantwortet; bei force_refresh wird das Modell
+    erneut gefragt und die neue Antwort gespeichert.
+    """
+    key = prompt_hash(model, system_prompt, user_prompt, temperature)
+    content = None if force_refresh else await get_cached_response(key)
+    if content is not None:
+        logger.info(f"LLM-Cache Hit ({key[:12]})")
+        return content
+    
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        response_format={"type": "json_object"}  # Erzwingt JSON-Output
+    )
+    content = response.choices[0].message.content
+    await store_cached_response(key, model, content)
+    return content
+
 # Standard System Prompt für Portfolio-Analysen
 PORTFOLIO_SYSTEM_PROMPT = """Du bist ein Finanzanalyse-Assistent für ein Portfolio-Management-Tool. 
 Analysiere das Portfolio des Benutzers und gib strukturiertes JSON im folgenden Schema zurück:
@@ -117,19 +212,17 @@ Verwende klare, nicht-technische Sprache. Keine Disclaimer oder Finanzberatungsw
 
 def get_current_market_price(ticker: Optional[str], isin: Optional[str]) -> float:
     """
-    Platzhalter-Funktion für aktuelle Marktpreise.
-    In Produktion sollte hier eine echte Marktdaten-API integriert werden.
+    Holt den aktuellen Marktpreis über den konfigurierten Preis-Provider
     
     Args:
         ticker: Ticker-Symbol
         isin: ISIN-Code
         
     Returns:
-        Platzhalter-Preis (z.B. 10% über Kaufpreis)
+        Aktueller Preis oder 0.0, wenn kein Preis bekannt ist
     """
-    # TODO: Integration mit echter Marktdaten-API (z.B. Alpha Vantage, Yahoo Finance, etc.)
-    # Für jetzt: Platzhalter-Preis
-    return 0.0
+    price = price_service.get_price(isin, ticker)
+    return price if price is not None else 0.0
 
 
 def build_portfolio_context(
@@ -151,7 +244,12 @@ def build_portfolio_context(
     total_value = 0.0
     positions = []
     
-    for holding in holdings:
+    # Aktuelle Preise für alle Positionen mit einem Batch-Lookup holen
+    market_prices = price_service.get_prices_for_assets(
+        (holding.get('isin'), holding.get('ticker')) for holding in holdings
+    )
+    
+    for holding, market_price in zip(holdings, market_prices):
         ticker = holding.get('ticker', holding.get('isin', 'N/A'))
         name = holding.get('name', 'Unbekannt')
         quantity = float(holding.get('quantity', 0))
@@ -161,8 +259,8 @@ def build_portfolio_context(
         region = holding.get('region', 'Unbekannt')
         asset_class = holding.get('asset_class', 'Unbekannt')
         
-        # Platzhalter für aktuellen Preis (10% über Kaufpreis)
-        current_price = purchase_price * 1.1
+        # Aktueller Marktpreis, sonst Platzhalter (10% über Kaufpreis)
+        current_price = market_price if market_price is not None else purchase_price * 1.1
         position_value = quantity * current_price
         total_value += position_value
         
@@ -192,24 +290,24 @@ def build_portfolio_context(
     
     context_parts.append(f"\nGesamtwert Portfolio: {total_value:.2f} EUR")
     
-    # Diversifikation-Statistiken
-    sectors = {}
-    regions = {}
-    asset_classes = {}
-    
-    for pos in positions:
-        sector = pos['sector']
-        region = pos['region']
-        asset_class = pos['asset_class']
-        
-        sectors[sector] = sectors.get(sector, 0) + pos['value']
-        regions[region] = regions.get(region, 0) + pos['value']
-        asset_classes[asset_class] = asset_classes.get(asset_class, 0) + pos['value']
+    # Diversifikation-Statistiken (ein Durchlauf für alle Dimensionen)
+    allocation = aggregate(
+        positions,
+        (pos['value'] for pos in positions),
+        DEFAULT_DIMENSIONS,
+        missing_label='Unbekannt'
+    )
+    
+    def format_breakdown(dimension: str) -> str:
+        return ", ".join(
+            f"{category}: {percentage:.1f}%"
+            for category, _, percentage in breakdown(allocation[dimension], total_value)
+        )
     
     context_parts.append("\nDiversifikation:")
-    context_parts.append("Branchen: " + ", ".join([f"{k}: {v/total_value*100:.1f}%" for k, v in sectors.items()]))
-    context_parts.append("Regionen: " + ", ".join([f"{k}: {v/total_value*100:.1f}%" for k, v in regions.items()]))
-    context_parts.append("Assetklassen: " + ", ".join([f"{k}: {v/total_value*100:.1f}%" for k, v in asset_classes.items()]))
+    context_parts.append("Branchen: " + format_breakdown('sector'))
+    context_parts.append("Regionen: " + format_breakdown('region'))
+    context_parts.append("Assetklassen: " + format_breakdown('asset_class'))
     
     # Benutzereinstellungen
     if user_settings:
@@ -222,9 +320,57 @@ def build_portfolio_context(
     return "\n".join(context_parts)
 
 
-async def analyze_portfolio(
+def build_portfolio_prompt(
     holdings: List[Dict],
     user_settings: Optional[Dict] = None
+) -> str:
+    """Erstellt den User-Prompt für eine Portfolio-Analyse"""
+    portfolio_context = build_portfolio_context(holdings, user_settings)
+    return f"""Analysiere das folgende Portfolio:
+
+{portfolio_context}
+
+Gib eine detaillierte Analyse im vorgegebenen JSON-Format zurück. 
+Berücksichtige dabei:
+- Fundamentale Bewertung jeder Position
+- Technische Analyse (Trend, RSI, Signale)
+- Risiken (Klumpenrisiko, Branchenkonzentration, Cash-Anteil)
+- Diversifikation nach Regionen, Branchen und Gewichtungen
+- Cash-Bewertung
+- Vorschläge für Rebalancing
+- Kurzfristige und langfristige Empfehlungen"""
+
+
+def parse_analysis_content(content: str) -> Dict[str, Any]:
+    """
+    Parst die JSON-Antwort von OpenAI
+
+    Raises:
+        ValueError: Wenn die Antwort kein gültiges JSON ist
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        logger.error(f"Fehler beim Parsen der OpenAI Response: {e}")
+        logger.error(f"Response Content: {content[:500]}")
+        raise ValueError(f"OpenAI Response konnte nicht als JSON geparst werden: {e}")
+
+
+def get_portfolio_client(holdings: List[Dict]) -> AsyncOpenAI:
+    """Prüft Konfiguration und Eingabe einer Portfolio-Analyse und liefert den Client"""
+    client = get_openai_client()
+    if not client:
+        raise ValueError("OPENAI_API_KEY oder OPENAI_SECRET ist nicht gesetzt. Bitte konfigurieren Sie die OpenAI API in den Environment Variables.")
+    
+    if not holdings:
+        raise ValueError("Portfolio ist leer. Bitte fügen Sie Positionen hinzu.")
+    return client
+
+
+async def analyze_portfolio(
+    holdings: List[Dict],
+    user_settings: Optional[Dict] = None,
+    force_refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Analysiert ein Portfolio mit OpenAI GPT-4
@@ -232,6 +378,7 @@ async def analyze_portfolio(
     Args:
         holdings: Liste von Portfolio-Positionen
         user_settings: Benutzereinstellungen (riskProfile, investmentHorizon)
+        force_refresh: LLM-Cache nicht lesen (neue Antwort wird trotzdem gespeichert)
         
     Returns:
         Strukturierte Analyse als Dictionary
@@ -240,59 +387,21 @@ async def analyze_portfolio(
         ValueError: Wenn OpenAI API Key nicht gesetzt ist
         Exception: Bei OpenAI API Fehlern
     """
-    client = get_openai_client()
-    if not client:
-        raise ValueError("OPENAI_API_KEY oder OPENAI_SECRET ist nicht gesetzt. Bitte konfigurieren Sie die OpenAI API in den Environment Variables.")
-    
-    if not holdings:
-        raise ValueError("Portfolio ist leer. Bitte fügen Sie Positionen hinzu.")
+    client = get_portfolio_client(holdings)
     
     try:
-        # Baue Kontext
-        portfolio_context = build_portfolio_context(holdings, user_settings)
-        
-        # User Prompt
-        user_prompt = f"""Analysiere das folgende Portfolio:
-
-{portfolio_context}
-
-Gib eine detaillierte Analyse im vorgegebenen JSON-Format zurück. 
-Berücksichtige dabei:
-- Fundamentale Bewertung jeder Position
-- Technische Analyse (Trend, RSI, Signale)
-- Risiken (Klumpenrisiko, Branchenkonzentration, Cash-Anteil)
-- Diversifikation nach Regionen, Branchen und Gewichtungen
-- Cash-Bewertung
-- Vorschläge für Rebalancing
-- Kurzfristige und langfristige Empfehlungen"""
+        user_prompt = build_portfolio_prompt(holdings, user_settings)
         
         logger.info(f"Rufe OpenAI API auf für Portfolio mit {len(holdings)} Positionen")
         
         # OpenAI API Call (client wurde bereits oben initialisiert)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Verwende gpt-4o-mini für Kostenoptimierung, kann auf gpt-4o geändert werden
-            messages=[
-                {"role": "system", "content": PORTFOLIO_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}  # Erzwingt JSON-Output
+        content = await create_json_completion(
+            client, PORTFOLIO_SYSTEM_PROMPT, user_prompt, force_refresh=force_refresh
         )
-        
-        # Parse Response
-        content = response.choices[0].message.content
         logger.info(f"OpenAI Response erhalten: {len(content)} Zeichen")
         
-        # Parse JSON
-        try:
-            analysis = json.loads(content)
-        except json.JSONDecodeError as e:
-            logger.error(f"Fehler beim Parsen der OpenAI Response: {e}")
-            logger.error(f"Response Content: {content[:500]}")
-            raise ValueError(f"OpenAI Response konnte nicht als JSON geparst werden: {e}")
-        
         # Validierung und Normalisierung
-        analysis = validate_and_normalize_analysis(analysis, holdings)
+        analysis = validate_and_normalize_analysis(parse_analysis_content(content), holdings)
         
         logger.info("Portfolio-Analyse erfolgreich erstellt")
         return analysis
@@ -302,9 +411,118 @@ Berücksichtige dabei:
         raise
 
 
+class JSONSectionParser:
+    """
+    Liest vollständige Top-Level-Felder aus einem noch unvollständigen JSON-Objekt.
+    Wird mit den gestreamten Tokens gefüttert und liefert jedes Feld, sobald sein Wert abgeschlossen ist.
+    """
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self):
+        self.buffer = ""
+        self.position: Optional[int] = None  # Beginn des nächsten Feldes im Buffer
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, position: int, characters: str) -> int:
+        while position < len(self.buffer) and self.buffer[position] in characters:
+            position += 1
+        return position
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Hängt einen Chunk an und liefert die dadurch abgeschlossenen Felder als (Name, Wert)
+        """
+        self.buffer += chunk
+        if self.position is None:
+            start = self.buffer.find("{")
+            if start < 0:
+                return []
+            self.position = start + 1
+        elif "," not in chunk and "}" not in chunk:
+            # Ein Feld ist erst abgeschlossen, wenn ein Trennzeichen folgt
+            return []
+
+        sections = []
+        while True:
+            position = self._skip(self.position, self.WHITESPACE + ",")
+            if position >= len(self.buffer) or self.buffer[position] == "}":
+                break
+            try:
+                key, position = self._decoder.raw_decode(self.buffer, position)
+                position = self._skip(position, self.WHITESPACE)
+                if self.buffer[position:position + 1] != ":":
+                    break
+                value, position = self._decoder.raw_decode(self.buffer, self._skip(position + 1, self.WHITESPACE))
+            except json.JSONDecodeError:
+                break
+            # Zahlen und Literale am Ende des Buffers könnten noch weiterlaufen
+            position = self._skip(position, self.WHITESPACE)
+            if position >= len(self.buffer):
+                break
+            sections.append((key, value))
+            self.position = position
+        return sections
+
+
+async def stream_portfolio_analysis(
+    holdings: List[Dict],
+    user_settings: Optional[Dict] = None,
+    force_refresh: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analysiert ein Portfolio mit gestreamter OpenAI-Antwort.
+    Bei force_refresh wird der LLM-Cache nicht gelesen, die neue Antwort aber gespeichert.
+    
+    Yields:
+        {"type": "section", "section": Name, "data": Rohwert} für jedes abgeschlossene Feld der Antwort,
+        zum Schluss {"type": "result", "data": normalisierte Analyse}
+        
+    Raises:
+        ValueError: Wenn OpenAI API Key nicht gesetzt oder die Antwort kein gültiges JSON ist
+    """
+    client = get_portfolio_client(holdings)
+    user_prompt = build_portfolio_prompt(holdings, user_settings)
+    key = prompt_hash(ANALYSIS_MODEL, PORTFOLIO_SYSTEM_PROMPT, user_prompt, ANALYSIS_TEMPERATURE)
+    parser = JSONSectionParser()
+    
+    cached_content = None if force_refresh else await get_cached_response(key)
+    if cached_content is not None:
+        # Gespeicherte Antwort wie einen einzigen Chunk durch den Parser geben
+        logger.info(f"LLM-Cache Hit ({key[:12]})")
+        for section, value in parser.feed(cached_content):
+            yield {"type": "section", "section": section, "data": value}
+    else:
+        logger.info(f"Rufe OpenAI API (Stream) auf für Portfolio mit {len(holdings)} Positionen")
+        stream = await client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=[
+                {"role": "system", "content": PORTFOLIO_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=ANALYSIS_TEMPERATURE,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            for section, value in parser.feed(delta):
+                yield {"type": "section", "section": section, "data": value}
+        
+        logger.info(f"OpenAI Stream beendet: {len(parser.buffer)} Zeichen")
+        await store_cached_response(key, ANALYSIS_MODEL, parser.buffer)
+    
+    analysis = validate_and_normalize_analysis(parse_analysis_content(parser.buffer), holdings)
+    yield {"type": "result", "data": analysis}
+
+
 async def analyze_single_asset(
     asset: Dict,
-    user_settings: Optional[Dict] = None
+    user_settings: Optional[Dict] = None,
+    force_refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Analysiert ein einzelnes Asset (Wertpapier) mit OpenAI GPT-4
@@ -312,6 +530,7 @@ async def analyze_single_asset(
     Args:
         asset: Asset-Dictionary mit name, isin, ticker, etc.
         user_settings: Benutzereinstellungen (riskProfile, investmentHorizon)
+        force_refresh: LLM-Cache nicht lesen (neue Antwort wird trotzdem gespeichert)
         
     Returns:
         Strukturierte Analyse als Dictionary
@@ -361,18 +580,9 @@ Berücksichtige dabei:
         logger.info(f"Rufe OpenAI API auf für Asset-Analyse: {asset.get('name')}")
         
         # OpenAI API Call
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": SINGLE_ASSET_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
+        content = await create_json_completion(
+            client, SINGLE_ASSET_SYSTEM_PROMPT, user_prompt, force_refresh=force_refresh
         )
-        
-        # Parse Response
-        content = response.choices[0].message.content
         logger.info(f"OpenAI Response erhalten für Asset-Analyse: {len(content)} Zeichen")
         
         try:
@@ -0,0 +1,111 @@
+"""
+Password Hasher
+Führt Argon2-Hashing und -Verifikation in einem eigenen, begrenzten Thread-Pool aus, damit ein
+Login den Event-Loop nicht für alle anderen Requests des Workers blockiert. argon2-cffi gibt die
+GIL während des Hashings frei; die Anzahl Threads begrenzt damit CPU- und Speicherlast
+(memory_cost pro gleichzeitigem Hash).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """
+    Asynchrone Fassade vor einem CryptContext mit höchstens max_workers gleichzeitigen Hashes.
+    Weitere Aufrufe warten in der Queue des Pools; Queue-Tiefe und Wartezeiten werden gezählt.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 2):
+        """
+        Args:
+            context: Passlib-Kontext mit den aktuellen Hash-Parametern
+            max_workers: Maximale Anzahl gleichzeitiger Hash-Berechnungen
+        """
+        self.context = context
+        self.max_workers = max_workers
+        self.queued = 0     # eingereicht, aber noch nicht gestartet
+        self.active = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        submitted_at = time.monotonic()
+
+        def task() -> Any:
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.total_wait_seconds += time.monotonic() - submitted_at
+            try:
+                return function(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        def on_done(future: Future) -> None:
+            # Abgebrochene Requests: die Berechnung startet nicht mehr
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        future = self._get_executor().submit(task)
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """Hasht ein Passwort mit den aktuellen Parametern"""
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verifiziert ein Passwort gegen einen Hash"""
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifiziert ein Passwort und liefert bei veralteten Parametern (oder bcrypt) einen neuen Hash
+
+        Returns:
+            (gültig, neuer Hash oder None)
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Kennzahlen für das Monitoring"""
+        with self._lock:
+            started = self.active + self.completed
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": round(self.total_wait_seconds / started * 1000, 1) if started else 0.0
+            }
+
+    def shutdown(self) -> None:
+        """Beendet den Thread-Pool (laufende Berechnungen werden abgeschlossen)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -0,0 +1,222 @@
+"""
+Performance Service
+Rekonstruiert den täglichen Portfolio-Wert aus Holdings (Kaufdatum) und gespeicherten Schlusskursen.
+Bestände werden über eine kumulative Summe der Käufe bestimmt, statt jeden Tag neu zu bewerten.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def forward_fill(matrix: np.ndarray, seed: np.ndarray) -> np.ndarray:
+    """
+    Füllt fehlende Werte (NaN) spaltenweise mit dem letzten bekannten Wert auf
+
+    Args:
+        matrix: Tage x Symbole, NaN für Tage ohne Schlusskurs
+        seed: Letzter bekannter Wert vor dem ersten Tag (NaN wenn unbekannt)
+    """
+    stacked = np.vstack([seed[np.newaxis, :], matrix])
+    rows = np.arange(stacked.shape[0])[:, np.newaxis]
+    index = np.where(np.isnan(stacked), 0, rows)
+    np.maximum.accumulate(index, axis=0, out=index)
+    filled = stacked[index, np.arange(stacked.shape[1])]
+    return filled[1:]
+
+
+class PerformanceSeries:
+    """
+    Täglicher Portfolio-Wert für ein Zeitfenster.
+    Hält Bestände, Einstandswerte und Schlusskurse als Matrizen (Tage x Symbole),
+    damit neue Schlusskurse oder ein neuer Tag ohne kompletten Neuaufbau ergänzt werden können.
+    """
+
+    def __init__(
+        self,
+        start: date,
+        symbols: List[str],
+        lots: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        raw_closes: np.ndarray,
+        seed: np.ndarray,
+        price_watermark: int
+    ):
+        """
+        Args:
+            start: Erster Tag des Fensters
+            symbols: Symbole (Spalten der Matrizen)
+            lots: (Symbol-Index, Stückzahl, Einstandswert, Kaufdatum als Ordinal) je Lot
+            raw_closes: Schlusskurse Tage x Symbole, NaN wo kein Kurs gespeichert ist
+            seed: Letzter Schlusskurs vor dem Fenster je Symbol (NaN wenn unbekannt)
+            price_watermark: Höchste verarbeitete price_history-ID
+        """
+        self.start = start
+        self.symbols = symbols
+        self.lots = lots
+        self.raw_closes = raw_closes
+        self.seed = seed
+        self.price_watermark = price_watermark
+        self._recompute()
+
+    @property
+    def length(self) -> int:
+        return self.raw_closes.shape[0]
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=self.length - 1)
+
+    @property
+    def dates(self) -> List[date]:
+        return [self.start + timedelta(days=i) for i in range(self.length)]
+
+    def _holdings_matrices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Bestände und Einstandswerte je Tag als kumulative Summe der Käufe"""
+        symbol_index, quantity, cost, purchase_ordinal = self.lots
+        shape = (self.length, len(self.symbols))
+        delta_shares = np.zeros(shape)
+        delta_costs = np.zeros(shape)
+
+        day = purchase_ordinal - self.start.toordinal()
+        # Käufe vor dem Fenster zählen ab dem ersten Tag, Käufe nach dem Fenster gar nicht
+        held = day < self.length
+        day = np.clip(day[held], 0, None)
+        np.add.at(delta_shares, (day, symbol_index[held]), quantity[held])
+        np.add.at(delta_costs, (day, symbol_index[held]), cost[held])
+
+        return np.cumsum(delta_shares, axis=0), np.cumsum(delta_costs, axis=0)
+
+    def _recompute(self) -> None:
+        self.shares, self.costs = self._holdings_matrices()
+        self.closes = forward_fill(self.raw_closes, self.seed)
+        # Ohne bekannten Kurs wird der Einstandswert angesetzt
+        position_values = np.where(np.isnan(self.closes), self.costs, self.shares * self.closes)
+        self.values = position_values.sum(axis=1)
+
+    def apply_closes(self, rows: Iterable[Tuple[str, date, float]]) -> None:
+        """Trägt Schlusskurse in das Fenster ein (Kurse außerhalb des Fensters werden ignoriert)"""
+        column = {symbol: i for i, symbol in enumerate(self.symbols)}
+        start_ordinal = self.start.toordinal()
+        for symbol, day, close in rows:
+            row = day.toordinal() - start_ordinal
+            if symbol in column and 0 <= row < self.length:
+                self.raw_closes[row, column[symbol]] = close
+
+    def extend(self, end: date, rows: Iterable[Tuple[str, date, float]], price_watermark: int) -> None:
+        """
+        Verschiebt das Fenster bis end (gleiche Länge) und übernimmt neue Schlusskurse
+
+        Args:
+            end: Neuer letzter Tag
+            rows: Neu hinzugekommene Schlusskurse (symbol, date, close)
+            price_watermark: Höchste verarbeitete price_history-ID
+        """
+        shift = (end - self.end).days
+        if shift > 0:
+            padding = np.full((shift, len(self.symbols)), np.nan)
+            closes = np.vstack([self.raw_closes, padding])
+            # Letzter bekannter Kurs vor dem neuen Fensterbeginn wird zum neuen Seed
+            self.seed = forward_fill(closes[:shift], self.seed)[-1]
+            self.raw_closes = closes[shift:]
+            self.start = self.start + timedelta(days=shift)
+
+        self.apply_closes(rows)
+        self.price_watermark = price_watermark
+        self._recompute()
+
+
+def build_series(
+    lots: Sequence[Tuple[str, float, float, date]],
+    start: date,
+    end: date,
+    price_rows: Iterable[Tuple[str, date, float]],
+    price_watermark: int = 0
+) -> PerformanceSeries:
+    """
+    Baut den Performance-Verlauf für ein Zeitfenster auf
+
+    Args:
+        lots: (Symbol, Stückzahl, Kaufpreis, Kaufdatum) je Portfolio-Position
+        start: Erster Tag
+        end: Letzter Tag
+        price_rows: Schlusskurse (symbol, date, close), auch vor start zum Auffüllen
+        price_watermark: Höchste geladene price_history-ID
+    """
+    symbols: List[str] = []
+    column: Dict[str, int] = {}
+    for symbol, _, _, _ in lots:
+        if symbol not in column:
+            column[symbol] = len(symbols)
+            symbols.append(symbol)
+
+    lot_arrays = (
+        np.asarray([column[lot[0]] for lot in lots], dtype=np.int64),
+        np.asarray([lot[1] for lot in lots], dtype=np.float64),
+        np.asarray([lot[1] * lot[2] for lot in lots], dtype=np.float64),
+        np.asarray([lot[3].toordinal() for lot in lots], dtype=np.int64),
+    )
+
+    length = (end - start).days + 1
+    raw_closes = np.full((length, len(symbols)), np.nan)
+    seed = np.full(len(symbols), np.nan)
+    seed_dates: Dict[str, date] = {}
+
+    start_ordinal = start.toordinal()
+    for symbol, day, close in price_rows:
+        if symbol not in column:
+            continue
+        row = day.toordinal() - start_ordinal
+        if row < 0:
+            if symbol not in seed_dates or day > seed_dates[symbol]:
+                seed_dates[symbol] = day
+                seed[column[symbol]] = close
+        elif row < length:
+            raw_closes[row, column[symbol]] = close
+
+    return PerformanceSeries(start, symbols, lot_arrays, raw_closes, seed, price_watermark)
+
+
+class PerformanceCache:
+    """
+    LRU-Cache für Performance-Verläufe pro (Benutzer, Tage).
+    Jeder Eintrag ist an das Wasserzeichen der Holdings gebunden.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[Hashable, PerformanceSeries]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, days: int, holdings_watermark: Hashable) -> Optional[PerformanceSeries]:
+        with self._lock:
+            entry = self._entries.get((user_id, days))
+            if not entry or entry[0] != holdings_watermark:
+                return None
+            self._entries.move_to_end((user_id, days))
+            return entry[1]
+
+    def set(self, user_id: int, days: int, holdings_watermark: Hashable, series: PerformanceSeries) -> None:
+        with self._lock:
+            self._entries[(user_id, days)] = (holdings_watermark, series)
+            self._entries.move_to_end((user_id, days))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Verwirft alle Verläufe eines Benutzers"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Globale Cache-Instanz
+performance_cache = PerformanceCache(
+    max_entries=int(os.getenv("PERFORMANCE_CACHE_MAX_ENTRIES", "1000"))
+)
@@ -0,0 +1,277 @@
+"""
+Price Service für aktuelle Marktpreise
+Stellt austauschbare Preis-Provider mit Batch-API und einem vorgeschalteten TTL-Cache bereit
+"""
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mock-Daten für aktuelle Preise (in Produktion würde man eine API wie Yahoo Finance nutzen)
+MOCK_CURRENT_PRICES = {
+    "US0378331005": 185.50,  # Apple
+    "US5949181045": 420.30,  # Microsoft
+    "US02079K3059": 145.20,  # Alphabet
+    "US0231351067": 175.80,  # Amazon
+    "DE000BASF111": 45.20,   # BASF
+    "US09075V1026": 95.50,   # BioNTech
+    "CNE100000296": 12.50,   # BYD
+    "US1912161007": 60.20,   # Coca-Cola
+    "DE0005552004": 42.80,   # Deutsche Post
+    "US2546871060": 95.30,   # Disney
+    "US28852N1090": 18.50,   # Ellington
+    "DE0006231004": 35.80,   # Infineon
+    "DE000LS9TQA1": 425.00,  # Lang+Schwarz
+    "DE0007100000": 68.50,   # Mercedes-Benz
+    "US30303M1027": 485.20,  # Meta
+    "US6410694060": 110.50,  # Nestle
+    "US67066G1040": 125.80,  # NVIDIA
+    "US6974351057": 195.50,  # Palo Alto
+    "US79466L3024": 280.30,  # Salesforce
+    "DE0007164600": 125.50,  # SAP
+    "US86800U3023": 48.20,   # Super Micro
+    "US92343V1044": 42.50,   # Verizon
+    "US92532F1003": 445.20,  # Vertex
+    "GB00BH4HKS39": 2.35,    # Vodafone
+}
+
+# SQLite erlaubt maximal 999 Platzhalter pro Statement (ältere Versionen)
+SQLITE_BATCH_SIZE = 500
+
+
+def normalize_symbol(symbol: Optional[str]) -> Optional[str]:
+    """Normalisiert eine ISIN oder einen Ticker (getrimmt, Großbuchstaben)"""
+    if not symbol:
+        return None
+    symbol = str(symbol).strip().upper()
+    return symbol or None
+
+
+def asset_symbols(isin: Optional[str], ticker: Optional[str]) -> List[str]:
+    """
+    Gibt die Symbole eines Assets in Lookup-Reihenfolge zurück (zuerst ISIN, dann Ticker)
+    """
+    symbols = []
+    for symbol in (normalize_symbol(isin), normalize_symbol(ticker)):
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+class PriceProvider(ABC):
+    """
+    Abstrakte Basisklasse für Preis-Provider.
+    Provider liefern Preise immer im Batch, damit ein Request nur einen Lookup auslöst.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """
+        Holt aktuelle Preise für mehrere ISINs/Ticker
+
+        Args:
+            symbols: Normalisierte ISINs oder Ticker
+
+        Returns:
+            Dictionary mit Symbol -> Preis (unbekannte Symbole fehlen im Ergebnis)
+        """
+
+
+class StaticPriceProvider(PriceProvider):
+    """Provider auf Basis eines festen Dictionaries (Standard: Mock-Preise)"""
+
+    name = "static"
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None):
+        source = MOCK_CURRENT_PRICES if prices is None else prices
+        self.prices = {normalize_symbol(k): float(v) for k, v in source.items() if normalize_symbol(k)}
+
+    def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+
+class SQLitePriceProvider(PriceProvider):
+    """
+    Lokaler Provider auf Basis einer SQLite-Datei.
+    Dient als Stand-in für eine echte Marktdaten-API (z.B. in Tests oder lokal).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Pfad zur SQLite-Datei (":memory:" für einen flüchtigen Speicher)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "symbol TEXT PRIMARY KEY, "
+                "price REAL NOT NULL, "
+                "updated_at TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    def set_prices(self, prices: Dict[str, float]) -> None:
+        """Speichert bzw. aktualisiert Preise"""
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (normalize_symbol(symbol), float(price), now)
+            for symbol, price in prices.items()
+            if normalize_symbol(symbol)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO prices (symbol, price, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at",
+                rows
+            )
+            self._conn.commit()
+
+    def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        symbols = list(symbols)
+        result: Dict[str, float] = {}
+        with self._lock:
+            for start in range(0, len(symbols), SQLITE_BATCH_SIZE):
+                chunk = symbols[start:start + SQLITE_BATCH_SIZE]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor = self._conn.execute(
+                    f"SELECT symbol, price FROM prices WHERE symbol IN ({placeholders})",
+                    chunk
+                )
+                result.update({symbol: float(price) for symbol, price in cursor.fetchall()})
+        return result
+
+
+class PriceService:
+    """
+    In-Process TTL-Cache vor einem Preis-Provider.
+    Fehlende Symbole werden gesammelt und mit genau einem Provider-Aufruf nachgeladen.
+    Auch unbekannte Symbole werden (negativ) gecacht, damit sie nicht bei jedem Request erneut angefragt werden.
+    """
+
+    def __init__(self, provider: PriceProvider, ttl_seconds: int = 300):
+        """
+        Args:
+            provider: Zugrundeliegender Preis-Provider
+            ttl_seconds: Time-to-Live eines Preises im Cache in Sekunden
+        """
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[Optional[float], float]] = {}
+        self._lock = threading.Lock()
+
+    def set_provider(self, provider: PriceProvider) -> None:
+        """Tauscht den Provider aus und leert den Cache"""
+        self.provider = provider
+        self.clear()
+        logger.info(f"Preis-Provider gewechselt zu '{provider.name}'")
+
+    def get_prices(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """
+        Holt Preise für mehrere Symbole (Cache zuerst, dann ein Batch-Lookup für den Rest)
+
+        Args:
+            symbols: ISINs oder Ticker (werden normalisiert und dedupliziert)
+
+        Returns:
+            Dictionary mit normalisiertem Symbol -> Preis
+        """
+        # dict.fromkeys: Reihenfolge erhalten, Duplikate in O(1) entfernen
+        wanted = [symbol for symbol in dict.fromkeys(normalize_symbol(symbol) for symbol in symbols) if symbol]
+
+        result: Dict[str, float] = {}
+        missing = []
+        now = time.monotonic()
+
+        with self._lock:
+            for symbol in wanted:
+                entry = self._entries.get(symbol)
+                if entry and entry[1] > now:
+                    if entry[0] is not None:
+                        result[symbol] = entry[0]
+                else:
+                    missing.append(symbol)
+
+        if missing:
+            try:
+                fetched = self.provider.get_prices(missing)
+            except Exception as e:
+                # Provider-Fehler sollen das Dashboard nicht blockieren; Fehler werden nicht gecacht
+                logger.error(f"Fehler beim Abrufen der Preise über Provider '{self.provider.name}': {e}")
+                return result
+
+            expires_at = time.monotonic() + self.ttl_seconds
+            with self._lock:
+                for symbol in missing:
+                    price = fetched.get(symbol)
+                    self._entries[symbol] = (price, expires_at)
+                    if price is not None:
+                        result[symbol] = price
+
+        return result
+
+    def get_prices_for_assets(self, assets: Iterable[Tuple[Optional[str], Optional[str]]]) -> List[Optional[float]]:
+        """
+        Löst Preise für mehrere Assets mit einem einzigen Lookup auf
+
+        Args:
+            assets: Liste von (isin, ticker)-Tupeln
+
+        Returns:
+            Liste von Preisen in derselben Reihenfolge (None wenn kein Preis bekannt)
+        """
+        assets = list(assets)
+        symbols_per_asset = [asset_symbols(isin, ticker) for isin, ticker in assets]
+        prices = self.get_prices(s for symbols in symbols_per_asset for s in symbols)
+
+        return [
+            next((prices[s] for s in symbols if s in prices), None)
+            for symbols in symbols_per_asset
+        ]
+
+    def get_price(self, isin: Optional[str], ticker: Optional[str]) -> Optional[float]:
+        """Holt den aktuellen Preis eines einzelnen Assets (ISIN vor Ticker)"""
+        return self.get_prices_for_assets([(isin, ticker)])[0]
+
+    def clear(self) -> None:
+        """Leert den Preis-Cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+def create_price_provider() -> PriceProvider:
+    """
+    Erstellt den Preis-Provider anhand der Umgebungsvariablen
+
+    PRICE_PROVIDER: "mock" (Standard) oder "sqlite"
+    PRICE_DB_PATH: Pfad zur SQLite-Datei für den "sqlite"-Provider
+    """
+    provider_name = os.getenv("PRICE_PROVIDER", "mock").lower()
+
+    if provider_name == "sqlite":
+        path = os.getenv("PRICE_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "prices.db"))
+        logger.info(f"Verwende SQLite-Preis-Provider: {path}")
+        return SQLitePriceProvider(path)
+
+    if provider_name != "mock":
+        logger.warning(f"Unbekannter PRICE_PROVIDER '{provider_name}', verwende Mock-Preise")
+    return StaticPriceProvider()
+
+
+# Globale Price-Service-Instanz
+price_service = PriceService(
+    create_price_provider(),
+    ttl_seconds=int(os.getenv("PRICE_CACHE_TTL_SECONDS", "300"))
+)
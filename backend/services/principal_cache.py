@@ -0,0 +1,92 @@
+"""
+Principal Cache
+Kurzlebiger Cache für authentifizierte Benutzer (Principal) pro Token-Subject, damit nicht jeder
+geschützte Request den Benutzer per SELECT auf users lädt. Gespeichert werden losgelöste Kopien
+der Spaltenwerte; get_current_user hängt sie per Session.merge(load=False) ohne Query an die
+Session des Requests an.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import User
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """
+    LRU-Cache mit TTL für Benutzer-Snapshots.
+    Profil-, E-Mail- und Passwortänderungen sowie Kontolöschungen müssen den Eintrag invalidieren;
+    andere Worker sehen Änderungen spätestens nach Ablauf der TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 10000):
+        """
+        Args:
+            ttl_seconds: Gültigkeit eines Eintrags in Sekunden
+            max_entries: Maximale Anzahl Einträge (LRU-Verdrängung)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[User, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def snapshot(user: User) -> User:
+        """Losgelöste, unveränderte Kopie der Spaltenwerte eines geladenen Benutzers"""
+        copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+    def get(self, subject: Hashable) -> Optional[User]:
+        """Liefert den Snapshot zum Subject oder None (nicht vorhanden/abgelaufen)"""
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, subject: Hashable, user: User) -> None:
+        """Speichert einen Snapshot des Benutzers"""
+        if self.ttl_seconds <= 0:
+            return
+        snapshot = self.snapshot(user)
+        with self._lock:
+            self._entries[subject] = (snapshot, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *subjects: Hashable) -> None:
+        """Entfernt die Einträge der Subjects (z.B. alte und neue E-Mail-Adresse)"""
+        with self._lock:
+            for subject in subjects:
+                self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        """Leert den Cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Globale Cache-Instanz (PRINCIPAL_CACHE_TTL_SECONDS=0 deaktiviert den Cache)
+principal_cache = PrincipalCache(
+    ttl_seconds=float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+)
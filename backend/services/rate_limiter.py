@@ -0,0 +1,109 @@
+"""
+Rate Limiter
+Gleitendes Zeitfenster (Sliding Window Counter) mit fester Speichergröße. Pro Schlüssel (Benutzer-ID,
+IP-Adresse, E-Mail) werden nur der Beginn des aktuellen Fensters und zwei Zähler gespeichert statt
+einer Liste aller Zeitstempel; die Anzahl Schlüssel ist per LRU begrenzt.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowRateLimiter:
+    """
+    Erlaubt höchstens limit Ereignisse pro window_seconds und Schlüssel.
+    Die Anzahl im gleitenden Fenster wird aus dem Zähler des aktuellen Fensters und dem anteilig
+    gewichteten Zähler des vorherigen Fensters geschätzt. Fenster beginnen mit dem ersten Ereignis
+    eines Schlüssels.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 10000):
+        """
+        Args:
+            limit: Maximale Anzahl Ereignisse im Fenster
+            window_seconds: Länge des Fensters in Sekunden
+            max_keys: Maximale Anzahl gespeicherter Schlüssel (älteste werden verdrängt)
+        """
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        # Schlüssel -> [Beginn des aktuellen Fensters, Zähler aktuell, Zähler vorher]
+        self._windows: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _window(self, key: Hashable, now: float, create: bool) -> Optional[List[float]]:
+        window = self._windows.get(key)
+        if window is None:
+            if not create:
+                return None
+            window = [now, 0, 0]
+            self._windows[key] = window
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        else:
+            elapsed_windows = int((now - window[0]) // self.window_seconds)
+            if elapsed_windows >= 1:
+                window[2] = window[1] if elapsed_windows == 1 else 0
+                window[1] = 0
+                window[0] += elapsed_windows * self.window_seconds
+        self._windows.move_to_end(key)
+        return window
+
+    def _estimate(self, window: List[float], now: float) -> float:
+        weight = 1 - (now - window[0]) / self.window_seconds
+        return window[2] * weight + window[1]
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Prüft, ob ein weiteres Ereignis erlaubt wäre, ohne es zu zählen"""
+        now = time.time() if now is None else now
+        with self._lock:
+            window = self._window(key, now, create=False)
+            return window is None or self._estimate(window, now) < self.limit
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """
+        Zählt ein Ereignis, sofern das Limit noch nicht erreicht ist
+
+        Returns:
+            True wenn erlaubt, False wenn limitiert (das Ereignis wird dann nicht gezählt)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            window = self._window(key, now, create=True)
+            if self._estimate(window, now) >= self.limit:
+                return False
+            window[1] += 1
+            return True
+
+    def add(self, key: Hashable, now: Optional[float] = None) -> None:
+        """Zählt ein Ereignis ohne Prüfung (z.B. einen fehlgeschlagenen Login)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._window(key, now, create=True)[1] += 1
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> int:
+        """Sekunden bis zum Ende des aktuellen Fensters (Wert für den Retry-After-Header)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            window = self._window(key, now, create=False)
+            if window is None:
+                return 0
+            return max(1, math.ceil(window[0] + self.window_seconds - now))
+
+    def reset(self, key: Hashable) -> None:
+        """Verwirft die Zähler eines Schlüssels (z.B. nach erfolgreichem Login)"""
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def clear(self) -> None:
+        """Verwirft alle Zähler"""
+        with self._lock:
+            self._windows.clear()
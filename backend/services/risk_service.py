@@ -0,0 +1,325 @@
+"""
+Risk Service
+Berechnet Risikokennzahlen (Volatilität, Beta, Sharpe Ratio, Max Drawdown) eines Portfolios.
+Renditen, Kovarianzmatrix und Benchmark-Kovarianzen werden einmal täglich vorberechnet (Risikomodell);
+pro Request werden nur die Zeilen und Spalten der gehaltenen Instrumente geladen und gewichtet multipliziert.
+"""
+import os
+import threading
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.performance_service import forward_fill
+
+# Handelstage pro Jahr für die Annualisierung
+TRADING_DAYS_PER_YEAR = 252
+
+# Mindestanzahl Tagesrenditen, damit ein Instrument ins Risikomodell aufgenommen wird
+MIN_OBSERVATIONS = 20
+
+# Benchmark für das Beta (Standard: iShares Core MSCI World)
+RISK_BENCHMARK_SYMBOL = os.getenv("RISK_BENCHMARK_SYMBOL", "IE00B4L5Y983").strip().upper()
+
+# Risikofreier Zins p.a. für die Sharpe Ratio (z.B. 0.02 für 2%)
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.02"))
+
+
+def returns_matrix(closes: np.ndarray) -> np.ndarray:
+    """
+    Tagesrenditen aus Schlusskursen (Tage x Symbole)
+
+    Fehlende Kurse werden mit dem letzten bekannten Kurs aufgefüllt; vor dem ersten
+    Kurs eines Instruments ist die Rendite 0.
+    """
+    if closes.shape[0] < 2:
+        return np.zeros((0, closes.shape[1]))
+    filled = forward_fill(closes, np.full(closes.shape[1], np.nan))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = filled[1:] / filled[:-1] - 1
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+class RiskModel:
+    """
+    Vorberechnetes Risikomodell über eine Menge von Instrumenten.
+    Enthält die Tagesrenditen des Zeitfensters, deren Mittelwerte, die Kovarianzmatrix und die
+    Kovarianz jedes Instruments mit dem Benchmark. Gespeichert wird das Modell je Symbol (eine
+    Zeile der Kovarianzmatrix), sodass pro Request nur die gehaltenen Instrumente geladen werden.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        returns: np.ndarray,
+        benchmark: Optional[str] = None,
+        benchmark_returns: Optional[np.ndarray] = None,
+        statistics: Optional[Mapping[str, Any]] = None
+    ):
+        """
+        Args:
+            symbols: Instrumente (Spalten von returns)
+            returns: Tagesrenditen Tage x Symbole
+            benchmark: Symbol des Benchmarks
+            benchmark_returns: Tagesrenditen des Benchmarks (gleiche Tage wie returns)
+            statistics: Bereits berechnete Mittelwerte, Kovarianzen und Benchmark-Kovarianzen (aus from_records)
+        """
+        self.symbols = symbols
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.returns = returns
+        self.benchmark = benchmark
+        self.benchmark_returns = benchmark_returns
+        self.benchmark_variance: Optional[float] = None
+        self.benchmark_covariance: Optional[np.ndarray] = None
+
+        if statistics is not None:
+            self.mean = np.asarray(statistics["mean"], dtype=np.float64)
+            self.covariance = np.asarray(statistics["covariance"], dtype=np.float64)
+            if statistics.get("benchmark_variance") is not None:
+                self.benchmark_variance = float(statistics["benchmark_variance"])
+                self.benchmark_covariance = np.asarray(statistics["benchmark_covariance"], dtype=np.float64)
+            return
+
+        observations = len(returns)
+        self.mean = returns.mean(axis=0) if observations else np.zeros(len(symbols))
+        # Kovarianzmatrix der Renditen (Symbole x Symbole)
+        if observations > 1:
+            centered = returns - self.mean
+            self.covariance = centered.T @ centered / (observations - 1)
+        else:
+            self.covariance = np.zeros((len(symbols), len(symbols)))
+
+        if benchmark_returns is not None and observations > 1:
+            benchmark_centered = benchmark_returns - benchmark_returns.mean()
+            variance = float(benchmark_centered @ benchmark_centered / (observations - 1))
+            if variance > 0:
+                self.benchmark_variance = variance
+                self.benchmark_covariance = (returns - self.mean).T @ benchmark_centered / (observations - 1)
+
+    def to_records(self) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Serialisierbare Darstellung für die Speicherung
+
+        Returns:
+            (Kopfdaten der Version, eine Zeile je Symbol mit Position, Mittelwert, Zeile der
+            Kovarianzmatrix, Benchmark-Kovarianz und Renditen)
+        """
+        header = {"observations": len(self.returns), "benchmark_variance": self.benchmark_variance}
+        records = [
+            {
+                "symbol": symbol,
+                "position": i,
+                "mean": float(self.mean[i]),
+                "covariance": self.covariance[i].tolist(),
+                "benchmark_covariance": (
+                    float(self.benchmark_covariance[i]) if self.benchmark_covariance is not None else None
+                ),
+                "returns": self.returns[:, i].tolist(),
+            }
+            for i, symbol in enumerate(self.symbols)
+        ]
+        return header, records
+
+    @classmethod
+    def from_records(
+        cls,
+        header: Mapping[str, Any],
+        records: Sequence[Mapping[str, Any]],
+        benchmark: Optional[str] = None
+    ) -> "RiskModel":
+        """
+        Lädt ein Modell aus den Zeilen einzelner Symbole (z.B. nur der gehaltenen).
+        Aus den gespeicherten Kovarianz-Zeilen werden nur die Spalten dieser Symbole übernommen.
+        """
+        observations = int(header.get("observations") or 0)
+        positions = [record["position"] for record in records]
+        returns = np.empty((observations, len(records)))
+        covariance = np.empty((len(records), len(records)))
+        for i, record in enumerate(records):
+            returns[:, i] = record["returns"]
+            row = record["covariance"]
+            covariance[i] = [row[position] for position in positions]
+        benchmark_variance = header.get("benchmark_variance")
+        return cls(
+            [record["symbol"] for record in records],
+            returns,
+            benchmark,
+            statistics={
+                "mean": [record["mean"] for record in records],
+                "covariance": covariance,
+                "benchmark_variance": benchmark_variance,
+                "benchmark_covariance": (
+                    [record["benchmark_covariance"] for record in records] if benchmark_variance is not None else None
+                ),
+            }
+        )
+
+    def held_weights(self, values: Mapping[str, float]) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Indizes und Gewichte der gehaltenen Symbole im Modell
+
+        Returns:
+            (Indizes der Modell-Symbole, Gewichte in gleicher Reihenfolge, Anteil des Portfolios im Modell)
+        """
+        held: Dict[int, float] = {}
+        total = 0.0
+        for symbol, value in values.items():
+            total += value
+            i = self.index.get(symbol)
+            if i is not None:
+                held[i] = held.get(i, 0.0) + value
+        indices = np.fromiter(held.keys(), dtype=np.intp, count=len(held))
+        weights = np.fromiter(held.values(), dtype=np.float64, count=len(held))
+        covered = float(weights.sum())
+        if covered <= 0:
+            return indices, weights, 0.0
+        return indices, weights / covered, covered / total if total > 0 else 0.0
+
+
+def build_risk_model(
+    symbols: Sequence[str],
+    dates: Sequence[date],
+    rows: Iterable[Tuple[str, date, float]],
+    benchmark: Optional[str] = None
+) -> RiskModel:
+    """
+    Baut das Risikomodell aus gespeicherten Schlusskursen
+
+    Args:
+        symbols: Instrumente, für die Kovarianzen berechnet werden
+        dates: Handelstage des Zeitfensters (aufsteigend)
+        rows: Schlusskurse (symbol, date, close)
+        benchmark: Symbol des Benchmarks (darf auch in symbols enthalten sein)
+    """
+    columns = list(dict.fromkeys(list(symbols) + ([benchmark] if benchmark else [])))
+    column = {symbol: i for i, symbol in enumerate(columns)}
+    row_index = {day: i for i, day in enumerate(dates)}
+
+    closes = np.full((len(dates), len(columns)), np.nan)
+    for symbol, day, close in rows:
+        if symbol in column and day in row_index:
+            closes[row_index[day], column[symbol]] = close
+
+    returns = returns_matrix(closes)
+    observations = np.count_nonzero(~np.isnan(closes), axis=0) - 1
+
+    benchmark_returns = None
+    if benchmark and observations[column[benchmark]] >= MIN_OBSERVATIONS:
+        benchmark_returns = returns[:, column[benchmark]]
+
+    requested = set(symbols)
+    kept = [i for i, symbol in enumerate(columns) if symbol in requested and observations[i] >= MIN_OBSERVATIONS]
+    return RiskModel([columns[i] for i in kept], returns[:, kept], benchmark, benchmark_returns)
+
+
+def portfolio_risk(
+    model: RiskModel,
+    values: Mapping[str, float],
+    risk_free_rate: float = RISK_FREE_RATE
+) -> Dict[str, Optional[float]]:
+    """
+    Risikokennzahlen eines Portfolios aus dem Risikomodell
+
+    Args:
+        model: Vorberechnetes Risikomodell
+        values: Aktueller Wert je Symbol
+        risk_free_rate: Risikofreier Zins p.a.
+
+    Returns:
+        Dictionary mit volatility (% p.a.), beta, sharpe_ratio, max_drawdown (%) und coverage (0-1).
+        Kennzahlen sind None, wenn keine Position im Modell enthalten ist.
+    """
+    indices, weights, coverage = model.held_weights(values)
+    result: Dict[str, Optional[float]] = {
+        "volatility": None,
+        "beta": None,
+        "sharpe_ratio": None,
+        "max_drawdown": None,
+        "coverage": coverage,
+    }
+    if coverage == 0 or len(model.returns) < 2:
+        return result
+
+    # Nur die Teilmatrizen der gehaltenen Instrumente
+    covariance = model.covariance[np.ix_(indices, indices)]
+    variance = float(weights @ covariance @ weights)
+    volatility = np.sqrt(max(variance, 0.0) * TRADING_DAYS_PER_YEAR)
+    result["volatility"] = float(volatility * 100)
+
+    if model.benchmark_covariance is not None:
+        result["beta"] = float(weights @ model.benchmark_covariance[indices] / model.benchmark_variance)
+
+    if volatility > 0:
+        annual_return = float(weights @ model.mean[indices]) * TRADING_DAYS_PER_YEAR
+        result["sharpe_ratio"] = (annual_return - risk_free_rate) / volatility
+
+    # Historischer Verlauf mit heutigen Gewichten
+    wealth = np.cumprod(1 + model.returns[:, indices] @ weights)
+    peaks = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    result["max_drawdown"] = float((wealth / peaks - 1).min() * 100)
+
+    return result
+
+
+class RiskModelCache:
+    """
+    Hält die geladenen Symbol-Zeilen der aktuellen Modell-Version im Prozess.
+    Pro Request werden nur noch nicht geladene Symbole aus der Datenbank nachgeladen;
+    eine neue Version verwirft den Inhalt.
+    """
+
+    def __init__(self):
+        self._model_id: Optional[int] = None
+        self._header: Mapping[str, Any] = {}
+        self._benchmark: Optional[str] = None
+        self._records: Dict[str, Optional[Mapping[str, Any]]] = {}  # None = nicht im Modell
+        self._lock = threading.Lock()
+
+    def get_model(
+        self,
+        model_id: int,
+        symbols: Iterable[str],
+        load_header: Callable[[], Tuple[Optional[str], Mapping[str, Any]]],
+        load_records: Callable[[List[str]], Iterable[Mapping[str, Any]]]
+    ) -> RiskModel:
+        """
+        Teilmodell der Version model_id für die angefragten Symbole
+
+        Args:
+            model_id: ID der aktuellen Version
+            symbols: Benötigte Symbole (z.B. alle ISINs/Ticker der Positionen)
+            load_header: Lädt (Benchmark, Kopfdaten) der Version
+            load_records: Lädt die Zeilen der übergebenen Symbole
+        """
+        wanted = list(dict.fromkeys(symbols))
+        with self._lock:
+            current = self._model_id == model_id
+            if current:
+                header, benchmark = self._header, self._benchmark
+                missing = [symbol for symbol in wanted if symbol not in self._records]
+
+        if not current:
+            benchmark, header = load_header()
+            missing = wanted
+        loaded: Dict[str, Optional[Mapping[str, Any]]] = dict.fromkeys(missing)
+        if missing:
+            loaded.update({record["symbol"]: record for record in load_records(missing)})
+
+        with self._lock:
+            if self._model_id != model_id:
+                self._model_id, self._header, self._benchmark, self._records = model_id, header, benchmark, {}
+            self._records.update(loaded)
+            records = [self._records.get(symbol) for symbol in wanted]
+        return RiskModel.from_records(header, [record for record in records if record is not None], benchmark)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._model_id = None
+            self._header = {}
+            self._benchmark = None
+            self._records = {}
+
+
+# Globale Cache-Instanz
+risk_model_cache = RiskModelCache()
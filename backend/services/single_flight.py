@@ -0,0 +1,60 @@
+"""
+Single-Flight
+Fasst gleichzeitige, identische Analyse-Anfragen zusammen: Die erste Anfrage zu einem Schlüssel
+startet die Berechnung, alle weiteren warten auf dasselbe Ergebnis (z.B. Doppelklick oder
+mehrere Tabs). OpenAI wird dadurch einmal aufgerufen und die Historie einmal geschrieben.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Hält pro Schlüssel höchstens eine laufende Berechnung (asyncio-Task) im Event-Loop.
+    Die Berechnung läuft als eigener Task; bricht ein wartender Request ab, laufen die
+    übrigen (und die Berechnung) weiter. Fehler erhalten alle Wartenden.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0  # Anzahl Anfragen, die sich einer laufenden Berechnung angeschlossen haben
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Optional[Hashable], compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Führt compute() aus oder wartet auf die bereits laufende Berechnung zum Schlüssel.
+        Das Ergebnis wird von allen Wartenden geteilt und darf nicht verändert werden.
+
+        Args:
+            key: Schlüssel der Anfrage (None: keine Zusammenfassung)
+            compute: Funktion, die die Berechnung startet
+        """
+        if key is None:
+            return await compute()
+
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            logger.info(f"Anfrage {key} wartet auf laufende Berechnung")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Fehler gilt als abgerufen, auch wenn alle Wartenden abgebrochen haben
+            task.exception()
+
+
+# Globale Instanz für KI-Analysen
+analysis_flights = SingleFlight()
@@ -0,0 +1,35 @@
+"""
+Streaming-Hilfsfunktionen
+Antworten als NDJSON (ein JSON-Objekt pro Zeile), damit Clients und Proxys
+Teilergebnisse langer KI-Analysen sofort erhalten.
+"""
+import json
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson_line(event: Dict[str, Any]) -> str:
+    """Serialisiert ein Event als NDJSON-Zeile"""
+    return json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+
+def ndjson_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Streamt Events als NDJSON
+
+    Args:
+        events: Asynchroner Iterator von Events (Dictionaries mit mindestens "type")
+    """
+    async def lines():
+        async for event in events:
+            yield ndjson_line(event)
+
+    return StreamingResponse(
+        lines(),
+        media_type=NDJSON_MEDIA_TYPE,
+        # Puffern durch Reverse-Proxys (nginx) verhindern
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,135 @@
+"""
+Valuation Engine für Portfolio-Positionen
+Berechnet Kaufwert, aktuellen Wert und Gewinn/Verlust spaltenweise mit NumPy,
+statt jede Position einzeln in einer Python-Schleife zu bewerten.
+"""
+from typing import Any, Dict, Iterator, Optional, Sequence
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def parse_decimal_strings(values: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    Parst Dezimalzahlen als Strings (Komma oder Punkt als Trennzeichen) in ein Float-Array
+
+    Args:
+        values: Strings wie "100,50" oder "77.0855"
+
+    Returns:
+        Float-Array, nicht parsebare Werte werden zu NaN
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.float64)
+
+    normalized = np.char.replace(np.asarray([v or "" for v in values], dtype=str), ",", ".")
+    try:
+        return normalized.astype(np.float64)
+    except ValueError:
+        # Fallback für einzelne ungültige Werte: elementweise parsen
+        result = np.empty(len(normalized), dtype=np.float64)
+        for i, value in enumerate(normalized):
+            try:
+                result[i] = float(value)
+            except ValueError:
+                logger.warning(f"Ungültiger Kaufpreis '{values[i]}', wird ignoriert")
+                result[i] = np.nan
+        return result
+
+
+class PositionValuation:
+    """
+    Spaltenweises Bewertungsergebnis aller Positionen.
+    Fehlende Werte (kein aktueller Preis) sind als NaN kodiert; has_price markiert gültige Preise.
+    Alle Geldbeträge sind wie in der API auf 2 Nachkommastellen gerundet.
+    """
+
+    def __init__(self, quantity: np.ndarray, purchase_price: np.ndarray, current_price: np.ndarray):
+        self.quantity = quantity
+        self.purchase_price = purchase_price
+        self.current_price = current_price
+
+        # Preise von 0 gelten wie bisher als "kein Preis"
+        self.has_price = ~np.isnan(current_price) & (current_price != 0)
+
+        purchase_value = purchase_price * quantity
+        current_value = np.where(self.has_price, current_price * quantity, np.nan)
+        gain_loss = current_value - purchase_value
+
+        self.has_percent = self.has_price & (purchase_value > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain_loss_percent = np.where(self.has_percent, gain_loss / purchase_value * 100, np.nan)
+
+        self.purchase_value = np.round(np.nan_to_num(purchase_value), 2)
+        self.current_value = np.round(current_value, 2)
+        self.gain_loss = np.round(gain_loss, 2)
+        self.gain_loss_percent = np.round(gain_loss_percent, 2)
+
+    def __len__(self) -> int:
+        return len(self.quantity)
+
+    @property
+    def market_value(self) -> np.ndarray:
+        """Aktueller Wert je Position, Kaufwert als Fallback wenn kein Preis bekannt ist"""
+        return np.where(self.has_price, self.current_value, self.purchase_value)
+
+    @property
+    def total_purchase_value(self) -> float:
+        return float(self.purchase_value.sum())
+
+    @property
+    def total_current_value(self) -> float:
+        """Summe der aktuellen Werte aller Positionen mit bekanntem Preis"""
+        return float(self.current_value[self.has_price].sum())
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Gibt die Werte zeilenweise als Python-Typen zurück (None statt NaN).
+        Wird erst beim Erzeugen der Response-Modelle aufgerufen.
+        """
+        columns = (
+            self.quantity.tolist(),
+            self.current_price.tolist(),
+            self.purchase_value.tolist(),
+            self.current_value.tolist(),
+            self.gain_loss.tolist(),
+            self.gain_loss_percent.tolist(),
+            self.has_price.tolist(),
+            self.has_percent.tolist(),
+        )
+        for quantity, price, purchase_value, current_value, gain_loss, gain_loss_percent, has_price, has_percent in zip(*columns):
+            yield {
+                "quantity": quantity,
+                "current_price": price if has_price else None,
+                "purchase_value": purchase_value,
+                "current_value": current_value if has_price else None,
+                "gain_loss": gain_loss if has_price else None,
+                "gain_loss_percent": gain_loss_percent if has_percent else None,
+            }
+
+
+def value_positions(
+    quantities: Sequence[Any],
+    purchase_prices: Sequence[Optional[str]],
+    current_prices: Sequence[Optional[float]]
+) -> PositionValuation:
+    """
+    Bewertet alle Positionen eines Portfolios in einem vektorisierten Durchlauf
+
+    Args:
+        quantities: Stückzahlen (Decimal, float oder int)
+        purchase_prices: Kaufpreise als Strings (wie in der Datenbank gespeichert)
+        current_prices: Aktuelle Preise (None wenn unbekannt), gleiche Reihenfolge
+
+    Returns:
+        PositionValuation mit allen Wert-Spalten
+    """
+    quantity = np.asarray([float(q) if q is not None else 0.0 for q in quantities], dtype=np.float64)
+    purchase_price = parse_decimal_strings(purchase_prices)
+    current_price = np.asarray(
+        [p if p is not None else np.nan for p in current_prices],
+        dtype=np.float64
+    )
+    return PositionValuation(quantity, purchase_price, current_price)
@@ -0,0 +1,90 @@
+"""
+Valuation Snapshot Service
+Hält pro Benutzer eine einmal berechnete Bewertung aller Portfolio-Positionen vor,
+damit parallel geladene Dashboard-Endpoints Preise und Positionswerte nicht mehrfach berechnen.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ValuationSnapshotStore:
+    """
+    Speichert pro Benutzer genau einen Snapshot zusammen mit dem Wasserzeichen der Holdings.
+    Ein Snapshot ist gültig, solange sich das Wasserzeichen nicht geändert hat und er
+    jünger als die TTL ist (die TTL begrenzt das Alter der enthaltenen Preise).
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_users: int = 1000):
+        """
+        Args:
+            ttl_seconds: Maximales Alter eines Snapshots in Sekunden
+            max_users: Maximale Anzahl gespeicherter Snapshots (LRU-Verdrängung)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._snapshots: "OrderedDict[int, Tuple[Hashable, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, watermark: Hashable) -> Optional[Any]:
+        """
+        Gibt den Snapshot zurück, falls er zum Wasserzeichen passt und nicht abgelaufen ist
+        """
+        with self._lock:
+            entry = self._snapshots.get(user_id)
+            if not entry:
+                return None
+            entry_watermark, created_at, snapshot = entry
+            if entry_watermark != watermark or time.monotonic() - created_at > self.ttl_seconds:
+                del self._snapshots[user_id]
+                return None
+            self._snapshots.move_to_end(user_id)
+            return snapshot
+
+    def set(self, user_id: int, watermark: Hashable, snapshot: Any) -> None:
+        """Speichert einen Snapshot für einen Benutzer"""
+        with self._lock:
+            self._snapshots[user_id] = (watermark, time.monotonic(), snapshot)
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_users:
+                self._snapshots.popitem(last=False)
+
+    def get_or_compute(self, user_id: int, watermark: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Gibt den gültigen Snapshot zurück oder berechnet und speichert einen neuen
+
+        Args:
+            user_id: Benutzer-ID
+            watermark: Wasserzeichen der Holdings (z.B. Anzahl + letztes updated_at)
+            compute: Funktion, die den Snapshot berechnet
+        """
+        snapshot = self.get(user_id, watermark)
+        if snapshot is not None:
+            logger.debug(f"Valuation-Snapshot Hit für User {user_id}")
+            return snapshot
+
+        snapshot = compute()
+        self.set(user_id, watermark, snapshot)
+        logger.debug(f"Valuation-Snapshot berechnet für User {user_id}")
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        """Verwirft den Snapshot eines Benutzers (z.B. nach Änderungen am Portfolio)"""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Verwirft alle Snapshots"""
+        with self._lock:
+            self._snapshots.clear()
+
+
+# Globale Snapshot-Instanz
+valuation_snapshots = ValuationSnapshotStore(
+    ttl_seconds=int(os.getenv("VALUATION_SNAPSHOT_TTL_SECONDS", "60"))
+)
@@ -0,0 +1,118 @@
+"""
+Tests für den Allocation Service
+"""
+from datetime import datetime
+
+import pytest
+import portfolio_analytics
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DataError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import PortfolioHolding, User
+from portfolio_analytics import get_allocation_from_db
+from services.allocation_service import aggregate, breakdown
+from services.valuation_service import valuation_snapshots
+
+
+class TestAllocationService:
+    """Tests für die Aggregation nach mehreren Dimensionen"""
+
+    def test_all_dimensions_in_one_pass(self):
+        records = [
+            {"sector": "Technologie", "region": "Nordamerika", "asset_class": "Aktien"},
+            {"sector": "Technologie", "region": "Europa", "asset_class": "Aktien"},
+            {"sector": None, "region": "Europa", "asset_class": "Anleihen"},
+        ]
+        totals = aggregate(records, [100.0, 50.0, 25.0])
+
+        assert totals["sector"] == {"Technologie": 150.0, "Sonstige": 25.0}
+        assert totals["region"] == {"Nordamerika": 100.0, "Europa": 75.0}
+        assert totals["asset_class"] == {"Aktien": 150.0, "Anleihen": 25.0}
+
+    def test_custom_dimensions_and_label(self):
+        totals = aggregate([{"currency": "EUR"}, {}], [10.0, 5.0], ("currency",), missing_label="Unbekannt")
+        assert totals == {"currency": {"EUR": 10.0, "Unbekannt": 5.0}}
+
+    def test_breakdown_sorted_with_percentages(self):
+        result = breakdown({"Europa": 25.0, "Nordamerika": 75.0}, 100.0)
+        assert result == [("Nordamerika", 75.0, 75.0), ("Europa", 25.0, 25.0)]
+
+    def test_breakdown_with_zero_total(self):
+        assert breakdown({"Sonstige": 0.0}, 0.0) == [("Sonstige", 0.0, 0)]
+
+
+class TestAllocationFromDb:
+    """Tests für die Aggregation per GROUP BY"""
+
+    def test_invalid_purchase_price_falls_back_to_snapshot(self, monkeypatch):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user = User(name="Test", email="alloc@example.com", password="x")
+        db.add(user)
+        db.flush()
+        for name, price, sector in (("Apple", "150,5", "Technologie"), ("Kaputt", "n/a", "Finanzen")):
+            db.add(PortfolioHolding(userId=user.id, name=name, ticker=name.upper(), purchase_date=datetime(2024, 1, 1),
+                                    quantity=2, purchase_price=price, sector=sector))
+        db.commit()
+        valuation_snapshots.clear()
+
+        # PostgreSQL bricht den CAST auf "n/a" mit DataError ab (SQLite liefert 0)
+        original_query = db.query
+        calls = []
+
+        def failing_query(*entities):
+            calls.append(entities)
+            if len(calls) == 1:
+                raise DataError("SELECT ...", {}, Exception("invalid input syntax for type numeric"))
+            return original_query(*entities)
+
+        monkeypatch.setattr(db, "query", failing_query)
+        allocation = get_allocation_from_db(db, user.id)
+
+        assert "Technologie" in [item.category for item in allocation.by_sector]
+        db.close()
+
+
+    def test_invalid_purchase_price_is_detected_in_sqlite(self, monkeypatch):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user = User(name="Test", email="alloc@example.com", password="x")
+        db.add(user)
+        db.flush()
+        db.add(PortfolioHolding(userId=user.id, name="Apple", ticker="APPLE", purchase_date=datetime(2024, 1, 1),
+                                quantity=2, purchase_price=" 150,5", sector="Technologie"))
+        db.commit()
+        valuation_snapshots.clear()
+
+        snapshots = []
+        original_snapshot = portfolio_analytics.get_valuation_snapshot
+
+        def spy_snapshot(db, user_id):
+            snapshots.append(user_id)
+            return original_snapshot(db, user_id)
+
+        monkeypatch.setattr(portfolio_analytics, "get_valuation_snapshot", spy_snapshot)
+
+        # Nur gültige Kaufpreise: Aggregation bleibt in SQL
+        allocation = get_allocation_from_db(db, user.id)
+        assert [(item.category, item.value) for item in allocation.by_sector] == [("Technologie", 301.0)]
+        assert snapshots == []
+
+        # SQLite liest "n/a" beim CAST stillschweigend als 0; erkannt wird es trotzdem
+        db.add(PortfolioHolding(userId=user.id, name="Kaputt", ticker="KAPUTT", purchase_date=datetime(2024, 1, 1),
+                                quantity=2, purchase_price="n/a", sector="Finanzen"))
+        db.commit()
+        valuation_snapshots.clear()
+        allocation = get_allocation_from_db(db, user.id)
+
+        assert snapshots == [user.id]
+        assert "Technologie" in [item.category for item in allocation.by_sector]
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
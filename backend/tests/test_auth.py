@@ -0,0 +1,416 @@
+"""
+Tests für Authentifizierung und Principal-Cache
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from passlib.context import CryptContext
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth
+from auth import create_access_token, create_user_access_token, get_password_hash, pwd_context
+from database import Base, get_db
+from main import app
+from models import RefreshToken, User
+from services.password_hasher import PasswordHasher
+from services.principal_cache import PrincipalCache, principal_cache
+from services.rate_limiter import SlidingWindowRateLimiter
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(name="Test", email="auth@example.com", password=get_password_hash("geheim123")))
+    db.commit()
+    db.close()
+    factory.user_queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_user_queries(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            factory.user_queries.append(statement)
+
+    return factory
+
+
+@pytest.fixture
+def client(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    principal_cache.clear()
+    auth.login_ip_limiter.clear()
+    auth.login_account_limiter.clear()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+        principal_cache.clear()
+        auth.login_ip_limiter.clear()
+        auth.login_account_limiter.clear()
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def auth_headers(session_factory):
+    db = session_factory()
+    user = db.query(User).one()
+    headers = bearer(create_user_access_token(user))
+    db.close()
+    session_factory.user_queries.clear()
+    return lambda: headers
+
+
+class TestPrincipalCache:
+    """Tests für den Principal-Cache in get_current_user"""
+
+    def test_repeated_requests_load_user_once(self, client, session_factory, auth_headers):
+        for _ in range(4):
+            response = client.get("/api/user/profile", headers=auth_headers())
+            assert response.status_code == 200
+            assert response.json()["email"] == "auth@example.com"
+
+        assert len(session_factory.user_queries) == 1
+
+    def test_cached_user_can_be_updated(self, client, session_factory, auth_headers):
+        client.get("/api/user/profile", headers=auth_headers())
+        response = client.put("/api/user/profile", json={"name": "Neu"}, headers=auth_headers())
+
+        assert response.json()["name"] == "Neu"
+        assert client.get("/api/user/profile", headers=auth_headers()).json()["name"] == "Neu"
+        db = session_factory()
+        assert db.query(User).one().name == "Neu"
+        db.close()
+
+    def test_email_change_invalidates_cache(self, client, auth_headers):
+        client.get("/api/user/profile", headers=auth_headers())
+        response = client.put("/api/user/profile", json={"email": "neu@example.com"}, headers=auth_headers())
+        assert response.status_code == 200
+
+        # Das Token identifiziert den Benutzer über die ID und bleibt gültig
+        assert client.get("/api/user/profile", headers=auth_headers()).json()["email"] == "neu@example.com"
+
+    def test_password_change_revokes_tokens(self, client, auth_headers):
+        client.get("/api/user/profile", headers=auth_headers())
+        response = client.post(
+            "/api/user/change-password",
+            json={"current_password": "geheim123", "new_password": "neues-passwort"},
+            headers=auth_headers()
+        )
+        assert response.status_code == 200
+        assert client.get("/api/user/profile", headers=auth_headers()).status_code == 401
+
+        # Das neue Token sieht den neuen Hash
+        response = client.post(
+            "/api/user/change-password",
+            json={"current_password": "neues-passwort", "new_password": "geheim123"},
+            headers=bearer(response.json()["access_token"])
+        )
+        assert response.status_code == 200
+
+    def test_account_deletion_invalidates_cache(self, client, auth_headers):
+        client.get("/api/user/profile", headers=auth_headers())
+        assert client.delete("/api/user", headers=auth_headers()).status_code == 200
+
+        assert client.get("/api/user/profile", headers=auth_headers()).status_code == 401
+
+    def test_user_id_endpoints_skip_user_query(self, client, session_factory, auth_headers):
+        for path in ("/api/portfolio", "/api/watchlist", "/api/portfolio/dashboard/summary", "/api/user/profile"):
+            assert client.get(path, headers=auth_headers()).status_code == 200
+
+        assert len(session_factory.user_queries) == 1
+
+    def test_token_version_revocation(self, client, session_factory, auth_headers):
+        assert client.get("/api/portfolio", headers=auth_headers()).status_code == 200
+        db = session_factory()
+        db.query(User).one().token_version += 1
+        db.commit()
+        db.close()
+        # Anderer Worker: sieht die neue Version nach Ablauf der TTL
+        principal_cache.clear()
+
+        assert client.get("/api/portfolio", headers=auth_headers()).status_code == 401
+        assert client.get("/api/user/profile", headers=auth_headers()).status_code == 401
+
+    def test_tokens_without_version_are_rejected(self, client):
+        legacy = bearer(create_access_token({"sub": "auth@example.com"}))
+
+        assert client.get("/api/portfolio", headers=legacy).status_code == 401
+        assert client.get("/api/user/profile", headers=legacy).status_code == 401
+
+    def test_ttl_and_size_bound(self, monkeypatch):
+        cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+        for i in range(3):
+            cache.set(i, User(id=i, email=f"user{i}@example.com", password="x", token_version=0))
+
+        assert cache.get(0) is None
+        assert cache.get(2).email == "user2@example.com"
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+        assert cache.get(2) is None
+
+
+class SlowContext:
+    """Stand-in für einen CryptContext, der die gleichzeitigen Aufrufe mitzählt"""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return f"hash:{password}"
+
+
+class TestPasswordHasher:
+    """Tests für den Hash-Pool und Rehash beim Login"""
+
+    def test_concurrency_cap_and_queue_metrics(self):
+        context = SlowContext()
+        hasher = PasswordHasher(context, max_workers=2)
+        ticks = []
+
+        async def ticker():
+            # Der Event-Loop bleibt während des Hashings frei
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            return await asyncio.gather(*(hasher.hash(str(i)) for i in range(5)), ticker())
+
+        results = asyncio.run(scenario())
+        hasher.shutdown()
+
+        assert results[:5] == [f"hash:{i}" for i in range(5)]
+        assert context.max_running == 2
+        assert len(ticks) == 5
+        stats = hasher.stats()
+        assert (stats["queued"], stats["active"], stats["completed"]) == (0, 0, 5)
+        # Mindestens drei Aufrufe mussten auf einen freien Thread warten
+        assert 3 <= stats["max_queue_depth"] <= 5
+        assert stats["avg_wait_ms"] > 0
+
+    def test_login_rehashes_outdated_hash(self, client, session_factory):
+        outdated = CryptContext(schemes=["argon2"], argon2__rounds=2).hash("geheim123")
+        db = session_factory()
+        db.query(User).one().password = outdated
+        db.commit()
+        db.close()
+
+        response = client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "geheim123"})
+        assert response.status_code == 200
+        db = session_factory()
+        stored = db.query(User).one().password
+        db.close()
+        assert stored != outdated
+        assert not pwd_context.needs_update(stored)
+
+        # Mit dem neuen Hash funktioniert der Login weiterhin, falsche Passwörter nicht
+        assert client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "geheim123"}).status_code == 200
+        assert client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "falsch"}).status_code == 401
+
+
+class TestRateLimiter:
+    """Tests für den Sliding-Window-Rate-Limiter"""
+
+    def test_limit_within_window(self):
+        limiter = SlidingWindowRateLimiter(limit=3, window_seconds=60)
+
+        assert [limiter.hit("a", now=1000 + i) for i in range(4)] == [True, True, True, False]
+        assert limiter.hit("b", now=1005)
+        assert not limiter.allow("a", now=1010)
+        assert limiter.retry_after("a", now=1010) == 50
+
+    def test_previous_window_is_weighted(self):
+        limiter = SlidingWindowRateLimiter(limit=4, window_seconds=60)
+        for i in range(4):
+            limiter.hit("a", now=1000 + i)
+
+        # 15 s ins nächste Fenster: 4 * 0,75 = 3 geschätzte Requests -> noch einer frei
+        assert limiter.hit("a", now=1075)
+        assert not limiter.hit("a", now=1075)
+        # Nach zwei Fenstern ist alles vergessen
+        assert all(limiter.hit("a", now=1200 + i) for i in range(4))
+
+    def test_memory_is_bounded(self):
+        limiter = SlidingWindowRateLimiter(limit=1, window_seconds=60, max_keys=100)
+        for key in range(1000):
+            limiter.hit(key, now=1000)
+
+        assert len(limiter) == 100
+        assert not limiter.hit(999, now=1001)
+        assert limiter.hit(0, now=1001)
+
+
+class TestLoginThrottling:
+    """Tests für das Login-Throttling pro IP-Adresse und Konto"""
+
+    def test_account_locked_after_failures(self, client, session_factory, monkeypatch):
+        monkeypatch.setattr(auth, "login_account_limiter", SlidingWindowRateLimiter(limit=3, window_seconds=900))
+        for _ in range(3):
+            response = client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "falsch"})
+            assert response.status_code == 401
+
+        session_factory.user_queries.clear()
+        response = client.post("/api/auth/login-json", json={"email": "AUTH@example.com", "password": "geheim123"})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+        # Abgewiesen ohne Benutzer-Lookup und ohne Hash-Berechnung
+        assert session_factory.user_queries == []
+        assert auth.password_hasher.stats()["queued"] == 0
+
+    def test_success_resets_account_counter(self, client, monkeypatch):
+        monkeypatch.setattr(auth, "login_account_limiter", SlidingWindowRateLimiter(limit=2, window_seconds=900))
+        for _ in range(3):
+            client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "falsch"})
+            response = client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "geheim123"})
+            assert response.status_code == 200
+
+    def test_ip_limit_applies_to_both_endpoints(self, client, session_factory, monkeypatch):
+        monkeypatch.setattr(auth, "login_ip_limiter", SlidingWindowRateLimiter(limit=2, window_seconds=60))
+        assert client.post("/api/auth/login-json", json={"email": "a@example.com", "password": "x"}).status_code == 401
+        assert client.post("/api/auth/login", data={"username": "b@example.com", "password": "x"}).status_code == 401
+
+        session_factory.user_queries.clear()
+        response = client.post("/api/auth/login", data={"username": "auth@example.com", "password": "geheim123"})
+        assert response.status_code == 429
+        assert session_factory.user_queries == []
+
+    def test_ip_limit_uses_proxy_client_ip_header(self, client, monkeypatch):
+        monkeypatch.setattr(auth, "LOGIN_CLIENT_IP_HEADER", "do-connecting-ip")
+        monkeypatch.setattr(auth, "login_ip_limiter", SlidingWindowRateLimiter(limit=1, window_seconds=60))
+
+        def attempt(ip):
+            return client.post(
+                "/api/auth/login-json",
+                json={"email": "a@example.com", "password": "x"},
+                headers={"do-connecting-ip": ip}
+            ).status_code
+
+        # Alle Requests kommen vom selben Proxy, zählen aber je Client-IP
+        assert attempt("203.0.113.1") == 401
+        assert attempt("203.0.113.2") == 401
+        assert attempt("203.0.113.1") == 429
+
+
+class TestRefreshTokens:
+    """Tests für rotierende Refresh-Tokens"""
+
+    def login(self, client):
+        response = client.post("/api/auth/login-json", json={"email": "auth@example.com", "password": "geheim123"})
+        assert response.status_code == 200
+        return response.json()
+
+    def refresh(self, client, refresh_token):
+        return client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+
+    def test_refresh_rotates_without_password_check(self, client, session_factory):
+        tokens = self.login(client)
+        hashed_before = auth.password_hasher.stats()["completed"]
+
+        response = self.refresh(client, tokens["refresh_token"])
+        assert response.status_code == 200
+        rotated = response.json()
+        assert rotated["refresh_token"] != tokens["refresh_token"]
+        assert client.get("/api/user/profile", headers=bearer(rotated["access_token"])).status_code == 200
+        assert auth.password_hasher.stats()["completed"] == hashed_before
+
+        # Gespeichert wird nur der Hash
+        db = session_factory()
+        stored = {row.token_hash for row in db.query(RefreshToken).all()}
+        db.close()
+        assert len(stored) == 2
+        assert tokens["refresh_token"] not in stored
+
+    def test_reuse_revokes_family(self, client, monkeypatch):
+        monkeypatch.setattr(auth, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", 0)
+        tokens = self.login(client)
+        rotated = self.refresh(client, tokens["refresh_token"]).json()
+
+        # Erneute Verwendung des rotierten Tokens: auch das neue Token der Sitzung wird ungültig
+        assert self.refresh(client, tokens["refresh_token"]).status_code == 401
+        assert self.refresh(client, rotated["refresh_token"]).status_code == 401
+        # Andere Sitzungen bleiben gültig
+        other = self.login(client)
+        assert self.refresh(client, other["refresh_token"]).status_code == 200
+
+    def test_parallel_refresh_within_grace_period(self, client, session_factory):
+        tokens = self.login(client)
+
+        # Zwei Tabs lösen dasselbe Token kurz nacheinander ein: beide erhalten gültige Tokens
+        first = self.refresh(client, tokens["refresh_token"])
+        second = self.refresh(client, tokens["refresh_token"])
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.json()["refresh_token"] != second.json()["refresh_token"]
+        assert self.refresh(client, first.json()["refresh_token"]).status_code == 200
+        assert self.refresh(client, second.json()["refresh_token"]).status_code == 200
+
+        # Nach Ablauf der Karenzzeit gilt eine erneute Verwendung als Diebstahl
+        db = session_factory()
+        for row in db.query(RefreshToken).filter(RefreshToken.used_at.isnot(None)).all():
+            row.used_at = row.used_at.replace(year=2000)
+        db.commit()
+        db.close()
+        assert self.refresh(client, tokens["refresh_token"]).status_code == 401
+        db = session_factory()
+        assert db.query(RefreshToken).filter(RefreshToken.revoked_at.is_(None)).count() == 0
+        db.close()
+
+    def test_password_change_revokes_refresh_tokens(self, client):
+        tokens = self.login(client)
+        response = client.post(
+            "/api/user/change-password",
+            json={"current_password": "geheim123", "new_password": "neues-passwort"},
+            headers=bearer(tokens["access_token"])
+        )
+        assert response.status_code == 200
+
+        assert self.refresh(client, tokens["refresh_token"]).status_code == 401
+        assert self.refresh(client, response.json()["refresh_token"]).status_code == 200
+
+    def test_expired_and_logged_out_tokens_are_rejected(self, client, session_factory):
+        expired = self.login(client)
+        db = session_factory()
+        for row in db.query(RefreshToken).all():
+            row.expires_at = row.expires_at.replace(year=2000)
+        db.commit()
+        db.close()
+        assert self.refresh(client, expired["refresh_token"]).status_code == 401
+
+        tokens = self.login(client)
+        # Abgelaufene Tokens werden beim Login entfernt
+        db = session_factory()
+        assert db.query(RefreshToken).count() == 1
+        db.close()
+        assert client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+        assert self.refresh(client, tokens["refresh_token"]).status_code == 401
+        assert self.refresh(client, "unbekannt").status_code == 401
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
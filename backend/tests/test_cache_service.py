@@ -0,0 +1,287 @@
+"""
+Tests für den Cache Service und seine Backends
+"""
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+from services.cache_service import (
+    CacheBackend,
+    CacheService,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    SQLiteCacheBackend,
+    estimate_size,
+)
+
+
+class FakeRedis:
+    """Lokaler Stand-in für einen Redis-Client (Teilmenge der redis-py-API)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        entry = self.data.get(name)
+        if entry is None or entry[1] <= time.time():
+            self.data.pop(name, None)
+            return None
+        return entry[0].encode()
+
+    def set(self, name, value, ex=None):
+        self.data[name] = (value, time.time() + ex if ex else float("inf"))
+        return True
+
+    def delete(self, *names):
+        return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def scan_iter(self, match="*"):
+        return [name for name in list(self.data) if fnmatch.fnmatch(name, match)]
+
+    def sadd(self, name, *values):
+        members = self.data.setdefault(name, (set(), float("inf")))[0]
+        members.update(value.encode() for value in values)
+
+    def srem(self, name, *values):
+        if name in self.data:
+            self.data[name][0].difference_update(value.encode() for value in values)
+
+    def smembers(self, name):
+        return set(self.data.get(name, (set(),))[0])
+
+    def expire(self, name, seconds):
+        if name in self.data:
+            self.data[name] = (self.data[name][0], time.time() + seconds)
+
+
+A = ("portfolio", 1, 0)
+B = ("watchlist", 1, 7)
+C = ("portfolio", 2, 0)
+D = ("watchlist", 2, 8)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCacheBackend()
+    if request.param == "sqlite":
+        return SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    return RedisCacheBackend(FakeRedis())
+
+
+class TestCacheBackends:
+    """Gemeinsames Verhalten aller Backends"""
+
+    def test_set_get_delete(self, backend):
+        backend.set(A, {"risks": ["Klumpenrisiko"]}, 60)
+
+        assert backend.get(A) == {"risks": ["Klumpenrisiko"]}
+        assert backend.get(B) is None
+        assert backend.delete(A) is True
+        assert backend.delete(A) is False
+        assert backend.get(A) is None
+
+    def test_expired_entries_are_not_returned(self, backend, monkeypatch):
+        backend.set(A, {"x": 1}, 60)
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+
+        assert backend.get(A) is None
+
+    def test_delete_user_and_type(self, backend):
+        for key in (A, B, C, D):
+            backend.set(key, list(key), 60)
+
+        assert backend.delete_user(1, cache_type="watchlist") == 1
+        assert backend.get(A) == ["portfolio", 1, 0]
+        assert backend.delete_user(1) == 1
+        assert backend.get(A) is None
+        assert backend.delete_user(1) == 0
+
+        assert backend.delete_type("portfolio") == 1
+        assert backend.get(C) is None
+        assert backend.get(D) == ["watchlist", 2, 8]
+
+    def test_clear(self, backend):
+        backend.set(A, 1, 60)
+        backend.set(B, 2, 60)
+        backend.clear()
+
+        assert backend.get(A) is None
+        assert backend.get(B) is None
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class IncompleteBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            IncompleteBackend()
+
+
+class TestMemoryCacheBackend:
+    """Tests für die Größenbegrenzung"""
+
+    def test_lru_eviction(self):
+        backend = MemoryCacheBackend(max_entries=2)
+        backend.set(A, 1, 60)
+        backend.set(B, 2, 60)
+        backend.get(A)
+        backend.set(C, 3, 60)
+
+        assert backend.get(A) == 1
+        assert backend.get(B) is None
+        assert backend.get(C) == 3
+        assert backend.stats()["evictions"] == 1
+
+    def test_memory_ceiling(self):
+        value = {"summary": "x" * 100}
+        size = estimate_size(value)
+        backend = MemoryCacheBackend(max_bytes=2 * size)
+        backend.set(A, value, 60)
+        backend.set(B, value, 60)
+        backend.set(C, value, 60)
+
+        assert backend.get(A) is None
+        assert backend.stats()["bytes"] == 2 * size
+        assert backend.stats()["evictions"] == 1
+
+        # Überschreiben zählt die alte Größe nicht doppelt, zu große Einträge werden verworfen
+        backend.set(C, value, 60)
+        backend.set(D, {"summary": "x" * 1000}, 60)
+        assert backend.stats()["bytes"] == 2 * size
+        assert backend.get(D) is None
+
+    def test_sweep_removes_unread_expired_entries(self, monkeypatch):
+        backend = MemoryCacheBackend()
+        backend.set(A, {"x": 1}, 60)
+        backend.set(B, {"x": 1}, 600)
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+
+        assert backend.sweep() == 1
+        assert backend.stats()["entries"] == 1
+        assert backend.stats()["bytes"] == estimate_size({"x": 1})
+        assert backend.stats()["expirations"] == 1
+
+
+class TestSQLiteCacheBackend:
+    """Tests für die Persistenz"""
+
+    def test_survives_restart(self, tmp_path):
+        path = str(tmp_path / "cache.db")
+        SQLiteCacheBackend(path).set(A, {"x": 1}, 60)
+
+        assert SQLiteCacheBackend(path).get(A) == {"x": 1}
+
+    def test_memory_ceiling_and_sweep(self, tmp_path, monkeypatch):
+        backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=30)
+        backend.set(A, "x" * 10, 60)
+        backend.set(B, "x" * 10, 120)
+        backend.set(C, "x" * 10, 180)
+
+        stats = backend.stats()
+        assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 24, 1)
+        assert backend.get(A) is None
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 150)
+        assert backend.sweep() == 1
+        assert backend.stats()["entries"] == 1
+
+
+class TestRedisCacheBackend:
+    """Tests für den Redis-Namensraum"""
+
+    def test_clear_only_removes_own_keys(self):
+        client = FakeRedis()
+        client.set("session:1", "fremd")
+        backend = RedisCacheBackend(client)
+        backend.set(A, 1, 60)
+        backend.clear()
+
+        assert list(client.data) == ["session:1"]
+
+
+class TestCacheService:
+    """Tests für die unveränderte get/set/invalidate-API"""
+
+    def test_api_on_persistent_backend(self, tmp_path):
+        cache = CacheService(backend=SQLiteCacheBackend(str(tmp_path / "cache.db")))
+        cache.set(1, {"risks": []})
+        cache.set(1, {"recommendation": "halten"}, portfolio_id=7, cache_type="watchlist")
+
+        assert cache.get(1) == {"risks": []}
+        assert cache.get(1, portfolio_id=7, cache_type="watchlist") == {"recommendation": "halten"}
+        assert cache.get(2) is None
+
+        cache.invalidate(1)
+        assert cache.get(1) is None
+        assert cache.get(1, portfolio_id=7, cache_type="watchlist") is not None
+
+    def test_invalidate_user_and_type(self):
+        cache = CacheService(backend=MemoryCacheBackend())
+        cache.set(1, {"risks": []})
+        cache.set(1, {"risks": []}, portfolio_id=3)
+        cache.set(1, {"recommendation": "halten"}, portfolio_id=7, cache_type="watchlist")
+        cache.set(2, {"recommendation": "kaufen"}, portfolio_id=8, cache_type="watchlist")
+
+        assert cache.invalidate_user(1, cache_type="portfolio") == 2
+        assert cache.get(1, portfolio_id=7, cache_type="watchlist") is not None
+        assert cache.invalidate_type("watchlist") == 2
+        assert cache.stats()["entries"] == 0
+        # Die Indizes enthalten keine verwaisten Keys
+        assert cache.backend._by_user == {} and cache.backend._by_type == {}
+
+    def test_backend_errors_are_cache_misses(self):
+        class BrokenBackend(MemoryCacheBackend):
+            name = "broken"
+
+            def get(self, key):
+                raise ConnectionError("Redis nicht erreichbar")
+
+        assert CacheService(backend=BrokenBackend()).get(1) is None
+
+    def test_backend_errors_do_not_break_invalidation(self):
+        class BrokenBackend(MemoryCacheBackend):
+            name = "broken"
+
+            def delete(self, *args):
+                raise ConnectionError("Redis nicht erreichbar")
+
+            delete_user = delete_type = delete
+
+        cache = CacheService(backend=BrokenBackend())
+        cache.invalidate(1)
+        assert cache.invalidate_user(1) == 0
+        assert cache.invalidate_type("portfolio") == 0
+
+    def test_stats_count_hits_and_misses(self):
+        cache = CacheService(backend=MemoryCacheBackend())
+        cache.get(1)
+        cache.set(1, {"risks": []})
+        cache.get(1)
+        cache.get(1)
+
+        stats = cache.stats()
+        assert (stats["backend"], stats["hits"], stats["misses"], stats["entries"]) == ("memory", 2, 1, 1)
+        assert stats["bytes"] == estimate_size({"risks": []})
+
+    def test_sweeper_runs_periodically(self):
+        cache = CacheService(backend=MemoryCacheBackend())
+        cache.backend.set(A, 1, 0)
+
+        async def scenario():
+            cache.start_sweeper(0.01)
+            await asyncio.sleep(0.1)
+            await cache.stop_sweeper()
+
+        asyncio.run(scenario())
+        assert cache.stats()["entries"] == 0
+        assert cache.stats()["expirations"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
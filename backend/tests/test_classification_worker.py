@@ -0,0 +1,177 @@
+"""
+Tests für den Classification Worker
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import Instrument, PortfolioHolding, User, WatchlistItem
+import portfolio_analytics
+from services import classification_worker as classification_worker_module
+from services.classification_worker import ClassificationWorker, request_key
+from services.instrument_service import classification_backoff
+
+
+@pytest.fixture
+def session_factory():
+    # StaticPool: der Worker speichert in einem Thread, muss aber dieselbe In-Memory-Datenbank sehen
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(id=1, name="Test", email="test@example.com", password="x"))
+    db.add_all([
+        PortfolioHolding(userId=1, isin="US0378331005", name="Apple", purchase_date=datetime(2024, 1, 1),
+                         quantity=1, purchase_price="100", sector="Eigene Branche"),
+        PortfolioHolding(userId=1, ticker="NEWT", name="Newt", purchase_date=datetime(2024, 1, 1),
+                         quantity=1, purchase_price="10"),
+        WatchlistItem(userId=1, isin="US0378331005", name="Apple"),
+    ])
+    db.commit()
+    db.close()
+    try:
+        yield factory
+    finally:
+        classification_backoff.clear()
+
+
+class FakeClassifier:
+    """Ersetzt den OpenAI-Aufruf und merkt sich die Batches"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.batches = []
+
+    async def __call__(self, positions):
+        self.batches.append(positions)
+        return {
+            pos["position_id"]: self.answers[pos["isin"] or pos["ticker"]]
+            for pos in positions
+            if (pos["isin"] or pos["ticker"]) in self.answers
+        }
+
+
+def run_worker(worker, classify, session_factory, requests):
+    """Reiht Instrumente ein und wartet, bis der Worker sie abgearbeitet hat"""
+    async def scenario():
+        worker.start(classify, session_factory)
+        subscriber = worker.subscribe()
+        worker.enqueue(requests)
+        keys = {request_key(isin, ticker) for isin, ticker, _ in requests}
+        events = []
+        while len(events) < len(keys):
+            events.append(await asyncio.wait_for(subscriber.get(), 5))
+        await worker.stop()
+        return events
+
+    return asyncio.run(scenario())
+
+
+class TestClassificationWorker:
+    """Tests für die Hintergrund-Klassifizierung"""
+
+    def test_batches_and_fills_missing_fields(self, session_factory):
+        classify = FakeClassifier({
+            "US0378331005": {"sector": "Technologie", "region": "Nordamerika", "asset_class": "Aktien"},
+            "NEWT": {"sector": "Energie", "region": "Europa", "asset_class": "Aktien"},
+        })
+        worker = ClassificationWorker(batch_wait_seconds=0.05)
+
+        events = run_worker(worker, classify, session_factory, [
+            ("us0378331005", None, "Apple"),
+            (None, "newt", "Newt"),
+            ("US0378331005", "AAPL", "Apple Inc."),
+        ])
+
+        assert len(classify.batches) == 1
+        assert len(classify.batches[0]) == 2
+        assert {event["key"] for event in events} == {"US0378331005", "NEWT"}
+        assert not worker.is_pending("NEWT")
+
+        db = session_factory()
+        apple, newt = (db.query(PortfolioHolding).order_by(PortfolioHolding.id).all())
+        # Vorhandene Werte der Position bleiben erhalten
+        assert (apple.sector, apple.region) == ("Eigene Branche", "Nordamerika")
+        assert (newt.sector, newt.asset_class) == ("Energie", "Aktien")
+        assert db.query(WatchlistItem).one().sector == "Technologie"
+        assert db.query(Instrument).filter(Instrument.ticker == "NEWT").one().classified_at is not None
+        db.close()
+
+    def test_missing_answers_back_off(self, session_factory):
+        worker = ClassificationWorker(batch_wait_seconds=0.01)
+
+        events = run_worker(worker, FakeClassifier({}), session_factory, [(None, "NEWT", "Newt")])
+
+        assert events[0]["classification"] is None
+        assert not classification_backoff.allows("NEWT")
+        db = session_factory()
+        assert db.query(PortfolioHolding).filter(PortfolioHolding.ticker == "NEWT").one().sector is None
+        db.close()
+
+    def test_enqueue_skips_pending_instruments(self):
+        worker = ClassificationWorker()
+
+        assert worker.enqueue([("US0378331005", None, "Apple"), (None, None, "Ohne Symbol")]) == 1
+        assert worker.enqueue([("us0378331005", "AAPL", "Apple")]) == 0
+        assert worker.is_pending("US0378331005")
+
+
+class TestCheckPortfolioSectors:
+    """Tests für die Branchenprüfung über die Instrument-Stammdaten"""
+
+    def test_missing_sectors_are_queued_once_per_instrument(self, session_factory, monkeypatch):
+        worker = ClassificationWorker()
+        monkeypatch.setattr(classification_worker_module, "classification_worker", worker)
+        monkeypatch.setattr(portfolio_analytics, "classification_worker", worker)
+
+        async def no_openai(positions):
+            raise AssertionError("OpenAI darf nicht im Request aufgerufen werden")
+
+        monkeypatch.setattr(portfolio_analytics, "get_classification_from_openai", no_openai)
+        db = session_factory()
+        result = asyncio.run(portfolio_analytics.check_portfolio_sectors(user_id=1, db=db))
+
+        sectors = {a.name: (a.sector, a.error) for a in result.assignments}
+        assert sectors["Apple"] == ("Eigene Branche", None)
+        assert sectors["Newt"] == ("Unbekannt", "Klassifizierung läuft im Hintergrund")
+        assert result.missing_count == 1
+        assert db.query(Instrument).filter(Instrument.ticker == "NEWT").count() == 1
+        assert worker.is_pending("NEWT")
+
+        # Erneuter Aufruf: keine zweite Anfrage für dasselbe Instrument
+        assert worker.enqueue([(None, "NEWT", "Newt")]) == 0
+        asyncio.run(portfolio_analytics.check_portfolio_sectors(user_id=1, db=db))
+        assert db.query(Instrument).filter(Instrument.ticker == "NEWT").count() == 1
+        db.close()
+
+
+    def test_unchanged_portfolio_is_not_committed(self, session_factory, monkeypatch):
+        monkeypatch.setattr(classification_worker_module, "classification_worker", ClassificationWorker())
+        db = session_factory()
+        db.add_all([
+            Instrument(isin="US0378331005", sector="Technologie", region="Nordamerika", asset_class="Aktien"),
+            # Zuletzt als "Unbekannt" beantwortet: bleibt unvollständig bis zur nächsten Anfrage
+            Instrument(ticker="NEWT", classified_at=datetime.utcnow()),
+        ])
+        db.commit()
+        holdings = db.query(PortfolioHolding).all()
+
+        commits = []
+        monkeypatch.setattr(db, "commit", lambda: commits.append(True))
+        classification_worker_module.classify_holdings(db, holdings)
+        # Region und Assetklasse von Apple übernommen
+        assert commits == [True]
+
+        commits.clear()
+        classification_worker_module.classify_holdings(db, holdings)
+        assert commits == []
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
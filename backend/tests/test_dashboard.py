@@ -0,0 +1,118 @@
+"""
+Tests für den kombinierten Dashboard-Endpoint
+"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from auth import get_current_user_id
+from database import Base, get_db
+from main import app
+from models import PortfolioHolding, User
+from services.performance_service import performance_cache
+from services.price_service import StaticPriceProvider, price_service
+from services.risk_service import risk_model_cache
+from services.valuation_service import valuation_snapshots
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    user = User(id=1, name="Test", email="dashboard@example.com", password="x")
+    db.add(user)
+    db.add_all([
+        PortfolioHolding(userId=1, isin="US0378331005", ticker="AAPL", name="Apple", purchase_date=datetime(2024, 1, 1),
+                         quantity=2, purchase_price="150,00", sector="Technologie", region="Nordamerika",
+                         asset_class="Aktien"),
+        PortfolioHolding(userId=1, isin="US5949181045", ticker="MSFT", name="Microsoft",
+                         purchase_date=datetime(2024, 1, 1), quantity=1, purchase_price="400",
+                         sector="Technologie", region="Nordamerika", asset_class="Aktien"),
+    ])
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def client(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def clear_caches():
+        valuation_snapshots.clear()
+        performance_cache.clear()
+        risk_model_cache.clear()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user_id] = lambda: 1
+    provider = price_service.provider
+    price_service.set_provider(StaticPriceProvider())
+    clear_caches()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+        price_service.set_provider(provider)
+        clear_caches()
+
+
+class TestDashboardEndpoint:
+    """Tests für GET /api/portfolio/dashboard"""
+
+    def test_combined_payload(self, client):
+        response = client.get("/api/portfolio/dashboard")
+        assert response.status_code == 200
+        data = response.json()
+
+        assert set(data) == {"summary", "allocation", "risk", "performance"}
+        summary = data["summary"]
+        assert summary["position_count"] == 2
+        assert summary["total_purchase_value"] == pytest.approx(700.0)
+        assert summary["total_current_value"] == pytest.approx(2 * 185.5 + 420.3)
+        assert data["allocation"]["by_sector"] == [
+            {"category": "Technologie", "value": pytest.approx(791.3), "percentage": pytest.approx(100.0)}
+        ]
+        # Ohne nächtliches Risikomodell bleiben die Kennzahlen leer
+        assert data["risk"] == {"beta": None, "volatility": None, "sharpe_ratio": None, "max_drawdown": None}
+        assert isinstance(data["performance"]["data"], list)
+
+        # Gleiche Werte wie die Einzel-Endpoints
+        assert client.get("/api/portfolio/dashboard/summary").json() == summary
+        assert client.get("/api/portfolio/dashboard/allocation").json() == data["allocation"]
+
+    def test_fields_filter(self, client):
+        response = client.get("/api/portfolio/dashboard", params={"fields": " summary, allocation "})
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["summary"]["position_count"] == 2
+        assert data["allocation"] is not None
+        assert data["risk"] is None
+        assert data["performance"] is None
+
+    def test_unknown_fields_are_rejected(self, client):
+        response = client.get("/api/portfolio/dashboard", params={"fields": "summary,positions"})
+        assert response.status_code == 400
+        assert "positions" in response.json()["detail"]
+
+    def test_days_validation(self, client):
+        for days in (0, 3651):
+            assert client.get("/api/portfolio/dashboard", params={"days": days}).status_code == 400
+        assert client.get("/api/portfolio/dashboard", params={"days": 365}).status_code == 200
+        # days wird nur für den Performance-Verlauf geprüft
+        assert client.get("/api/portfolio/dashboard", params={"fields": "summary", "days": 0}).status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
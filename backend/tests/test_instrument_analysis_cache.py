@@ -0,0 +1,165 @@
+"""
+Tests für den benutzerübergreifenden Instrument-Analyse-Cache
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import asset_analysis_routes
+import watchlist_analysis_routes
+from auth import get_current_user
+from database import Base, get_db
+from main import app
+from models import AnalysisHistory, User, UserSettings, WatchlistItem
+from services.cache_service import cache_service
+from services.instrument_analysis_cache import InstrumentAnalysisCache, instrument_analysis_cache
+
+DAY = 24 * 3600
+
+
+class TestInstrumentAnalysisCache:
+    """Tests für Schlüssel und Speicherung"""
+
+    def test_key_components(self):
+        cache = InstrumentAnalysisCache(bucket_hours=24)
+        settings = {"riskProfile": "moderate", "investmentHorizon": "long"}
+        key = cache.key({"isin": " us0378331005", "ticker": "AAPL"}, settings, now=DAY * 100 + 10)
+
+        # ISIN vor Ticker, normalisiert; gleicher Tag -> gleicher Schlüssel
+        assert key == cache.key({"isin": "US0378331005", "name": "Apple Inc."}, settings, now=DAY * 101 - 1)
+        assert key != cache.key({"isin": "US0378331005"}, settings, now=DAY * 101)
+        assert key != cache.key({"isin": "US0378331005"}, {"riskProfile": "aggressive", "investmentHorizon": "long"}, now=DAY * 100)
+        # Positionen mit Kaufdaten im Prompt werden nicht mit Watchlist-Analysen geteilt
+        assert key != cache.key({"isin": "US0378331005", "purchase_price": "100", "quantity": 1}, settings, now=DAY * 100)
+        assert cache.key({"name": "Ohne Symbol"}, settings) is None
+
+    def test_lru_and_copies(self):
+        cache = InstrumentAnalysisCache(max_entries=2)
+        cache.set("a", {"risks": []}, "2024-01-01")
+        cache.set("b", {"risks": []}, "2024-01-01")
+        analysis, _ = cache.get("a")
+        analysis["generated_at"] = "geändert"
+        cache.set("c", {"risks": []}, "2024-01-01")
+
+        assert cache.get("a") == ({"risks": []}, "2024-01-01")
+        assert cache.get("b") is None
+
+
+class CountingAnalyzer:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, asset, user_settings=None, force_refresh=False):
+        self.calls += 1
+        return {
+            "fundamentalAnalysis": {"summary": asset["name"]},
+            "technicalAnalysis": {"signal": "hold"},
+            "risks": [],
+            "recommendation": "halten"
+        }
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    for i in range(3):
+        user = User(name=f"User {i}", email=f"shared_{i}@example.com", password="x")
+        db.add(user)
+        db.flush()
+        db.add(UserSettings(userId=user.id, riskProfile="aggressive" if i == 2 else "moderate", investmentHorizon="long"))
+        db.add(WatchlistItem(userId=user.id, name="Apple", isin="US0378331005", ticker="AAPL"))
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def client(session_factory):
+    current = {"email": "shared_0@example.com"}
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_current_user():
+        db = session_factory()
+        try:
+            return db.query(User).filter(User.email == current["email"]).one()
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_current_user
+    cache_service.clear()
+    instrument_analysis_cache.clear()
+    asset_analysis_routes.rate_limit_store_asset.clear()
+    client = TestClient(app)
+    client.login_as = lambda index: current.update(email=f"shared_{index}@example.com")
+    try:
+        yield client
+    finally:
+        app.dependency_overrides.clear()
+        cache_service.clear()
+        instrument_analysis_cache.clear()
+
+
+def item_id_of(session_factory, index):
+    db = session_factory()
+    try:
+        user = db.query(User).filter(User.email == f"shared_{index}@example.com").one()
+        return db.query(WatchlistItem).filter(WatchlistItem.userId == user.id).one().id
+    finally:
+        db.close()
+
+
+class TestSharedAnalyses:
+    """Tests für geteilte Analysen zwischen Benutzern"""
+
+    def test_asset_analysis_is_shared_per_profile(self, client, session_factory, monkeypatch):
+        analyzer = CountingAnalyzer()
+        monkeypatch.setattr(asset_analysis_routes, "analyze_single_asset", analyzer)
+
+        cached_flags = []
+        for index in (0, 1, 2):
+            client.login_as(index)
+            response = client.post("/api/asset/analyze", json={"asset_type": "watchlist", "asset_id": item_id_of(session_factory, index)})
+            assert response.status_code == 200
+            cached_flags.append(response.json()["cached"])
+
+        # User 1 teilt das Profil von User 0, User 2 hat ein anderes Risikoprofil
+        assert cached_flags == [False, True, False]
+        assert analyzer.calls == 2
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == 3
+        db.close()
+
+        client.login_as(1)
+        response = client.post("/api/asset/analyze", json={"asset_type": "watchlist", "asset_id": item_id_of(session_factory, 1), "force_refresh": True})
+        assert response.json()["cached"] is False
+        assert analyzer.calls == 3
+
+    def test_watchlist_uses_analysis_of_other_user(self, client, session_factory, monkeypatch):
+        analyzer = CountingAnalyzer()
+        monkeypatch.setattr(watchlist_analysis_routes, "analyze_single_asset", analyzer)
+
+        client.login_as(0)
+        assert client.post("/api/watchlist/analyze", json={}).json()[0]["cached"] is False
+        client.login_as(1)
+        assert client.post("/api/watchlist/analyze", json={}).json()[0]["cached"] is True
+
+        assert analyzer.calls == 1
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == 2
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,190 @@
+"""
+Tests für den Instrument Service
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, create_mock_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Instrument, PortfolioHolding
+from services.instrument_service import (
+    CLASSIFICATION_REFRESH_DAYS,
+    CLASSIFICATION_RETRY_DAYS,
+    SEED_INSTRUMENTS,
+    ClassificationBackoff,
+    apply_classification,
+    classification_backoff,
+    get_or_create_instrument,
+    is_classified,
+    load_instruments,
+    needs_classification,
+    seed_instruments,
+    store_classification,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class TestInstrumentIndex:
+    """Tests für das Laden und Nachschlagen von Instrumenten"""
+
+    def test_lookup_by_isin_then_ticker(self, db):
+        db.add_all([
+            Instrument(isin="US0378331005", ticker="AAPL", sector="Technologie"),
+            Instrument(ticker="MSFT", sector="Software"),
+        ])
+        db.commit()
+
+        index = load_instruments(db, [("us0378331005", None), (None, "msft"), (None, "AAPL")])
+
+        assert index.get("US0378331005", None).sector == "Technologie"
+        assert index.get(None, "AAPL").isin == "US0378331005"
+        assert index.get(None, "msft").sector == "Software"
+        # Ticker mit widersprechender ISIN passt nicht
+        assert index.get("DE0000000001", "AAPL") is None
+
+    def test_no_symbols(self, db):
+        assert load_instruments(db, [(None, None)]).get(None, None) is None
+
+
+class TestGetOrCreateInstrument:
+    """Tests für das Anlegen und Ergänzen von Stammdaten"""
+
+    def test_creates_instrument_once(self, db):
+        index = load_instruments(db, [])
+        first = get_or_create_instrument(db, index, "US0378331005", "aapl", "Apple", {"sector": "Technologie"})
+        second = get_or_create_instrument(db, index, "US0378331005", None, "Apple Inc.")
+        db.commit()
+
+        assert first is second
+        assert db.query(Instrument).count() == 1
+        assert (first.ticker, first.name, first.sector) == ("AAPL", "Apple", "Technologie")
+
+    def test_fills_missing_fields_without_overwriting(self, db):
+        db.add(Instrument(isin="US0378331005", sector="Technologie"))
+        db.commit()
+        index = load_instruments(db, [("US0378331005", None)])
+
+        instrument = get_or_create_instrument(
+            db, index, "US0378331005", "AAPL",
+            classification={"sector": "Hardware", "region": "Nordamerika", "asset_class": "Unbekannt"}
+        )
+
+        assert instrument.ticker == "AAPL"
+        assert instrument.sector == "Technologie"
+        assert instrument.region == "Nordamerika"
+        assert instrument.asset_class is None
+        assert not is_classified(instrument)
+
+    def test_concurrent_create_of_ticker_only_instrument(self, db):
+        # Index vor der parallelen Anlage geladen
+        index = load_instruments(db, [(None, "NEWT")])
+        other = sessionmaker(bind=db.get_bind())()
+        other.add(Instrument(ticker="NEWT", name="Parallel"))
+        other.commit()
+        other.close()
+
+        instrument = get_or_create_instrument(db, index, None, "newt", "Newt")
+        db.commit()
+
+        assert instrument.name == "Parallel"
+        assert db.query(Instrument).filter(Instrument.ticker == "NEWT").count() == 1
+        # Gleicher Ticker mit ISIN bleibt ein eigenes Instrument
+        get_or_create_instrument(db, load_instruments(db, []), "US0000000001", "NEWT")
+        db.commit()
+        assert db.query(Instrument).filter(Instrument.ticker == "NEWT").count() == 2
+
+
+    def test_same_ticker_with_different_isins(self, db):
+        index = load_instruments(db, [])
+        first = get_or_create_instrument(db, index, "US0000000001", "SAME")
+        second = get_or_create_instrument(db, index, "US0000000002", "SAME")
+        db.commit()
+
+        assert first is not second
+        assert db.query(Instrument).filter(Instrument.ticker == "SAME").count() == 2
+
+    def test_mysql_ticker_index_uses_generated_column(self):
+        statements = []
+        engine = create_mock_engine(
+            "mysql+pymysql://", lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=engine.dialect)))
+        )
+        Instrument.__table__.create(engine, checkfirst=False)
+
+        ddl = "\n".join(statements)
+        # Kein global eindeutiger Index auf ticker, sondern auf der generierten Spalte
+        assert "CREATE UNIQUE INDEX uq_instruments_ticker_without_isin" not in ddl
+        assert "IF(isin IS NULL, ticker, NULL)" in ddl
+        assert "ADD UNIQUE INDEX uq_instruments_ticker_without_isin (ticker_without_isin)" in ddl
+
+
+class TestClassification:
+    """Tests für die Übernahme der Klassifizierung in Positionen"""
+
+    def test_apply_only_missing_fields(self):
+        holding = PortfolioHolding(sector="Eigene Branche")
+        instrument = Instrument(sector="Technologie", region="Nordamerika", asset_class="Aktien")
+
+        assert apply_classification(holding, instrument)
+        assert (holding.sector, holding.region, holding.asset_class) == ("Eigene Branche", "Nordamerika", "Aktien")
+        assert not apply_classification(holding, instrument)
+
+    def test_seed_is_idempotent(self, db):
+        assert seed_instruments(db) == len(SEED_INSTRUMENTS)
+        assert seed_instruments(db) == 0
+        assert is_classified(db.query(Instrument).filter(Instrument.isin == "DE000BASF111").one())
+
+
+class TestClassificationCache:
+    """Tests für Negativ-Caching und Auffrischung von OpenAI-Klassifizierungen"""
+
+    NOW = datetime(2024, 6, 1)
+
+    def test_unknown_answer_is_cached_until_retry(self):
+        instrument = Instrument(isin="XX0000000001")
+        assert needs_classification(instrument, self.NOW)
+
+        store_classification(instrument, {"sector": "Unbekannt", "region": "Europa", "asset_class": "Unbekannt"}, self.NOW)
+
+        assert instrument.sector is None
+        assert instrument.region == "Europa"
+        assert not needs_classification(instrument, self.NOW + timedelta(days=CLASSIFICATION_RETRY_DAYS))
+        assert needs_classification(instrument, self.NOW + timedelta(days=CLASSIFICATION_RETRY_DAYS + 1))
+
+    def test_classified_instruments_are_refreshed(self):
+        seeded = Instrument(isin="US0378331005", sector="Technologie", region="Nordamerika", asset_class="Aktien")
+        classified = Instrument(isin="XX0000000002")
+        store_classification(classified, {"sector": "Energie", "region": "Europa", "asset_class": "Aktien"}, self.NOW)
+
+        assert not needs_classification(seeded, self.NOW + timedelta(days=10000))
+        assert not needs_classification(classified, self.NOW + timedelta(days=CLASSIFICATION_REFRESH_DAYS))
+        assert needs_classification(classified, self.NOW + timedelta(days=CLASSIFICATION_REFRESH_DAYS + 1))
+
+    def test_failed_calls_back_off(self):
+        instrument = Instrument(isin="XX0000000003")
+        try:
+            classification_backoff.failed(["XX0000000003"])
+            assert not needs_classification(instrument, self.NOW)
+        finally:
+            classification_backoff.clear()
+        assert needs_classification(instrument, self.NOW)
+
+    def test_backoff_expires(self):
+        backoff = ClassificationBackoff(seconds=0)
+        backoff.failed(["AAA"])
+        assert backoff.allows("AAA")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,228 @@
+"""
+Tests für die Job-Warteschlange asynchroner Analysen
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from auth import get_current_user
+from database import Base, get_db
+from main import app
+from models import AnalysisJob, User
+from services import job_service
+from services.job_service import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JobWorker,
+    claim_next_job,
+    complete_job,
+    fail_job,
+    submit_job,
+)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(name="Test", email="jobs@example.com", password="x"))
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user_id(db):
+    return db.query(User).one().id
+
+
+class TestJobQueue:
+    """Tests für Anlegen, Übernehmen und Abschließen von Jobs"""
+
+    def test_submit_claim_complete(self, db, user_id):
+        job = submit_job(db, user_id, "portfolio_analysis", {"force_refresh": False})
+        assert job.status == JOB_QUEUED
+
+        claimed = claim_next_job(db, "worker-1")
+        assert claimed.id == job.id
+        assert (claimed.status, claimed.attempts, claimed.locked_by) == (JOB_RUNNING, 1, "worker-1")
+
+        # Ein zweiter Worker bekommt denselben Job nicht
+        assert claim_next_job(db, "worker-2") is None
+
+        complete_job(db, claimed, {"risks": []})
+        db.refresh(claimed)
+        assert claimed.status == JOB_SUCCEEDED
+        assert claimed.result == {"risks": []}
+        assert claimed.finished_at is not None
+
+    def test_retry_with_backoff(self, db, user_id):
+        submit_job(db, user_id, "portfolio_analysis", {})
+        job = claim_next_job(db, "worker-1")
+        now = datetime.utcnow()
+
+        fail_job(db, job, RuntimeError("Timeout"), now=now)
+
+        assert job.status == JOB_QUEUED
+        assert job.error == "Timeout"
+        assert job.run_after == now + timedelta(seconds=job_service.JOB_RETRY_DELAY_SECONDS)
+        # Erst nach der Wartezeit erneut fällig
+        assert claim_next_job(db, "worker-1", now=now) is None
+        retried = claim_next_job(db, "worker-1", now=job.run_after)
+        assert retried.attempts == 2
+
+        fail_job(db, retried, RuntimeError("Timeout"), now=now)
+        assert retried.run_after == now + timedelta(seconds=job_service.JOB_RETRY_DELAY_SECONDS * 2)
+
+    def test_attempts_exhausted(self, db, user_id):
+        submit_job(db, user_id, "portfolio_analysis", {})
+        far_future = datetime.utcnow() + timedelta(days=1)
+        for _ in range(job_service.JOB_MAX_ATTEMPTS):
+            job = claim_next_job(db, "worker-1", now=far_future)
+            fail_job(db, job, RuntimeError("Timeout"), now=far_future - timedelta(days=1))
+
+        assert job.status == JOB_FAILED
+        assert claim_next_job(db, "worker-1", now=far_future) is None
+
+    def test_client_errors_are_not_retried(self, db, user_id):
+        submit_job(db, user_id, "portfolio_analysis", {})
+        job = claim_next_job(db, "worker-1")
+
+        fail_job(db, job, HTTPException(status_code=400, detail="Portfolio ist leer."))
+
+        assert job.status == JOB_FAILED
+        assert job.error == "Portfolio ist leer."
+        assert job.attempts == 1
+
+    def test_stale_running_job_is_reclaimed(self, db, user_id):
+        submit_job(db, user_id, "portfolio_analysis", {})
+        claim_next_job(db, "crashed-worker")
+        later = datetime.utcnow() + timedelta(seconds=job_service.JOB_LOCK_TIMEOUT_SECONDS + 1)
+
+        job = claim_next_job(db, "worker-2", now=later)
+
+        assert job.locked_by == "worker-2"
+        assert job.attempts == 2
+
+
+class TestJobWorker:
+    """Tests für die Ausführung im Event-Loop"""
+
+    def test_worker_runs_jobs(self, session_factory, db, user_id):
+        calls = []
+
+        async def handler(session, job_user_id, params):
+            calls.append((job_user_id, params))
+            if params.get("fail"):
+                raise HTTPException(status_code=404, detail="nicht gefunden")
+            return {"ok": True}
+
+        # Ein Slot: die In-Memory-Datenbank hat nur eine Verbindung für alle Threads
+        worker = JobWorker(concurrency=1, poll_interval=0.05)
+        worker.register("test", handler)
+        ok = submit_job(db, user_id, "test", {"n": 1})
+        failed = submit_job(db, user_id, "test", {"fail": True})
+        unknown = submit_job(db, user_id, "unknown", {})
+
+        def open_jobs():
+            session = session_factory()
+            try:
+                return session.query(AnalysisJob).filter(AnalysisJob.finished_at.is_(None)).count()
+            finally:
+                session.close()
+
+        async def scenario():
+            worker.start(session_factory)
+            for _ in range(40):
+                await asyncio.sleep(0.05)
+                if not open_jobs():
+                    break
+            await worker.stop()
+
+        asyncio.run(scenario())
+
+        db.expire_all()
+        assert db.get(AnalysisJob, ok.id).result == {"ok": True}
+        assert (db.get(AnalysisJob, failed.id).status, db.get(AnalysisJob, failed.id).error) == (JOB_FAILED, "nicht gefunden")
+        assert db.get(AnalysisJob, unknown.id).status == JOB_FAILED
+        assert sorted(calls, key=str) == [(user_id, {"fail": True}), (user_id, {"n": 1})]
+
+
+class TestJobRoutes:
+    """Tests für Anlegen, Status und Ergebnis über die API"""
+
+    @pytest.fixture
+    def client(self, session_factory):
+        def override_get_db():
+            session = session_factory()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        def override_current_user():
+            session = session_factory()
+            try:
+                return session.query(User).one()
+            finally:
+                session.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_current_user] = override_current_user
+        try:
+            yield TestClient(app)
+        finally:
+            app.dependency_overrides.clear()
+
+    def test_submit_poll_and_fetch_result(self, client, session_factory):
+        response = client.post("/api/jobs", json={"type": "watchlist_analysis", "params": {"item_id": 3}})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.json()["status"] == JOB_QUEUED
+
+        assert client.get(f"/api/jobs/{job_id}/result").status_code == 202
+
+        async def handler(db, user_id, params):
+            return [{"item_id": params["item_id"]}]
+
+        worker = JobWorker()
+        worker.register("watchlist_analysis", handler)
+        worker._session_factory = session_factory
+        db = session_factory()
+        claimed = claim_next_job(db, worker.worker_id)
+        db.close()
+        assert claimed.params == {"item_id": 3, "force_refresh": False}
+        asyncio.run(worker.run_job(job_id))
+
+        assert client.get(f"/api/jobs/{job_id}").json()["status"] == JOB_SUCCEEDED
+        result = client.get(f"/api/jobs/{job_id}/result")
+        assert result.status_code == 200
+        assert result.json() == [{"item_id": 3}]
+
+    def test_invalid_requests(self, client):
+        assert client.post("/api/jobs", json={"type": "unknown"}).status_code == 400
+        assert client.post("/api/jobs", json={"type": "asset_analysis", "params": {}}).status_code == 422
+        assert client.get("/api/jobs/999").status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
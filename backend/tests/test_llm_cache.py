@@ -0,0 +1,173 @@
+"""
+Tests für den persistenten LLM-Response-Cache
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import LLMResponseCache
+from services import openai_service
+from services.llm_cache import LLMResponseCacheService, prompt_hash
+from services.openai_service import analyze_single_asset, stream_portfolio_analysis
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def cache(session_factory, monkeypatch):
+    cache = LLMResponseCacheService(ttl_hours=1, max_bytes=1000, session_factory=session_factory)
+    monkeypatch.setattr(openai_service, "llm_cache", cache)
+    monkeypatch.setattr(openai_service, "LLM_CACHE_ENABLED", True)
+    return cache
+
+
+class CountingCompletions:
+    """Zählt die OpenAI-Aufrufe und liefert eine feste Antwort"""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if kwargs.get("stream"):
+            async def chunks():
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.content))])
+            return chunks()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+
+def use_client(monkeypatch, content):
+    completions = CountingCompletions(content)
+    monkeypatch.setattr(openai_service, "_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return completions
+
+
+class TestPromptHash:
+    """Tests für den Cache-Schlüssel"""
+
+    def test_every_input_changes_the_key(self):
+        base = prompt_hash("gpt-4o-mini", "system", "user", 0.7)
+
+        assert base == prompt_hash("gpt-4o-mini", "system", "user", 0.7)
+        assert len({
+            base,
+            prompt_hash("gpt-4o", "system", "user", 0.7),
+            prompt_hash("gpt-4o-mini", "System", "user", 0.7),
+            prompt_hash("gpt-4o-mini", "system", "user ", 0.7),
+            prompt_hash("gpt-4o-mini", "system", "user", 0.3),
+        }) == 5
+
+
+class TestLLMResponseCacheService:
+    """Tests für TTL und Verdrängung"""
+
+    def test_round_trip_and_ttl(self, cache):
+        now = datetime.utcnow()
+        cache.set("a", "gpt-4o-mini", '{"x": 1}', now=now)
+
+        assert cache.get("a", now=now + timedelta(minutes=59)) == '{"x": 1}'
+        assert cache.get("a", now=now + timedelta(hours=1)) is None
+        assert cache.get("a", now=now) is None
+
+    def test_least_recently_used_entries_are_evicted(self, cache, session_factory):
+        now = datetime.utcnow()
+        cache.set("a", "gpt-4o-mini", "x" * 400, now=now)
+        cache.set("b", "gpt-4o-mini", "x" * 400, now=now + timedelta(seconds=1))
+        # "a" wurde nach "b" gelesen und bleibt erhalten
+        cache.get("a", now=now + timedelta(seconds=2))
+        cache.set("c", "gpt-4o-mini", "x" * 400, now=now + timedelta(seconds=3))
+
+        db = session_factory()
+        assert sorted(entry.prompt_hash for entry in db.query(LLMResponseCache)) == ["a", "c"]
+        db.close()
+
+    def test_oversized_response_is_not_stored(self, cache):
+        cache.set("big", "gpt-4o-mini", "x" * 2000)
+        assert cache.get("big") is None
+
+
+class TestCachedCompletions:
+    """Tests für die Nutzung des Caches in den Analysen"""
+
+    def test_identical_prompt_is_answered_from_cache(self, cache, monkeypatch):
+        completions = use_client(monkeypatch, json.dumps({"recommendation": "halten"}))
+        asset = {"name": "Apple", "isin": "US0378331005", "ticker": "AAPL"}
+
+        first = asyncio.run(analyze_single_asset(asset, {"riskProfile": "moderate"}))
+        second = asyncio.run(analyze_single_asset(dict(asset), {"riskProfile": "moderate"}))
+        asyncio.run(analyze_single_asset(asset, {"riskProfile": "aggressive"}))
+
+        assert first == second
+        assert completions.calls == 2
+
+    def test_force_refresh_calls_model_and_stores_answer(self, cache, monkeypatch):
+        completions = use_client(monkeypatch, json.dumps({"recommendation": "halten"}))
+        client = openai_service.get_openai_client()
+
+        async def complete(force_refresh=False):
+            return await openai_service.create_json_completion(client, "System", "Prompt", force_refresh=force_refresh)
+
+        asyncio.run(complete())
+        completions.content = json.dumps({"recommendation": "kaufen"})
+        refreshed = asyncio.run(complete(force_refresh=True))
+
+        assert completions.calls == 2
+        assert json.loads(refreshed) == {"recommendation": "kaufen"}
+        # Ohne force_refresh wird die neue Antwort aus dem Cache geliefert
+        assert asyncio.run(complete()) == refreshed
+        assert completions.calls == 2
+
+    def test_force_refresh_reaches_single_asset_and_stream(self, cache, monkeypatch):
+        completions = use_client(monkeypatch, json.dumps({"risks": ["Klumpenrisiko"], "recommendation": "halten"}))
+        asset = {"name": "Apple", "ticker": "AAPL"}
+        holdings = [{"ticker": "AAPL", "name": "Apple", "quantity": 1, "purchase_price": "100"}]
+
+        async def stream(force_refresh):
+            return [event async for event in stream_portfolio_analysis(holdings, None, force_refresh)]
+
+        for force_refresh in (False, True):
+            asyncio.run(analyze_single_asset(asset, force_refresh=force_refresh))
+            asyncio.run(stream(force_refresh))
+
+        assert completions.calls == 4
+
+    def test_invalid_json_is_not_cached(self, cache, monkeypatch):
+        completions = use_client(monkeypatch, "kein JSON")
+        asset = {"name": "Apple", "ticker": "AAPL"}
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                asyncio.run(analyze_single_asset(asset))
+
+        assert completions.calls == 2
+
+    def test_stream_replays_cached_response(self, cache, monkeypatch):
+        completions = use_client(monkeypatch, json.dumps({"risks": ["Klumpenrisiko"], "cashAssessment": "ok"}))
+        holdings = [{"ticker": "AAPL", "name": "Apple", "quantity": 1, "purchase_price": "100"}]
+
+        async def collect():
+            return [event async for event in stream_portfolio_analysis(holdings)]
+
+        first = asyncio.run(collect())
+        second = asyncio.run(collect())
+
+        assert completions.calls == 1
+        assert [e.get("section") for e in second] == ["risks", "cashAssessment", None]
+        assert second == first
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,146 @@
+"""
+Tests für den gemeinsamen asynchronen OpenAI-Client
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import openai_service
+from services.openai_service import (
+    OPENAI_MAX_CONNECTIONS,
+    JSONSectionParser,
+    analyze_single_asset,
+    close_openai_client,
+    get_openai_client,
+    stream_portfolio_analysis,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_llm_cache(monkeypatch):
+    """Jeder Test ruft den (simulierten) Client auf; der LLM-Cache wird in test_llm_cache.py geprüft"""
+    monkeypatch.setattr(openai_service, "LLM_CACHE_ENABLED", False)
+
+
+@pytest.fixture
+def no_client(monkeypatch):
+    for name in ("OPENAI_API_KEY", "OPENAI_SECRET", "OPENAI_SCRET"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(openai_service, "_client", None)
+
+
+class SlowCompletions:
+    """Simuliert eine langsame OpenAI-Antwort, ohne den Event-Loop zu blockieren"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        content = json.dumps({"recommendation": "halten", "technicalAnalysis": {"signal": "hold"}})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class TestOpenAIClient:
+    """Tests für Erstellung und Wiederverwendung des Clients"""
+
+    def test_without_api_key(self, no_client):
+        assert get_openai_client() is None
+
+    def test_shared_client_with_bounded_pool(self, no_client, monkeypatch):
+        monkeypatch.setenv("OPENAI_SCRET", "sk-test")
+
+        client = get_openai_client()
+        try:
+            assert client is get_openai_client()
+            pool = client._client._transport._pool
+            assert pool._max_connections == OPENAI_MAX_CONNECTIONS
+        finally:
+            asyncio.run(close_openai_client())
+        assert openai_service._client is None
+
+    def test_analyses_run_concurrently(self, no_client, monkeypatch):
+        fake = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions(0.2)))
+        monkeypatch.setattr(openai_service, "_client", fake)
+
+        async def scenario():
+            return await asyncio.gather(*(
+                analyze_single_asset({"name": f"Asset {i}", "ticker": f"T{i}"}) for i in range(5)
+            ))
+
+        started = time.monotonic()
+        results = asyncio.run(scenario())
+
+        assert time.monotonic() - started < 0.6
+        assert [result["recommendation"] for result in results] == ["halten"] * 5
+
+
+class StreamingCompletions:
+    """Liefert eine JSON-Antwort in kleinen Token-Chunks"""
+
+    def __init__(self, content, chunk_size=7):
+        self.content = content
+        self.chunk_size = chunk_size
+
+    async def create(self, **kwargs):
+        assert kwargs["stream"] is True
+
+        async def chunks():
+            for i in range(0, len(self.content), self.chunk_size):
+                delta = SimpleNamespace(content=self.content[i:i + self.chunk_size])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+        return chunks()
+
+
+class TestJSONSectionParser:
+    """Tests für das Lesen von Abschnitten aus gestreamtem JSON"""
+
+    def test_sections_complete_in_order(self):
+        document = json.dumps({
+            "risks": ["Klumpenrisiko, Tech}"],
+            "cashAssessment": 'Zitat "}" im Text',
+            "diversification": {"sectorBreakdown": {"Technologie": 60}},
+            "score": 12,
+        })
+        parser = JSONSectionParser()
+
+        sections = []
+        for i in range(0, len(document), 3):
+            sections += parser.feed(document[i:i + 3])
+
+        assert sections == list(json.loads(document).items())
+
+    def test_number_at_end_of_buffer_is_not_emitted(self):
+        parser = JSONSectionParser()
+
+        assert parser.feed('{"score": 12') == []
+        assert parser.feed("3}") == [("score", 123)]
+
+
+class TestStreamPortfolioAnalysis:
+    """Tests für die gestreamte Portfolio-Analyse"""
+
+    def test_sections_then_normalized_result(self, no_client, monkeypatch):
+        content = json.dumps({"risks": ["Klumpenrisiko"], "diversification": {"sectorBreakdown": {"Tech": "60%"}}})
+        fake = SimpleNamespace(chat=SimpleNamespace(completions=StreamingCompletions(content)))
+        monkeypatch.setattr(openai_service, "_client", fake)
+        holdings = [{"ticker": "AAPL", "name": "Apple", "quantity": 1, "purchase_price": "100"}]
+
+        async def collect():
+            return [event async for event in stream_portfolio_analysis(holdings)]
+
+        events = asyncio.run(collect())
+
+        assert [(e["type"], e.get("section")) for e in events] == [
+            ("section", "risks"), ("section", "diversification"), ("result", None)
+        ]
+        assert events[-1]["data"]["diversification"]["sectorBreakdown"] == {"Tech": 60.0}
+        assert events[-1]["data"]["fundamentalAnalysis"][0]["ticker"] == "AAPL"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
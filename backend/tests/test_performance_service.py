@@ -0,0 +1,110 @@
+"""
+Tests für den Performance Service
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from services.performance_service import PerformanceCache, build_series, forward_fill
+
+START = date(2024, 3, 1)
+
+
+def day(offset):
+    return START + timedelta(days=offset)
+
+
+class TestForwardFill:
+    """Tests für das spaltenweise Auffüllen fehlender Kurse"""
+
+    def test_fills_with_last_known_value_and_seed(self):
+        matrix = np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, np.nan]])
+        seed = np.array([5.0, np.nan])
+
+        filled = forward_fill(matrix, seed)
+
+        assert filled.tolist() == [[5.0, 1.0], [2.0, 1.0], [2.0, 1.0]]
+
+    def test_unknown_values_stay_nan(self):
+        filled = forward_fill(np.full((2, 1), np.nan), np.array([np.nan]))
+        assert np.isnan(filled).all()
+
+
+class TestBuildSeries:
+    """Tests für den Aufbau des Performance-Verlaufs"""
+
+    def test_holdings_accumulate_from_purchase_date(self):
+        lots = [("AAA", 10, 5.0, day(-30)), ("AAA", 5, 6.0, day(2))]
+        rows = [("AAA", day(-1), 8.0), ("AAA", day(3), 10.0)]
+
+        series = build_series(lots, START, day(4), rows)
+
+        assert series.dates[0] == START
+        assert series.values.tolist() == [80.0, 80.0, 120.0, 150.0, 150.0]
+
+    def test_cost_basis_without_price_history(self):
+        lots = [("AAA", 10, 5.0, day(-30)), ("BBB", 2, 50.0, day(1))]
+        rows = [("AAA", day(0), 6.0)]
+
+        series = build_series(lots, START, day(2), rows)
+
+        assert series.values.tolist() == [60.0, 160.0, 160.0]
+
+    def test_purchases_after_window_are_ignored(self):
+        series = build_series([("AAA", 1, 10.0, day(10))], START, day(2), [])
+        assert series.values.tolist() == [0.0, 0.0, 0.0]
+
+
+class TestExtend:
+    """Tests für das inkrementelle Fortschreiben"""
+
+    def test_new_closes_update_window(self):
+        series = build_series([("AAA", 1, 10.0, day(-5))], START, day(2), [("AAA", day(0), 11.0)], 1)
+
+        series.extend(day(2), [("AAA", day(1), 12.0)], 2)
+
+        assert series.values.tolist() == [11.0, 12.0, 12.0]
+        assert series.price_watermark == 2
+
+    def test_shift_matches_full_rebuild(self):
+        lots = [("AAA", 2, 10.0, day(-5)), ("BBB", 1, 20.0, day(3))]
+        rows = [("AAA", day(-2), 9.0), ("AAA", day(1), 11.0), ("BBB", day(4), 25.0)]
+        new_rows = [("AAA", day(5), 13.0)]
+
+        series = build_series(lots, START, day(3), rows[:2])
+        series.extend(day(5), rows[2:] + new_rows, 3)
+
+        rebuilt = build_series(lots, day(2), day(5), rows + new_rows, 3)
+        assert series.start == rebuilt.start
+        assert series.values.tolist() == rebuilt.values.tolist()
+
+
+class TestPerformanceCache:
+    """Tests für den Cache pro (Benutzer, Tage)"""
+
+    def test_entry_bound_to_holdings_watermark(self):
+        cache = PerformanceCache()
+        series = build_series([("AAA", 1, 1.0, START)], START, START, [])
+        cache.set(1, 30, (1, None, 1), series)
+
+        assert cache.get(1, 30, (1, None, 1)) is series
+        assert cache.get(1, 30, (2, None, 2)) is None
+        assert cache.get(1, 90, (1, None, 1)) is None
+
+    def test_lru_eviction_and_invalidate(self):
+        cache = PerformanceCache(max_entries=2)
+        series = build_series([("AAA", 1, 1.0, START)], START, START, [])
+        cache.set(1, 30, "w", series)
+        cache.set(1, 90, "w", series)
+        cache.set(2, 30, "w", series)
+
+        assert cache.get(1, 30, "w") is None
+
+        cache.invalidate(1)
+        assert cache.get(1, 90, "w") is None
+        assert cache.get(2, 30, "w") is series
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
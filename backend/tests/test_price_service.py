@@ -0,0 +1,105 @@
+"""
+Tests für den Price Service
+"""
+import pytest
+
+from services.price_service import (
+    PriceProvider,
+    PriceService,
+    SQLitePriceProvider,
+    StaticPriceProvider,
+)
+
+
+class CountingProvider(PriceProvider):
+    """Provider, der die Anzahl der Batch-Aufrufe mitzählt"""
+
+    name = "counting"
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def get_prices(self, symbols):
+        symbols = list(symbols)
+        self.calls.append(symbols)
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+
+class TestPriceProvider:
+    """Tests für die Basisklasse der Provider"""
+
+    def test_incomplete_provider_cannot_be_created(self):
+        class IncompleteProvider(PriceProvider):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            IncompleteProvider()
+
+
+class TestSQLitePriceProvider:
+    """Tests für den SQLite-Stand-in-Provider"""
+
+    def test_set_and_get_prices(self, tmp_path):
+        provider = SQLitePriceProvider(str(tmp_path / "prices.db"))
+        provider.set_prices({"us0378331005": 185.5, "MSFT": 420.3})
+
+        result = provider.get_prices(["US0378331005", "MSFT", "UNKNOWN"])
+        assert result == {"US0378331005": 185.5, "MSFT": 420.3}
+
+    def test_update_existing_price(self, tmp_path):
+        provider = SQLitePriceProvider(str(tmp_path / "prices.db"))
+        provider.set_prices({"AAPL": 100.0})
+        provider.set_prices({"AAPL": 110.0})
+
+        assert provider.get_prices(["AAPL"]) == {"AAPL": 110.0}
+
+
+class TestPriceService:
+    """Tests für den TTL-Cache vor dem Provider"""
+
+    def test_assets_resolved_with_single_batch(self):
+        provider = CountingProvider({"US0378331005": 185.5, "MSFT": 420.3})
+        service = PriceService(provider, ttl_seconds=60)
+
+        prices = service.get_prices_for_assets([
+            ("US0378331005", "AAPL"),
+            (None, "msft"),
+            ("US0378331005", None),
+            (None, "UNKNOWN"),
+        ])
+
+        assert prices == [185.5, 420.3, 185.5, None]
+        assert len(provider.calls) == 1
+        assert sorted(provider.calls[0]) == ["AAPL", "MSFT", "UNKNOWN", "US0378331005"]
+
+    def test_cached_prices_skip_provider(self):
+        provider = CountingProvider({"MSFT": 420.3})
+        service = PriceService(provider, ttl_seconds=60)
+
+        service.get_price(None, "MSFT")
+        service.get_price(None, "MSFT")
+        service.get_price(None, "UNKNOWN")
+        service.get_price(None, "UNKNOWN")
+
+        assert provider.calls == [["MSFT"], ["UNKNOWN"]]
+
+    def test_expired_prices_are_refetched(self):
+        provider = CountingProvider({"MSFT": 420.3})
+        service = PriceService(provider, ttl_seconds=0)
+
+        service.get_price(None, "MSFT")
+        service.get_price(None, "MSFT")
+
+        assert len(provider.calls) == 2
+
+    def test_set_provider_clears_cache(self):
+        service = PriceService(StaticPriceProvider({"MSFT": 1.0}), ttl_seconds=60)
+        assert service.get_price(None, "MSFT") == 1.0
+
+        service.set_provider(StaticPriceProvider({"MSFT": 2.0}))
+        assert service.get_price(None, "MSFT") == 2.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,157 @@
+"""
+Tests für den Risk Service
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from services.risk_service import (
+    TRADING_DAYS_PER_YEAR,
+    RiskModel,
+    RiskModelCache,
+    build_risk_model,
+    portfolio_risk,
+    returns_matrix,
+)
+
+DATES = [date(2024, 1, 1) + timedelta(days=i) for i in range(60)]
+
+
+def price_rows(symbol, closes):
+    return [(symbol, day, close) for day, close in zip(DATES, closes)]
+
+
+def random_walk(seed, volatility=0.01):
+    rng = np.random.default_rng(seed)
+    return (100 * np.cumprod(1 + rng.normal(0, volatility, len(DATES)))).tolist()
+
+
+class TestReturnsMatrix:
+    """Tests für die Renditeberechnung"""
+
+    def test_missing_closes_are_forward_filled(self):
+        closes = np.array([[100.0, np.nan], [110.0, 50.0], [np.nan, 55.0]])
+
+        returns = returns_matrix(closes)
+
+        np.testing.assert_allclose(returns, [[0.1, 0.0], [0.0, 0.1]])
+
+
+class TestBuildRiskModel:
+    """Tests für den Aufbau des Risikomodells"""
+
+    def test_instruments_without_enough_history_are_dropped(self):
+        rows = price_rows("AAA", random_walk(1)) + price_rows("BBB", [10.0] * 5)
+
+        model = build_risk_model(["AAA", "BBB"], DATES, rows)
+
+        assert model.symbols == ["AAA"]
+        assert model.covariance.shape == (1, 1)
+
+    def test_serialization_keeps_statistics(self):
+        rows = price_rows("AAA", random_walk(1)) + price_rows("BBB", random_walk(4)) + price_rows("IDX", random_walk(2))
+        model = build_risk_model(["AAA", "BBB"], DATES, rows, benchmark="IDX")
+
+        header, records = model.to_records()
+        loaded = RiskModel.from_records(header, records, "IDX")
+
+        assert loaded.symbols == model.symbols
+        np.testing.assert_allclose(loaded.covariance, model.covariance)
+        np.testing.assert_allclose(loaded.benchmark_covariance, model.benchmark_covariance)
+        assert loaded.benchmark_variance == pytest.approx(model.benchmark_variance)
+
+    def test_subset_matches_full_model(self):
+        symbols = ["AAA", "BBB", "CCC"]
+        rows = [row for i, symbol in enumerate(symbols + ["IDX"]) for row in price_rows(symbol, random_walk(i + 1))]
+        model = build_risk_model(symbols, DATES, rows, benchmark="IDX")
+        header, records = model.to_records()
+
+        subset = RiskModel.from_records(header, [r for r in records if r["symbol"] in ("AAA", "CCC")], "IDX")
+
+        values = {"AAA": 200.0, "CCC": 100.0}
+        assert subset.covariance.shape == (2, 2)
+        full_metrics, subset_metrics = portfolio_risk(model, values), portfolio_risk(subset, values)
+        for key in full_metrics:
+            assert subset_metrics[key] == pytest.approx(full_metrics[key])
+
+
+    def test_covariance_is_read_from_stored_rows(self):
+        symbols = ["AAA", "BBB", "CCC"]
+        rows = [row for i, symbol in enumerate(symbols) for row in price_rows(symbol, random_walk(i + 1))]
+        model = build_risk_model(symbols, DATES, rows)
+        header, records = model.to_records()
+
+        # Nur Zeilen und Spalten der geladenen Symbole, ohne Neuberechnung aus den Renditen
+        loaded = RiskModel.from_records(header, [dict(r, returns=[0.0] * header["observations"]) for r in records[::2]])
+
+        np.testing.assert_allclose(loaded.covariance, model.covariance[np.ix_([0, 2], [0, 2])])
+
+
+class TestRiskModelCache:
+    """Tests für das Nachladen einzelner Symbole"""
+
+    def test_loads_only_missing_symbols_per_version(self):
+        rows = price_rows("AAA", random_walk(1)) + price_rows("BBB", random_walk(2))
+        header, records = build_risk_model(["AAA", "BBB"], DATES, rows).to_records()
+        by_symbol = {record["symbol"]: record for record in records}
+        requested = []
+
+        def load_records(symbols):
+            requested.append(sorted(symbols))
+            return [by_symbol[s] for s in symbols if s in by_symbol]
+
+        cache = RiskModelCache()
+        model = cache.get_model(1, ["AAA", "NEW"], lambda: (None, header), load_records)
+        assert model.symbols == ["AAA"]
+
+        model = cache.get_model(1, ["AAA", "BBB", "NEW"], lambda: (None, header), load_records)
+        assert model.symbols == ["AAA", "BBB"]
+        # Neue Version: alles wird neu geladen
+        cache.get_model(2, ["AAA"], lambda: (None, header), load_records)
+        assert requested == [["AAA", "NEW"], ["BBB"], ["AAA"]]
+
+
+class TestPortfolioRisk:
+    """Tests für die Kennzahlen eines Portfolios"""
+
+    def test_matches_direct_calculation(self):
+        closes_a, closes_b, closes_idx = random_walk(1), random_walk(2, 0.02), random_walk(3)
+        rows = price_rows("AAA", closes_a) + price_rows("BBB", closes_b) + price_rows("IDX", closes_idx)
+        model = build_risk_model(["AAA", "BBB"], DATES, rows, benchmark="IDX")
+
+        metrics = portfolio_risk(model, {"AAA": 300.0, "BBB": 100.0}, risk_free_rate=0.0)
+
+        returns = np.diff(np.array([closes_a, closes_b, closes_idx]), axis=1) / np.array([closes_a, closes_b, closes_idx])[:, :-1]
+        portfolio = 0.75 * returns[0] + 0.25 * returns[1]
+        volatility = np.std(portfolio, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+        beta = np.cov(portfolio, returns[2])[0, 1] / np.var(returns[2], ddof=1)
+        wealth = np.cumprod(1 + portfolio)
+        drawdown = (wealth / np.maximum.accumulate(np.maximum(wealth, 1.0)) - 1).min()
+
+        assert metrics["volatility"] == pytest.approx(volatility * 100)
+        assert metrics["beta"] == pytest.approx(beta)
+        assert metrics["sharpe_ratio"] == pytest.approx(portfolio.mean() * TRADING_DAYS_PER_YEAR / volatility)
+        assert metrics["max_drawdown"] == pytest.approx(drawdown * 100)
+        assert metrics["coverage"] == 1.0
+
+    def test_positions_outside_model_reduce_coverage(self):
+        model = build_risk_model(["AAA"], DATES, price_rows("AAA", random_walk(1)))
+
+        metrics = portfolio_risk(model, {"AAA": 100.0, "NEW": 300.0})
+
+        assert metrics["coverage"] == 0.25
+        assert metrics["beta"] is None
+        assert metrics["volatility"] is not None
+
+    def test_no_covered_positions(self):
+        model = build_risk_model(["AAA"], DATES, price_rows("AAA", random_walk(1)))
+
+        metrics = portfolio_risk(model, {"NEW": 100.0})
+
+        assert metrics["volatility"] is None
+        assert metrics["coverage"] == 0.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,160 @@
+"""
+Tests für das Zusammenfassen gleichzeitiger Analyse-Anfragen (Single-Flight)
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import portfolio_analysis_routes
+from database import Base
+from models import AnalysisHistory, PortfolioHolding, User
+from portfolio_analysis_routes import PortfolioAnalysisRequest, run_portfolio_analysis
+from services.cache_service import cache_service
+from services.instrument_analysis_cache import InstrumentAnalysisCache
+from services.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Tests für die Single-Flight-Gruppe"""
+
+    def test_concurrent_calls_share_one_computation(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return {"value": value}
+
+        async def scenario():
+            return await asyncio.gather(
+                flights.do("a", lambda: compute(1)),
+                flights.do("a", lambda: compute(2)),
+                flights.do("b", lambda: compute(3)),
+            )
+
+        results = asyncio.run(scenario())
+
+        assert results == [{"value": 1}, {"value": 1}, {"value": 3}]
+        assert calls == [1, 3]
+        assert flights.coalesced == 1
+        assert flights.in_flight == 0
+
+    def test_errors_reach_all_waiters(self):
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("Timeout")
+
+        async def scenario():
+            return await asyncio.gather(flights.do("a", fail), flights.do("a", fail), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+
+        assert [str(result) for result in results] == ["Timeout", "Timeout"]
+        assert flights.in_flight == 0
+
+    def test_cancelled_waiter_does_not_cancel_computation(self):
+        flights = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "fertig"
+
+        async def scenario():
+            first = asyncio.ensure_future(flights.do("a", compute))
+            second = asyncio.ensure_future(flights.do("a", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(scenario()) == "fertig"
+
+    def test_instrument_analyses_of_different_users_are_coalesced(self):
+        cache = InstrumentAnalysisCache()
+        calls = []
+
+        async def analyze():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"recommendation": "halten"}
+
+        key = cache.key({"isin": "US0378331005"}, {"riskProfile": "moderate"})
+
+        async def scenario():
+            return await asyncio.gather(*(cache.get_or_analyze(key, analyze) for _ in range(5)))
+
+        results = asyncio.run(scenario())
+
+        assert len(calls) == 1
+        assert all(analysis == {"recommendation": "halten"} for analysis, _, _ in results)
+        # Jede Anfrage erhält eine eigene Kopie
+        assert results[0][0] is not results[1][0]
+
+
+class TestPortfolioAnalysisCoalescing:
+    """Gleichzeitige Portfolio-Analysen desselben Benutzers"""
+
+    @pytest.fixture
+    def session_factory(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        user = User(name="Test", email="single_flight@example.com", password="x")
+        db.add(user)
+        db.flush()
+        db.add_all([
+            PortfolioHolding(userId=user.id, name=name, ticker=name, purchase_date=datetime(2024, 1, 15), quantity=1, purchase_price="100")
+            for name in ("AAPL", "MSFT")
+        ])
+        db.commit()
+        db.close()
+        cache_service.clear()
+        yield factory
+        cache_service.clear()
+
+    def test_double_click_triggers_one_analysis(self, session_factory, monkeypatch):
+        calls = []
+
+        async def fake_analyze_portfolio(holdings, user_settings=None, force_refresh=False):
+            calls.append(len(holdings))
+            await asyncio.sleep(0.05)
+            return {
+                "fundamentalAnalysis": [],
+                "technicalAnalysis": [],
+                "risks": ["Klumpenrisiko"],
+                "diversification": {"regionBreakdown": {}, "sectorBreakdown": {}, "positionWeights": {}},
+                "cashAssessment": "",
+                "suggestedRebalancing": "",
+                "shortTermAdvice": "",
+                "longTermAdvice": "",
+            }
+
+        monkeypatch.setattr(portfolio_analysis_routes, "analyze_portfolio", fake_analyze_portfolio)
+        sessions = [session_factory() for _ in range(3)]
+        user_id = sessions[0].query(User).one().id
+
+        async def scenario():
+            return await asyncio.gather(*(
+                run_portfolio_analysis(db, user_id, PortfolioAnalysisRequest(force_refresh=True)) for db in sessions
+            ))
+
+        results = asyncio.run(scenario())
+        for db in sessions:
+            db.close()
+
+        assert calls == [2]
+        assert len({result.risks[0] for result in results}) == 1
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == 2
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
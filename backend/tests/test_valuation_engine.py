@@ -0,0 +1,57 @@
+"""
+Tests für die vektorisierte Valuation Engine
+"""
+from decimal import Decimal
+
+import pytest
+
+from services.valuation_engine import parse_decimal_strings, value_positions
+
+
+class TestValuationEngine:
+    """Tests für die spaltenweise Bewertung"""
+
+    def test_parse_decimal_strings(self):
+        result = parse_decimal_strings(["100,50", "77.0855", "abc"])
+        assert result[0] == 100.5
+        assert result[1] == 77.0855
+        assert result[2] != result[2]  # NaN
+
+    def test_values_match_single_position_logic(self):
+        valuation = value_positions(
+            [Decimal("10"), Decimal("11.532"), 5.0],
+            ["100,50", "77.0855", "20"],
+            [185.5, None, 0.0]
+        )
+        records = list(valuation.records())
+
+        assert records[0] == {
+            "quantity": 10.0,
+            "current_price": 185.5,
+            "purchase_value": 1005.0,
+            "current_value": 1855.0,
+            "gain_loss": 850.0,
+            "gain_loss_percent": 84.58,
+        }
+        # Ohne Preis (oder Preis 0) bleiben aktuelle Werte leer
+        assert records[1]["purchase_value"] == round(11.532 * 77.0855, 2)
+        assert records[1]["current_value"] is None
+        assert records[2]["current_price"] is None
+        assert records[2]["gain_loss_percent"] is None
+
+    def test_totals_and_market_value(self):
+        valuation = value_positions([10, 2], ["100", "50"], [110.0, None])
+
+        assert valuation.total_purchase_value == 1100.0
+        assert valuation.total_current_value == 1100.0
+        assert valuation.market_value.tolist() == [1100.0, 100.0]
+
+    def test_empty_portfolio(self):
+        valuation = value_positions([], [], [])
+        assert len(valuation) == 0
+        assert valuation.total_purchase_value == 0.0
+        assert list(valuation.records()) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,48 @@
+"""
+Tests für den Valuation-Snapshot-Store
+"""
+import pytest
+
+from services.valuation_service import ValuationSnapshotStore
+
+
+class TestValuationSnapshotStore:
+    """Tests für Wiederverwendung und Invalidierung von Snapshots"""
+
+    def test_snapshot_reused_for_same_watermark(self):
+        store = ValuationSnapshotStore(ttl_seconds=60)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"positions": len(calls)}
+
+        first = store.get_or_compute(1, (3, "2024-01-15", 7), compute)
+        second = store.get_or_compute(1, (3, "2024-01-15", 7), compute)
+
+        assert first is second
+        assert len(calls) == 1
+
+    def test_changed_watermark_recomputes(self):
+        store = ValuationSnapshotStore(ttl_seconds=60)
+
+        store.get_or_compute(1, (3, "2024-01-15", 7), lambda: "alt")
+        result = store.get_or_compute(1, (4, "2024-01-16", 8), lambda: "neu")
+
+        assert result == "neu"
+
+    def test_invalidate_and_lru_bound(self):
+        store = ValuationSnapshotStore(ttl_seconds=60, max_users=2)
+        store.set(1, "w", "a")
+        store.set(2, "w", "b")
+        store.set(3, "w", "c")
+
+        assert store.get(1, "w") is None
+        assert store.get(3, "w") == "c"
+
+        store.invalidate(3)
+        assert store.get(3, "w") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,146 @@
+"""
+Tests für die Watchlist-Analyse
+"""
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import watchlist_analysis_routes
+from auth import get_current_user
+from database import Base, get_db
+from main import app
+from models import AnalysisHistory, User, WatchlistItem
+from services.cache_service import cache_service
+from services.instrument_analysis_cache import instrument_analysis_cache
+
+ITEM_COUNT = 6
+ANALYSIS_DELAY = 0.2
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    user = User(name="Test", email="watchlist_analysis@example.com", password="x")
+    db.add(user)
+    db.commit()
+    db.add_all([WatchlistItem(userId=user.id, name=f"Asset {i}", ticker=f"T{i}") for i in range(ITEM_COUNT)])
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def client(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_current_user():
+        db = session_factory()
+        try:
+            return db.query(User).one()
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_current_user
+    cache_service.clear()
+    instrument_analysis_cache.clear()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+        cache_service.clear()
+        instrument_analysis_cache.clear()
+
+
+class FakeAnalyzer:
+    """Simuliert eine langsame KI-Analyse und zählt gleichzeitige Aufrufe"""
+
+    def __init__(self, fail_for=None, slow=None):
+        self.fail_for = fail_for
+        self.slow = slow
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, asset, user_settings=None, force_refresh=False):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(ANALYSIS_DELAY * (3 if asset["ticker"] == self.slow else 1))
+            if asset["ticker"] == self.fail_for:
+                raise RuntimeError("Timeout")
+            return {"fundamentalAnalysis": {"summary": asset["name"]}, "technicalAnalysis": {"signal": "hold"}}
+        finally:
+            self.active -= 1
+
+
+class TestAnalyzeWatchlist:
+    """Tests für die parallele Analyse aller Watchlist-Items"""
+
+    def test_items_are_analyzed_concurrently(self, client, session_factory, monkeypatch):
+        analyzer = FakeAnalyzer()
+        monkeypatch.setattr(watchlist_analysis_routes, "analyze_single_asset", analyzer)
+        monkeypatch.setattr(watchlist_analysis_routes, "WATCHLIST_ANALYSIS_CONCURRENCY", 3)
+
+        started = time.monotonic()
+        response = client.post("/api/watchlist/analyze", json={})
+        elapsed = time.monotonic() - started
+
+        assert response.status_code == 200
+        assert [r["fundamentalAnalysis"]["summary"] for r in response.json()] == [f"Asset {i}" for i in range(ITEM_COUNT)]
+        assert analyzer.max_active == 3
+        assert elapsed < ANALYSIS_DELAY * ITEM_COUNT / 2
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == ITEM_COUNT
+        db.close()
+
+        # Zweiter Aufruf kommt vollständig aus dem Cache
+        cached = client.post("/api/watchlist/analyze", json={}).json()
+        assert all(r["cached"] for r in cached)
+
+    def test_failed_item_keeps_successful_analyses(self, client, session_factory, monkeypatch):
+        monkeypatch.setattr(watchlist_analysis_routes, "analyze_single_asset", FakeAnalyzer(fail_for="T2"))
+
+        response = client.post("/api/watchlist/analyze", json={})
+
+        assert response.status_code == 500
+        assert "Asset 2" in response.json()["detail"]
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == ITEM_COUNT - 1
+        db.close()
+
+
+class TestStreamWatchlistAnalysis:
+    """Tests für die gestreamte Watchlist-Analyse"""
+
+    def test_items_are_streamed_as_they_complete(self, client, session_factory, monkeypatch):
+        monkeypatch.setattr(watchlist_analysis_routes, "analyze_single_asset", FakeAnalyzer(fail_for="T1", slow="T0"))
+
+        with client.stream("POST", "/api/watchlist/analyze/stream", json={}) as response:
+            assert response.headers["content-type"] == "application/x-ndjson"
+            events = [json.loads(line) for line in response.iter_lines() if line]
+
+        assert sorted(e["type"] for e in events[:-1]) == ["error"] + ["item"] * (ITEM_COUNT - 1)
+        # Das langsamste Item kommt zuletzt, die übrigen warten nicht darauf
+        assert events[-2]["data"]["asset_ticker"] == "T0"
+        assert events[-1] == {"type": "done", "count": ITEM_COUNT - 1, "failed": 1}
+        db = session_factory()
+        assert db.query(AnalysisHistory).count() == ITEM_COUNT - 1
+        db.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
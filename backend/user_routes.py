@@ -9,7 +9,8 @@ import logging
 
 from database import get_db
 from models import User, UserSettings
-from auth import get_current_user, get_password_hash, verify_password
+from auth import get_current_user, password_hasher, create_user_access_token, revoke_user_tokens, issue_refresh_token
+from services.principal_cache import principal_cache
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +118,7 @@ async def update_user_profile(
         
         db.commit()
         db.refresh(current_user)
+        principal_cache.invalidate(current_user.id)
         
         logger.info(f"Profile updated for user {current_user.id}")
         return UserProfileResponse(
@@ -239,7 +241,7 @@ async def change_password(
     """Change user password"""
     try:
         # Verify current password
-        if not verify_password(password_request.current_password, current_user.password):
+        if not await password_hasher.verify(password_request.current_password, current_user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Aktuelles Passwort ist falsch"
@@ -258,12 +260,21 @@ async def change_password(
                 detail="Neues Passwort ist zu lang (max. 128 Zeichen)"
             )
         
-        # Update password
-        current_user.password = get_password_hash(password_request.new_password)
+        # Update password und alle bisherigen Tokens (andere Sitzungen) widerrufen
+        current_user.password = await password_hasher.hash(password_request.new_password)
+        revoke_user_tokens(current_user)
+        refresh_token = issue_refresh_token(db, current_user)
         db.commit()
+        principal_cache.invalidate(current_user.id)
         
         logger.info(f"Password changed for user {current_user.id}")
-        return {"message": "Passwort erfolgreich geändert"}
+        # Die aktuelle Sitzung erhält Tokens mit der neuen Version
+        return {
+            "message": "Passwort erfolgreich geändert",
+            "access_token": create_user_access_token(current_user),
+            "token_type": "bearer",
+            "refresh_token": refresh_token
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -284,7 +295,7 @@ async def setup_2fa(
     """Setup or disable 2FA"""
     try:
         # Verify password
-        if not verify_password(two_factor_request.password, current_user.password):
+        if not await password_hasher.verify(two_factor_request.password, current_user.password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Passwort ist falsch"
@@ -383,6 +394,7 @@ async def delete_account(
         # Delete user (cascade will delete related data)
         db.delete(current_user)
         db.commit()
+        principal_cache.invalidate(user_id)
         
         logger.info(f"Account deleted for user {user_id} ({user_email})")
         return {"message": "Konto erfolgreich gelöscht"}
@@ -4,9 +4,11 @@ Endpoints für AI-gestützte Watchlist-Analysen
 """
 from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.orm import Session
+import asyncio
 import logging
+import os
 from datetime import datetime
 
 from database import get_db
@@ -14,11 +16,17 @@ from models import User, WatchlistItem, UserSettings, AnalysisHistory
 from auth import get_current_user
 from services.openai_service import analyze_single_asset
 from services.cache_service import cache_service
+from services.instrument_analysis_cache import instrument_analysis_cache
+from services.single_flight import analysis_flights
+from services.streaming import ndjson_response
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Maximale Anzahl gleichzeitiger KI-Analysen pro Watchlist-Anfrage
+WATCHLIST_ANALYSIS_CONCURRENCY = int(os.getenv("WATCHLIST_ANALYSIS_CONCURRENCY", "5"))
+
 # Pydantic Models
 class WatchlistAnalysisRequest(BaseModel):
     item_id: Optional[int] = None  # Wenn None: analysiere alle Watchlist-Items
@@ -35,6 +43,207 @@ class WatchlistAnalysisResponse(BaseModel):
     cached: bool = False
 
 
+def get_watchlist_items(db: Session, user_id: int, item_id: Optional[int]) -> List[WatchlistItem]:
+    """Lädt ein bestimmtes oder alle Watchlist-Items des Users"""
+    query = db.query(WatchlistItem).filter(WatchlistItem.userId == user_id)
+    if item_id:
+        query = query.filter(WatchlistItem.id == item_id)
+    items = query.all()
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Keine Watchlist-Einträge gefunden."
+        )
+    return items
+
+
+def get_user_settings_dict(db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+    """Risikoprofil und Anlagehorizont des Users für den Prompt"""
+    user_settings_obj = db.query(UserSettings).filter(
+        UserSettings.userId == user_id
+    ).first()
+    if not user_settings_obj:
+        return None
+    return {
+        "riskProfile": user_settings_obj.riskProfile,
+        "investmentHorizon": user_settings_obj.investmentHorizon
+    }
+
+
+def build_asset_dict(item: WatchlistItem) -> Dict[str, Any]:
+    """Konvertiert ein Watchlist-Item in das Asset-Format des OpenAI Service"""
+    return {
+        "name": item.name,
+        "isin": item.isin,
+        "ticker": item.ticker,
+        "sector": item.sector,
+        "region": item.region,
+        "asset_class": item.asset_class
+    }
+
+
+def build_analysis_response(
+    item: WatchlistItem,
+    analysis: Dict[str, Any],
+    analysis_date: str,
+    cached: bool
+) -> WatchlistAnalysisResponse:
+    return WatchlistAnalysisResponse(
+        item_id=item.id,
+        asset_name=item.name,
+        asset_isin=item.isin,
+        asset_ticker=item.ticker,
+        fundamentalAnalysis=analysis.get("fundamentalAnalysis", {}),
+        technicalAnalysis=analysis.get("technicalAnalysis", {}),
+        analysis_date=analysis_date,
+        cached=cached
+    )
+
+
+def get_cached_analysis(user_id: int, item: WatchlistItem) -> Optional[WatchlistAnalysisResponse]:
+    """Liefert die gecachte Analyse eines Items als Response (oder None)"""
+    # Verwende item.id als portfolio_id-Parameter für eindeutigen Cache-Key
+    cached_analysis = cache_service.get(user_id, portfolio_id=item.id, cache_type="watchlist")
+    if not cached_analysis:
+        return None
+    logger.info(f"Cache Hit für Watchlist-Item {item.id}")
+    return build_analysis_response(
+        item,
+        cached_analysis,
+        cached_analysis.get("analysisDate", datetime.utcnow().isoformat()),
+        cached=True
+    )
+
+
+async def run_item_analysis(
+    semaphore: asyncio.Semaphore,
+    item_id: int,
+    asset_dict: Dict[str, Any],
+    user_settings: Optional[Dict[str, Any]],
+    force_refresh: bool = False
+) -> Tuple[Dict[str, Any], str, bool]:
+    """
+    Analysiert ein Item, sobald ein Platz im Semaphore frei ist.
+    Liegt für das Instrument (bei gleichem Risikoprofil und Anlagehorizont) bereits eine Analyse
+    eines anderen Benutzers vor, wird diese ohne OpenAI-Aufruf übernommen.
+
+    Returns:
+        (Analyse, Analysezeitpunkt, aus dem Instrument-Cache)
+    """
+    async def analyze() -> Dict[str, Any]:
+        async with semaphore:
+            logger.info(f"Starte AI-Analyse für Watchlist-Item {item_id}: {asset_dict['name']}")
+            return await analyze_single_asset(asset_dict, user_settings, force_refresh=force_refresh)
+    
+    key = instrument_analysis_cache.key(asset_dict, user_settings)
+    return await instrument_analysis_cache.get_or_analyze(key, analyze, force_refresh)
+
+
+def store_item_analysis(
+    db: Session,
+    user_id: int,
+    item: WatchlistItem,
+    analysis: Dict[str, Any],
+    analysis_date: str
+) -> None:
+    """Fügt die Analyse der Historie hinzu (Commit durch den Aufrufer) und setzt den Cache"""
+    # Die analyze_single_asset Funktion gibt bereits ein normalisiertes Dict zurück
+    # mit fundamentalAnalysis und technicalAnalysis als Dicts (nicht Arrays)
+    db.add(AnalysisHistory(
+        userId=user_id,
+        portfolio_holding_id=None,
+        watchlist_item_id=item.id,
+        asset_name=item.name,
+        asset_isin=item.isin,
+        asset_ticker=item.ticker,
+        analysis_data={
+            "fundamentalAnalysis": analysis.get("fundamentalAnalysis", {}),
+            "technicalAnalysis": analysis.get("technicalAnalysis", {}),
+            "risks": analysis.get("risks", []),
+            "recommendation": analysis.get("recommendation", ""),
+            "priceTarget": analysis.get("priceTarget"),
+            "watchlistAnalysis": True,
+            "analysisDate": analysis_date
+        }
+    ))
+
+    # Cache setzen für dieses Item
+    cache_data = {
+        "fundamentalAnalysis": analysis.get("fundamentalAnalysis", {}),
+        "technicalAnalysis": analysis.get("technicalAnalysis", {}),
+        "analysisDate": analysis_date
+    }
+    cache_service.set(user_id, cache_data, portfolio_id=item.id, cache_type="watchlist")
+
+
+async def compute_watchlist_analysis(
+    db: Session,
+    user_id: int,
+    request: WatchlistAnalysisRequest
+) -> List[WatchlistAnalysisResponse]:
+    """Analysiert Watchlist-Einträge (Cache, parallele OpenAI-Aufrufe, Historie)"""
+    items = get_watchlist_items(db, user_id, request.item_id)
+    user_settings = get_user_settings_dict(db, user_id)
+    
+    results: List[Optional[WatchlistAnalysisResponse]] = []
+    uncached: List[Tuple[int, WatchlistItem]] = []
+    for item in items:
+        cached = None if request.force_refresh else get_cached_analysis(user_id, item)
+        if cached is None:
+            uncached.append((len(results), item))
+        results.append(cached)
+    
+    if uncached:
+        semaphore = asyncio.Semaphore(WATCHLIST_ANALYSIS_CONCURRENCY)
+        outcomes = await asyncio.gather(
+            *(
+                run_item_analysis(semaphore, item.id, build_asset_dict(item), user_settings, request.force_refresh)
+                for _, item in uncached
+            ),
+            return_exceptions=True
+        )
+        
+        failed: Optional[Tuple[WatchlistItem, BaseException]] = None
+        stored = 0
+        for (position, item), outcome in zip(uncached, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Fehler bei OpenAI-Analyse für Item {item.id}: {outcome}", exc_info=outcome)
+                failed = failed or (item, outcome)
+                continue
+            analysis, analysis_date, shared = outcome
+            store_item_analysis(db, user_id, item, analysis, analysis_date)
+            results[position] = build_analysis_response(item, analysis, analysis_date, cached=shared)
+            stored += 1
+        
+        # Erfolgreiche Analysen auch dann speichern, wenn einzelne Items fehlgeschlagen sind
+        db.commit()
+        logger.info(f"Analyse-Historie für {stored} Watchlist-Items gespeichert")
+        
+        if failed:
+            item, error = failed
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Fehler bei der KI-Analyse für {item.name}: {str(error)}"
+            )
+    
+    return results
+
+
+async def run_watchlist_analysis(
+    db: Session,
+    user_id: int,
+    request: WatchlistAnalysisRequest
+) -> List[WatchlistAnalysisResponse]:
+    """
+    Watchlist-Analyse für Endpoint und Job-Worker.
+    Gleichzeitige Anfragen desselben Benutzers werden zusammengefasst.
+    """
+    return await analysis_flights.do(
+        ("watchlist", user_id, request.item_id),
+        lambda: compute_watchlist_analysis(db, user_id, request)
+    )
+
+
 # POST /api/watchlist/analyze
 @router.post("/api/watchlist/analyze", response_model=List[WatchlistAnalysisResponse])
 async def analyze_watchlist(
@@ -47,131 +256,11 @@ async def analyze_watchlist(
     
     - Wenn item_id angegeben: Analysiere nur dieses Item
     - Wenn item_id None: Analysiere alle Watchlist-Items
-    - Speichert Analyse in Historie
+    - Nicht gecachte Items werden parallel analysiert (höchstens WATCHLIST_ANALYSIS_CONCURRENCY gleichzeitig)
+    - Speichert alle Analysen mit einem Commit in der Historie
     """
     try:
-        import json
-        
-        # Hole Watchlist-Items
-        if request.item_id:
-            items = db.query(WatchlistItem).filter(
-                WatchlistItem.id == request.item_id,
-                WatchlistItem.userId == current_user.id
-            ).all()
-        else:
-            items = db.query(WatchlistItem).filter(
-                WatchlistItem.userId == current_user.id
-            ).all()
-        
-        if not items:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Keine Watchlist-Einträge gefunden."
-            )
-        
-        # Hole Benutzereinstellungen
-        user_settings_obj = db.query(UserSettings).filter(
-            UserSettings.userId == current_user.id
-        ).first()
-        
-        user_settings = None
-        if user_settings_obj:
-            user_settings = {
-                "riskProfile": user_settings_obj.riskProfile,
-                "investmentHorizon": user_settings_obj.investmentHorizon
-            }
-        
-        results = []
-        
-        for item in items:
-            # Prüfe Cache (für einzelnes Item)
-            cached_analysis = None
-            if not request.force_refresh:
-                # Verwende item.id als portfolio_id-Parameter für eindeutigen Cache-Key
-                cached_analysis = cache_service.get(current_user.id, portfolio_id=item.id, cache_type="watchlist")
-            
-            if cached_analysis:
-                logger.info(f"Cache Hit für Watchlist-Item {item.id}")
-                results.append(WatchlistAnalysisResponse(
-                    item_id=item.id,
-                    asset_name=item.name,
-                    asset_isin=item.isin,
-                    asset_ticker=item.ticker,
-                    fundamentalAnalysis=cached_analysis.get("fundamentalAnalysis", {}),
-                    technicalAnalysis=cached_analysis.get("technicalAnalysis", {}),
-                    analysis_date=cached_analysis.get("analysisDate", datetime.utcnow().isoformat()),
-                    cached=True
-                ))
-                continue
-            
-            # Konvertiere Item zu Dict
-            asset_dict = {
-                "name": item.name,
-                "isin": item.isin,
-                "ticker": item.ticker,
-                "sector": item.sector,
-                "region": item.region,
-                "asset_class": item.asset_class
-            }
-            
-            # Rufe OpenAI Service auf
-            logger.info(f"Starte AI-Analyse für Watchlist-Item {item.id}: {item.name}")
-            try:
-                analysis = await analyze_single_asset(asset_dict, user_settings)
-            except Exception as e:
-                logger.error(f"Fehler bei OpenAI-Analyse für Item {item.id}: {e}", exc_info=True)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Fehler bei der KI-Analyse für {item.name}: {str(e)}"
-                )
-            
-            # Die analyze_single_asset Funktion gibt bereits ein normalisiertes Dict zurück
-            # mit fundamentalAnalysis und technicalAnalysis als Dicts (nicht Arrays)
-            
-            # Speichere in Historie
-            history_entry = AnalysisHistory(
-                userId=current_user.id,
-                portfolio_holding_id=None,
-                watchlist_item_id=item.id,
-                asset_name=item.name,
-                asset_isin=item.isin,
-                asset_ticker=item.ticker,
-                analysis_data={
-                    "fundamentalAnalysis": analysis.get("fundamentalAnalysis", {}),
-                    "technicalAnalysis": analysis.get("technicalAnalysis", {}),
-                    "risks": analysis.get("risks", []),
-                    "recommendation": analysis.get("recommendation", ""),
-                    "priceTarget": analysis.get("priceTarget"),
-                    "watchlistAnalysis": True,
-                    "analysisDate": datetime.utcnow().isoformat()
-                }
-            )
-            db.add(history_entry)
-            
-            # Cache setzen für dieses Item
-            cache_data = {
-                "fundamentalAnalysis": analysis.get("fundamentalAnalysis", {}),
-                "technicalAnalysis": analysis.get("technicalAnalysis", {}),
-                "analysisDate": datetime.utcnow().isoformat()
-            }
-            cache_service.set(current_user.id, cache_data, portfolio_id=item.id, cache_type="watchlist")
-            logger.info(f"Cache gespeichert für Watchlist-Item {item.id}")
-            
-            results.append(WatchlistAnalysisResponse(
-                item_id=item.id,
-                asset_name=item.name,
-                asset_isin=item.isin,
-                asset_ticker=item.ticker,
-                fundamentalAnalysis=analysis.get("fundamentalAnalysis", {}),
-                technicalAnalysis=analysis.get("technicalAnalysis", {}),
-                analysis_date=datetime.utcnow().isoformat(),
-                cached=False
-            ))
-        
-        db.commit()
-        logger.info(f"Analyse-Historie für {len(items)} Watchlist-Items gespeichert")
-        
-        return results
+        return await run_watchlist_analysis(db, current_user.id, request)
         
     except HTTPException:
         raise
@@ -188,3 +277,81 @@ async def analyze_watchlist(
             detail="Ein Fehler ist bei der Watchlist-Analyse aufgetreten"
         )
 
+
+# POST /api/watchlist/analyze/stream
+@router.post("/api/watchlist/analyze/stream")
+async def stream_watchlist_analysis(
+    request: WatchlistAnalysisRequest = WatchlistAnalysisRequest(),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Wie POST /api/watchlist/analyze, aber als NDJSON-Stream:
+    
+    - {"type": "item", "data": WatchlistAnalysisResponse} je Item, sobald es fertig ist (Cache-Treffer sofort)
+    - {"type": "error", "item_id": ..., "detail": ...} für fehlgeschlagene Items
+    - {"type": "done", "count": ..., "failed": ...} zum Schluss
+    
+    Alle neuen Analysen werden am Ende mit einem Commit in der Historie gespeichert.
+    """
+    items = get_watchlist_items(db, current_user.id, request.item_id)
+    user_id = current_user.id
+    user_settings = get_user_settings_dict(db, user_id)
+    
+    cached: List[WatchlistAnalysisResponse] = []
+    uncached: List[WatchlistItem] = []
+    for item in items:
+        response = None if request.force_refresh else get_cached_analysis(user_id, item)
+        if response is None:
+            uncached.append(item)
+        else:
+            cached.append(response)
+    
+    async def events():
+        for response in cached:
+            yield {"type": "item", "data": response.model_dump()}
+        
+        semaphore = asyncio.Semaphore(WATCHLIST_ANALYSIS_CONCURRENCY)
+        
+        async def analyze(item: WatchlistItem):
+            try:
+                return item, await run_item_analysis(
+                    semaphore, item.id, build_asset_dict(item), user_settings, request.force_refresh
+                )
+            except Exception as e:
+                return item, e
+        
+        tasks = [asyncio.ensure_future(analyze(item)) for item in uncached]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item, outcome = await next_done
+                if isinstance(outcome, Exception):
+                    logger.error(f"Fehler bei OpenAI-Analyse für Item {item.id}: {outcome}", exc_info=outcome)
+                    failed += 1
+                    yield {
+                        "type": "error",
+                        "item_id": item.id,
+                        "detail": f"Fehler bei der KI-Analyse für {item.name}: {str(outcome)}"
+                    }
+                    continue
+                analysis, analysis_date, shared = outcome
+                store_item_analysis(db, user_id, item, analysis, analysis_date)
+                yield {"type": "item", "data": build_analysis_response(item, analysis, analysis_date, cached=shared).model_dump()}
+            
+            if uncached:
+                db.commit()
+                logger.info(f"Analyse-Historie für {len(uncached) - failed} Watchlist-Items gespeichert")
+            yield {"type": "done", "count": len(items) - failed, "failed": failed}
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Unerwarteter Fehler bei Watchlist-Analyse: {e}", exc_info=True)
+            yield {"type": "error", "item_id": None, "detail": "Ein Fehler ist bei der Watchlist-Analyse aufgetreten"}
+        finally:
+            # Bei Verbindungsabbruch laufende Analysen beenden
+            for task in tasks:
+                task.cancel()
+            # Die Request-Session wird vor dem Stream geschlossen und hier erneut verwendet
+            db.close()
+    
+    return ndjson_response(events())
@@ -11,7 +11,15 @@ import logging
 
 from database import get_db
 from models import User, WatchlistItem
-from auth import get_current_user
+from auth import get_current_user, get_current_user_id
+from services.classification_worker import classification_worker
+from services.instrument_service import (
+    CLASSIFICATION_FIELDS,
+    apply_classification,
+    get_or_create_instrument,
+    load_instruments,
+    needs_classification,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -63,12 +71,12 @@ def validate_isin(isin: str) -> bool:
 # GET /api/watchlist
 @router.get("/api/watchlist", response_model=List[WatchlistItemResponse])
 async def get_watchlist(
-    current_user: User = Depends(get_current_user),
+    user_id: int = Depends(get_current_user_id),
     db: Session = Depends(get_db)
 ):
     """Hole alle Watchlist-Einträge des aktuellen Nutzers"""
     items = db.query(WatchlistItem).filter(
-        WatchlistItem.userId == current_user.id
+        WatchlistItem.userId == user_id
     ).order_by(WatchlistItem.created_at.desc()).all()
     
     return [
@@ -164,10 +172,21 @@ async def create_watchlist_item(
             notes=item.notes
         )
         
+        # Fehlende Klassifizierung aus den Instrument-Stammdaten übernehmen
+        instrument = get_or_create_instrument(
+            db, load_instruments(db, [(isin, ticker)]), isin, ticker, name,
+            {field: getattr(item, field) for field in CLASSIFICATION_FIELDS}
+        )
+        apply_classification(new_item, instrument)
+        
         db.add(new_item)
         db.commit()
         db.refresh(new_item)
         
+        # Fehlende Klassifizierung im Hintergrund anfragen; sie wird per UPDATE in den Eintrag übernommen
+        if needs_classification(instrument):
+            classification_worker.enqueue([(instrument.isin, instrument.ticker, instrument.name)])
+        
         logger.info(f"Watchlist item created for user {current_user.id}: {new_item.id}")
         
         return WatchlistItemResponse(
@@ -0,0 +1,100 @@
+"""
+Nächtliche Berechnung des Risikomodells
+Berechnet aus price_history die Tagesrenditen, Mittelwerte, Kovarianzmatrix und Benchmark-Kovarianzen
+aller Instrumente aus Portfolios und Watchlists und speichert sie als neue Version in
+risk_model_snapshots (Kopfdaten) und risk_model_symbols (eine Zeile je Instrument mit ihrer Zeile
+der Kovarianzmatrix). Die Dashboard-Risikokennzahlen werden daraus pro Request nur aus den Zeilen
+und Spalten der gehaltenen Instrumente berechnet.
+"""
+import os
+import sys
+import logging
+from datetime import date, timedelta
+
+# Füge das Backend-Verzeichnis zum Python-Pfad hinzu
+backend_path = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, backend_path)
+
+from database import SessionLocal
+from models import PriceHistory, RiskModelSnapshot, RiskModelSymbol
+from services.risk_service import build_risk_model, RISK_BENCHMARK_SYMBOL
+from record_daily_closes import collect_symbols
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+RISK_WINDOW_DAYS = int(os.getenv("RISK_WINDOW_DAYS", "365"))  # Zeitfenster der Renditen
+KEEP_SNAPSHOTS = 7  # Anzahl aufbewahrter Modell-Versionen
+
+
+def compute_risk_model(db, today: date) -> RiskModelSnapshot:
+    """Berechnet das Risikomodell und speichert es als neue Version"""
+    symbols = sorted(collect_symbols(db))
+    start = today - timedelta(days=RISK_WINDOW_DAYS)
+    all_symbols = symbols + [RISK_BENCHMARK_SYMBOL]
+
+    rows = db.query(PriceHistory.symbol, PriceHistory.date, PriceHistory.close).filter(
+        PriceHistory.symbol.in_(all_symbols),
+        PriceHistory.date >= start,
+        PriceHistory.date <= today
+    ).all()
+    dates = sorted({r.date for r in rows})
+
+    model = build_risk_model(
+        symbols,
+        dates,
+        [(r.symbol, r.date, float(r.close)) for r in rows],
+        RISK_BENCHMARK_SYMBOL
+    )
+
+    header, records = model.to_records()
+    snapshot = RiskModelSnapshot(
+        benchmark=RISK_BENCHMARK_SYMBOL if model.benchmark_covariance is not None else None,
+        window_days=RISK_WINDOW_DAYS,
+        symbol_count=len(model.symbols),
+        data=header
+    )
+    db.add(snapshot)
+    db.flush()
+    db.bulk_insert_mappings(RiskModelSymbol, [dict(record, snapshot_id=snapshot.id) for record in records])
+
+    # Ältere Versionen entfernen
+    stale_ids = [
+        row.id for row in db.query(RiskModelSnapshot.id).order_by(
+            RiskModelSnapshot.id.desc()
+        ).offset(KEEP_SNAPSHOTS)
+    ]
+    if stale_ids:
+        db.query(RiskModelSymbol).filter(
+            RiskModelSymbol.snapshot_id.in_(stale_ids)
+        ).delete(synchronize_session=False)
+        db.query(RiskModelSnapshot).filter(
+            RiskModelSnapshot.id.in_(stale_ids)
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return snapshot
+
+
+def main():
+    db = SessionLocal()
+    try:
+        snapshot = compute_risk_model(db, date.today())
+        logger.info(
+            f"Risikomodell {snapshot.id} gespeichert: {snapshot.symbol_count} Instrumente, "
+            f"Benchmark: {snapshot.benchmark or 'keiner'}"
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Fehler bei der Berechnung des Risikomodells: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
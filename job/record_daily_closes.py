@@ -0,0 +1,77 @@
+"""
+Tägliche Schlusskurse speichern
+Schreibt für alle Instrumente aus Portfolios und Watchlists sowie den Risiko-Benchmark den
+aktuellen Kurs des Price Providers als Schlusskurs in price_history (Grundlage für den
+Performance-Verlauf und das Risikomodell).
+"""
+import os
+import sys
+import logging
+from datetime import date
+
+# Füge das Backend-Verzeichnis zum Python-Pfad hinzu
+backend_path = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, backend_path)
+
+from database import SessionLocal
+from models import PortfolioHolding, WatchlistItem, PriceHistory
+from services.price_service import price_service, asset_symbols
+from services.risk_service import RISK_BENCHMARK_SYMBOL
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def collect_symbols(db) -> set:
+    """Alle ISINs und Ticker aus Portfolios und Watchlists"""
+    symbols = set()
+    for model in (PortfolioHolding, WatchlistItem):
+        for isin, ticker in db.query(model.isin, model.ticker).distinct():
+            symbols.update(asset_symbols(isin, ticker))
+    return symbols
+
+
+def record_daily_closes(db, day: date) -> int:
+    """
+    Speichert die Kurse für einen Handelstag (vorhandene Einträge werden aktualisiert)
+
+    Returns:
+        Anzahl gespeicherter Kurse
+    """
+    # Der Benchmark wird für das Beta im Risikomodell benötigt
+    prices = price_service.get_prices(collect_symbols(db) | {RISK_BENCHMARK_SYMBOL})
+    if not prices:
+        return 0
+
+    # Vorhandene Kurse des Tages ersetzen statt aktualisieren, damit sie eine neue ID
+    # erhalten und gecachte Performance-Verläufe die Änderung erkennen
+    db.query(PriceHistory).filter(
+        PriceHistory.date == day,
+        PriceHistory.symbol.in_(prices.keys())
+    ).delete(synchronize_session=False)
+    db.add_all([
+        PriceHistory(symbol=symbol, date=day, close=close)
+        for symbol, close in prices.items()
+    ])
+    db.commit()
+    return len(prices)
+
+
+def main():
+    db = SessionLocal()
+    try:
+        count = record_daily_closes(db, date.today())
+        logger.info(f"{count} Schlusskurse gespeichert")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Fehler beim Speichern der Schlusskurse: {e}", exc_info=True)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import api from '../../services/api'
 import AnalysisHistoryModal from '../analysis/AnalysisHistoryModal'
 
+// Polling der Hintergrund-Klassifizierung (Branche, Region, Assetklasse)
+const CLASSIFICATION_POLL_INTERVAL_MS = 3000
+const CLASSIFICATION_POLL_ATTEMPTS = 20
+
 const PortfolioList = ({ refreshTrigger, showSuccess, showError, onRefresh }) => {
   const [holdings, setHoldings] = useState([])
   const [loading, setLoading] = useState(true)
@@ -9,8 +13,11 @@ const PortfolioList = ({ refreshTrigger, showSuccess, showError, onRefresh }) =>
   const [selectedHolding, setSelectedHolding] = useState(null)
   const [showHistoryModal, setShowHistoryModal] = useState(false)
 
+  const classificationTimer = useRef(null)
+
   useEffect(() => {
     loadPortfolio()
+    return () => clearTimeout(classificationTimer.current)
   }, [refreshTrigger])
 
   const loadPortfolio = async () => {
@@ -18,6 +25,9 @@ const PortfolioList = ({ refreshTrigger, showSuccess, showError, onRefresh }) =>
       setLoading(true)
       const data = await api.getPortfolio()
       setHoldings(data)
+      if (data.some((holding) => !holding.sector || !holding.region || !holding.asset_class)) {
+        pollClassification()
+      }
     } catch (err) {
       showError(err.message || 'Fehler beim Laden des Portfolios')
     } finally {
@@ -25,6 +35,28 @@ const PortfolioList = ({ refreshTrigger, showSuccess, showError, onRefresh }) =>
     }
   }
 
+  // Klassifizierungen laufen im Hintergrund: warten, bis keine mehr offen ist, dann neu laden
+  const pollClassification = (attempt = 0) => {
+    clearTimeout(classificationTimer.current)
+    classificationTimer.current = setTimeout(async () => {
+      try {
+        const status = await api.getClassificationStatus()
+        if (status.pending.length === 0) {
+          await loadPortfolioSilently()
+        } else if (attempt < CLASSIFICATION_POLL_ATTEMPTS) {
+          pollClassification(attempt + 1)
+        }
+      } catch (err) {
+        // Status ist optional; die Tabelle bleibt gültig
+      }
+    }, CLASSIFICATION_POLL_INTERVAL_MS)
+  }
+
+  const loadPortfolioSilently = async () => {
+    const data = await api.getPortfolio()
+    setHoldings(data)
+  }
+
   const handleDelete = async (id) => {
     if (!window.confirm('Möchten Sie diese Position wirklich löschen?')) {
       return
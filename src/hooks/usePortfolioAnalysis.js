@@ -6,12 +6,14 @@ import api from '../services/api'
  * 
  * Bietet Funktionen zum Abrufen von AI-gestützten Portfolio-Analysen
  * 
- * @returns {Object} { data, error, loading, runAnalysis, clearCache }
+ * @returns {Object} { data, error, loading, sections, runAnalysis, clearCache }
  */
 export const usePortfolioAnalysis = () => {
   const [data, setData] = useState(null)
   const [error, setError] = useState(null)
   const [loading, setLoading] = useState(false)
+  // Bereits fertige Abschnitte der laufenden Analyse (gestreamt)
+  const [sections, setSections] = useState({})
 
   /**
    * Startet eine neue Portfolio-Analyse
@@ -23,7 +25,18 @@ export const usePortfolioAnalysis = () => {
       setLoading(true)
       setError(null)
       
-      const result = await api.analyzePortfolio(forceRefresh)
+      setSections({})
+      
+      let result = null
+      await api.analyzePortfolioStream(forceRefresh, (event) => {
+        if (event.type === 'section') {
+          setSections((previous) => ({ ...previous, [event.section]: event.data }))
+        } else if (event.type === 'result') {
+          result = event.data
+        } else if (event.type === 'error') {
+          throw new Error(event.detail)
+        }
+      })
       setData(result)
       
       return result
@@ -53,6 +66,7 @@ export const usePortfolioAnalysis = () => {
     data,
     error,
     loading,
+    sections,
     runAnalysis,
     clearCache,
   }
@@ -14,13 +14,25 @@ export const useWatchlistAnalysis = () => {
       setLoading(true)
       setError(null)
       
-      const result = await api.analyzeWatchlist(itemId, forceRefresh)
-      setData(result)
+      // Ergebnisse werden gestreamt und erscheinen, sobald ein Item fertig analysiert ist
+      const result = []
+      const errors = []
+      setData(null)
+      await api.analyzeWatchlistStream(itemId, forceRefresh, (event) => {
+        if (event.type === 'item') {
+          result.push(event.data)
+          setData([...result])
+        } else if (event.type === 'error') {
+          errors.push(event.detail)
+        }
+      })
+      if (errors.length > 0) {
+        throw new Error(errors[0])
+      }
       
       return result
     } catch (err) {
       setError(err.message || 'Fehler bei der Watchlist-Analyse')
-      setData(null)
       throw err
     } finally {
       setLoading(false)
@@ -26,17 +26,12 @@ const Dashboard = () => {
   const loadDashboardData = async () => {
     try {
       setLoading(true)
-      const [summaryData, performanceData, allocationData, riskData] = await Promise.all([
-        api.getPortfolioSummary(),
-        api.getPerformanceHistory(30),
-        api.getPortfolioAllocation(),
-        api.getRiskMetrics(),
-      ])
+      const dashboardData = await api.getDashboard(30)
       
-      setSummary(summaryData)
-      setPerformance(performanceData)
-      setAllocation(allocationData)
-      setRiskMetrics(riskData)
+      setSummary(dashboardData.summary)
+      setPerformance(dashboardData.performance)
+      setAllocation(dashboardData.allocation)
+      setRiskMetrics(dashboardData.risk)
     } catch (err) {
       showError(err.message || 'Fehler beim Laden der Dashboard-Daten')
     } finally {
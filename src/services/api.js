@@ -18,10 +18,15 @@ const getApiBaseUrl = () => {
 
 const API_BASE_URL = getApiBaseUrl()
 
+// Endpoints, deren 401 keinen Refresh auslöst (falsches Passwort, abgelaufenes Refresh-Token)
+const NO_REFRESH_ENDPOINTS = ['/api/auth/login-json', '/api/auth/register', '/api/auth/refresh', '/api/auth/logout']
+
 class ApiService {
   constructor() {
     this.baseURL = API_BASE_URL
     this.token = localStorage.getItem('auth_token')
+    this.refreshToken = localStorage.getItem('refresh_token')
+    this.refreshPromise = null
   }
 
   setToken(token) {
@@ -33,6 +38,63 @@ class ApiService {
     }
   }
 
+  setRefreshToken(token) {
+    this.refreshToken = token
+    if (token) {
+      localStorage.setItem('refresh_token', token)
+    } else {
+      localStorage.removeItem('refresh_token')
+    }
+  }
+
+  // Holt per Refresh-Token ein neues Access-Token (ohne Passwort). Jedes Refresh-Token darf nur
+  // einmal verwendet werden: parallele Aufrufe teilen sich einen Request, Tabs stimmen sich über
+  // einen Web Lock (falls verfügbar) und die Tokens in localStorage ab
+  async refreshAccessToken() {
+    if (!this.refreshPromise) {
+      const refresh = () => this.refreshTokens()
+      const pending = typeof navigator !== 'undefined' && navigator.locks
+        ? navigator.locks.request('auth-refresh', refresh)
+        : refresh()
+      this.refreshPromise = pending
+        .catch(() => false)
+        .finally(() => {
+          this.refreshPromise = null
+        })
+    }
+    return this.refreshPromise
+  }
+
+  async refreshTokens() {
+    // Ein anderer Tab hat bereits rotiert (oder sich an-/abgemeldet): dessen Tokens übernehmen
+    const storedRefreshToken = localStorage.getItem('refresh_token')
+    if (storedRefreshToken !== this.refreshToken) {
+      this.token = localStorage.getItem('auth_token')
+      this.refreshToken = storedRefreshToken
+      return Boolean(this.token)
+    }
+    if (!this.refreshToken) {
+      return false
+    }
+
+    const response = await fetch(`${this.baseURL}/api/auth/refresh`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: this.refreshToken }),
+    })
+    if (!response.ok) {
+      // Sitzung abgelaufen oder widerrufen: erneuter Login nötig
+      if (response.status === 401 && localStorage.getItem('refresh_token') === this.refreshToken) {
+        this.setRefreshToken(null)
+      }
+      return false
+    }
+    const data = await response.json()
+    this.setToken(data.access_token)
+    this.setRefreshToken(data.refresh_token)
+    return true
+  }
+
   // Konvertiert HTTP-Status-Codes in benutzerfreundliche Fehlermeldungen
   getErrorMessage(statusCode, backendMessage) {
     // Filtere technische Fehlermeldungen heraus
@@ -77,7 +139,7 @@ class ApiService {
     }
   }
 
-  async request(endpoint, options = {}) {
+  async request(endpoint, options = {}, retryOnUnauthorized = true) {
     const url = `${this.baseURL}${endpoint}`
     const config = {
       headers: {
@@ -93,6 +155,12 @@ class ApiService {
 
     try {
       const response = await fetch(url, config)
+
+      // Abgelaufenes Access-Token: einmal per Refresh-Token erneuern und wiederholen
+      if (response.status === 401 && retryOnUnauthorized && !NO_REFRESH_ENDPOINTS.includes(endpoint)
+          && await this.refreshAccessToken()) {
+        return this.request(endpoint, options, false)
+      }
       
       // Response-Body als Text lesen (kann nur einmal gelesen werden)
       const text = await response.text()
@@ -126,6 +194,49 @@ class ApiService {
     }
   }
 
+  // Liest eine NDJSON-Antwort (ein JSON-Objekt pro Zeile) und ruft onEvent für jedes Event auf
+  async streamRequest(endpoint, body, onEvent, retryOnUnauthorized = true) {
+    const headers = { 'Content-Type': 'application/json' }
+    if (this.token) {
+      headers.Authorization = `Bearer ${this.token}`
+    }
+
+    const response = await fetch(`${this.baseURL}${endpoint}`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify(body),
+    })
+
+    if (response.status === 401 && retryOnUnauthorized && await this.refreshAccessToken()) {
+      return this.streamRequest(endpoint, body, onEvent, false)
+    }
+
+    if (!response.ok || !response.body) {
+      let detail = null
+      try {
+        detail = (await response.json()).detail
+      } catch (jsonError) {
+        // Kein JSON im Fehlerfall
+      }
+      throw new Error(this.getErrorMessage(response.status, detail))
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    for (;;) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      const lines = buffer.split('\n')
+      buffer = lines.pop()
+      lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)))
+    }
+    if (buffer.trim()) {
+      onEvent(JSON.parse(buffer))
+    }
+  }
+
   // Auth Endpoints
   async register(name, email, password) {
     return this.request('/api/auth/register', {
@@ -142,6 +253,7 @@ class ApiService {
     
     if (response.access_token) {
       this.setToken(response.access_token)
+      this.setRefreshToken(response.refresh_token)
     }
     
     return response
@@ -152,7 +264,16 @@ class ApiService {
   }
 
   async logout() {
+    const refreshToken = this.refreshToken
     this.setToken(null)
+    this.setRefreshToken(null)
+    if (refreshToken) {
+      // Sitzung auch serverseitig beenden; Fehler sind für den Benutzer nicht relevant
+      this.request('/api/auth/logout', {
+        method: 'POST',
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      }).catch(() => {})
+    }
   }
 
   // Health Check
@@ -186,13 +307,21 @@ class ApiService {
 
   // Security Endpoints
   async changePassword(currentPassword, newPassword) {
-    return this.request('/api/user/change-password', {
+    const response = await this.request('/api/user/change-password', {
       method: 'POST',
       body: JSON.stringify({
         current_password: currentPassword,
         new_password: newPassword,
       }),
     })
+
+    // Die Passwortänderung widerruft alle bisherigen Tokens, auch das aktuelle
+    if (response.access_token) {
+      this.setToken(response.access_token)
+      this.setRefreshToken(response.refresh_token)
+    }
+
+    return response
   }
 
   async setup2FA(enable, password) {
@@ -242,6 +371,10 @@ class ApiService {
     return this.request('/api/portfolio')
   }
 
+  async getClassificationStatus() {
+    return this.request('/api/portfolio/classification/status')
+  }
+
   async getPortfolioHolding(id) {
     return this.request(`/api/portfolio/${id}`)
   }
@@ -318,6 +451,13 @@ class ApiService {
   }
 
   // Portfolio Dashboard Endpoints
+  // Lädt Zusammenfassung, Aufteilung, Risiko und Performance in einem Request
+  async getDashboard(days = 30, fields = null) {
+    const params = new URLSearchParams({ days: String(days) })
+    if (fields) params.append('fields', fields.join(','))
+    return this.request(`/api/portfolio/dashboard?${params.toString()}`)
+  }
+
   async getPortfolioSummary() {
     return this.request('/api/portfolio/dashboard/summary')
   }
@@ -342,6 +482,10 @@ class ApiService {
     })
   }
 
+  async analyzePortfolioStream(forceRefresh = false, onEvent) {
+    return this.streamRequest('/api/portfolio/analyze/stream', { force_refresh: forceRefresh }, onEvent)
+  }
+
   async clearAnalysisCache() {
     return this.request('/api/portfolio/analyze/cache', {
       method: 'DELETE',
@@ -377,6 +521,10 @@ class ApiService {
     })
   }
 
+  async analyzeWatchlistStream(itemId = null, forceRefresh = false, onEvent) {
+    return this.streamRequest('/api/watchlist/analyze/stream', { item_id: itemId, force_refresh: forceRefresh }, onEvent)
+  }
+
   async analyzeWatchlist(itemId = null, forceRefresh = false) {
     return this.request('/api/watchlist/analyze', {
       method: 'POST',
@@ -406,6 +554,34 @@ class ApiService {
   async getAnalysisSummary() {
     return this.request('/api/analysis-history/summary')
   }
+
+  // Analysis Job Endpoints (asynchrone Analysen)
+  // type: 'portfolio_analysis', 'asset_analysis' oder 'watchlist_analysis'
+  async submitJob(type, params = {}) {
+    return this.request('/api/jobs', {
+      method: 'POST',
+      body: JSON.stringify({ type, params }),
+    })
+  }
+
+  async getJob(jobId) {
+    return this.request(`/api/jobs/${jobId}`)
+  }
+
+  async getJobResult(jobId) {
+    return this.request(`/api/jobs/${jobId}/result`)
+  }
+
+  // Pollt den Job-Status, bis der Job abgeschlossen ist, und liefert das Ergebnis
+  async waitForJob(jobId, intervalMs = 2000) {
+    for (;;) {
+      const job = await this.getJob(jobId)
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return this.getJobResult(jobId)
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs))
+    }
+  }
 }
 
 export default new ApiService()